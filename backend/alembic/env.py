@@ -12,6 +12,11 @@ from sqlalchemy.ext.asyncio import async_engine_from_config
 from src.app.infrastructure.persistence.database import Base
 from src.app.setup.config.settings import get_settings
 from src.app.infrastructure.persistence.models.api_data import ApiDataModel
+from src.app.infrastructure.persistence.models.api_data_counter import ApiDataCounterModel
+from src.app.infrastructure.persistence.models.fetch_job import FetchJobModel
+from src.app.infrastructure.persistence.models.harvest_checkpoint import HarvestCheckpointModel
+from src.app.infrastructure.persistence.models.idempotency_key import IdempotencyKeyModel
+from src.app.infrastructure.persistence.models.upstream_quota import UpstreamQuotaModel
 
 config = context.config
 
@@ -21,7 +26,9 @@ if config.config_file_name is not None:
 target_metadata = Base.metadata
 
 settings = get_settings()
-config.set_main_option("sqlalchemy.url", settings.database_url.replace("+asyncpg", ""))
+# Миграции выполняются через async движок с тем же драйвером asyncpg, что и приложение;
+# % экранируется для configparser
+config.set_main_option("sqlalchemy.url", settings.database_url.replace("%", "%%"))
 
 
 def run_migrations_offline() -> None:
@@ -0,0 +1,80 @@
+"""Счетчик строк api_data, обновляемый триггерами
+
+Revision ID: 0003_api_data_counter
+Revises: 0002_performance_indexes
+Create Date: 2026-10-18 11:00:00
+
+Триггеры уровня оператора с transition tables прибавляют число вставленных строк и
+вычитают удаленные. Счетчик разложен на 16 слотов (по pg_backend_pid()), чтобы
+параллельные вставки не ждали блокировку одной строки; количество - сумма слотов.
+При INSERT ... ON CONFLICT DO UPDATE в new_rows попадают только вставленные строки.
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0003_api_data_counter"
+down_revision = "0002_performance_indexes"
+branch_labels = None
+depends_on = None
+
+COUNTER_SLOTS = 16
+
+
+def upgrade() -> None:
+    op.create_table(
+        "api_data_counter",
+        sa.Column("slot", sa.SmallInteger(), autoincrement=False, nullable=False),
+        sa.Column("row_count", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("slot", name="api_data_counter_pkey"),
+    )
+    op.execute(
+        f"""
+        CREATE FUNCTION api_data_count_rows() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO api_data_counter (slot, row_count)
+                SELECT pg_backend_pid() % {COUNTER_SLOTS}, count(*) FROM new_rows
+                HAVING count(*) > 0
+                ON CONFLICT (slot)
+                DO UPDATE SET row_count = api_data_counter.row_count + EXCLUDED.row_count;
+            ELSIF TG_OP = 'DELETE' THEN
+                INSERT INTO api_data_counter (slot, row_count)
+                SELECT pg_backend_pid() % {COUNTER_SLOTS}, -count(*) FROM old_rows
+                HAVING count(*) > 0
+                ON CONFLICT (slot)
+                DO UPDATE SET row_count = api_data_counter.row_count + EXCLUDED.row_count;
+            ELSE
+                DELETE FROM api_data_counter;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER api_data_count_insert AFTER INSERT ON api_data "
+        "REFERENCING NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION api_data_count_rows()"
+    )
+    op.execute(
+        "CREATE TRIGGER api_data_count_delete AFTER DELETE ON api_data "
+        "REFERENCING OLD TABLE AS old_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION api_data_count_rows()"
+    )
+    op.execute(
+        "CREATE TRIGGER api_data_count_truncate AFTER TRUNCATE ON api_data "
+        "FOR EACH STATEMENT EXECUTE FUNCTION api_data_count_rows()"
+    )
+    # Триггеры уже созданы и до фиксации миграции держат блокировку api_data,
+    # поэтому начальное значение не расходится с параллельными вставками
+    op.execute("INSERT INTO api_data_counter (slot, row_count) SELECT 0, count(*) FROM api_data")
+
+
+def downgrade() -> None:
+    for trigger in ("api_data_count_truncate", "api_data_count_delete", "api_data_count_insert"):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger} ON api_data")
+    op.execute("DROP FUNCTION IF EXISTS api_data_count_rows()")
+    op.drop_table("api_data_counter")
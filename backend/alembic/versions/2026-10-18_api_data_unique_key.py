@@ -0,0 +1,99 @@
+"""Колонка duplicate_of и уникальный ключ (external_id, source) для api_data из create_all
+
+Revision ID: 0004_api_data_unique_key
+Revises: 0003_api_data_counter
+Create Date: 2026-10-18 12:00:00
+
+0001_initial пропускает таблицы, уже созданные create_all, и в такой БД у api_data нет
+колонки duplicate_of и ограничения uq_api_data_external_id_source. Ревизия добавляет их без
+долгой блокировки таблицы: дубликаты удаляются пачками в отдельных транзакциях, уникальный
+индекс строится CONCURRENTLY, ограничение создается поверх готового индекса (USING INDEX).
+В БД, созданной 0001_initial, ограничение уже есть, и ревизия ничего не меняет.
+"""
+
+import sqlalchemy as sa
+
+from alembic import context, op
+
+# revision identifiers, used by Alembic.
+revision = "0004_api_data_unique_key"
+down_revision = "0003_api_data_counter"
+branch_labels = None
+depends_on = None
+
+CONSTRAINT = "uq_api_data_external_id_source"
+DELETE_BATCH_SIZE = 10000
+INDEX_ATTEMPTS = 3
+
+# Из каждой группы (external_id, source) остается последняя полученная запись
+_DUPLICATES = """
+    SELECT id FROM (
+        SELECT id, row_number() OVER (
+            PARTITION BY external_id, source ORDER BY fetched_at DESC, id DESC
+        ) AS position
+        FROM api_data
+        WHERE external_id IS NOT NULL
+    ) ranked
+    WHERE position > 1
+"""
+
+
+def _has_constraint() -> bool:
+    if context.is_offline_mode():
+        # SQL-скрипт с самого начала создает ограничение в 0001_initial
+        return context.get_starting_revision_argument() is None
+    statement = sa.text("SELECT 1 FROM pg_constraint WHERE conname = :name")
+    return op.get_bind().execute(statement, {"name": CONSTRAINT}).scalar() is not None
+
+
+def _delete_duplicates() -> None:
+    if context.is_offline_mode():
+        op.execute(f"DELETE FROM api_data WHERE id IN ({_DUPLICATES})")
+        return
+    # Каждая пачка фиксируется отдельно (autocommit): короткие транзакции без долгих блокировок
+    statement = sa.text(f"DELETE FROM api_data WHERE id IN ({_DUPLICATES} LIMIT :limit)")
+    bind = op.get_bind()
+    while bind.execute(statement, {"limit": DELETE_BATCH_SIZE}).rowcount:
+        pass
+
+
+def upgrade() -> None:
+    # Колонка без значения по умолчанию добавляется без перезаписи таблицы
+    op.execute("ALTER TABLE api_data ADD COLUMN IF NOT EXISTS duplicate_of UUID")
+    if _has_constraint():
+        return
+
+    with op.get_context().autocommit_block():
+        for attempt in range(INDEX_ATTEMPTS):
+            _delete_duplicates()
+            # Невалидный индекс от прерванного построения пропустил бы IF NOT EXISTS
+            op.drop_index(
+                CONSTRAINT, table_name="api_data", postgresql_concurrently=True, if_exists=True
+            )
+            try:
+                op.create_index(
+                    CONSTRAINT,
+                    "api_data",
+                    ["external_id", "source"],
+                    unique=True,
+                    postgresql_concurrently=True,
+                )
+                break
+            except sa.exc.IntegrityError:
+                # Прежняя версия приложения успела записать новый дубликат
+                if attempt == INDEX_ATTEMPTS - 1:
+                    raise
+        # Поиск по external_id обслуживает уникальный индекс
+        op.drop_index(
+            "ix_api_data_external_id",
+            table_name="api_data",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+    op.execute(f"ALTER TABLE api_data ADD CONSTRAINT {CONSTRAINT} UNIQUE USING INDEX {CONSTRAINT}")
+
+
+def downgrade() -> None:
+    # Колонка и ограничение входят в схему 0001_initial и остаются при откате
+    pass
@@ -0,0 +1,106 @@
+"""Начальная схема: таблицы, создававшиеся create_all при старте
+
+Revision ID: 0001_initial
+Revises:
+Create Date: 2026-10-18 10:00:00
+
+Таблицы, уже созданные create_all в существующей БД, пропускаются; недостающие колонки
+и ограничения api_data добавляет ревизия 0004_api_data_unique_key.
+"""
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import context, op
+
+# revision identifiers, used by Alembic.
+revision = "0001_initial"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _missing(table_name: str) -> bool:
+    if context.is_offline_mode():
+        return True
+    return not sa.inspect(op.get_bind()).has_table(table_name)
+
+
+def upgrade() -> None:
+    if _missing("api_data"):
+        op.create_table(
+            "api_data",
+            sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+            sa.Column("source", sa.String(length=255), nullable=False),
+            sa.Column("title", sa.String(length=500), nullable=False),
+            sa.Column("content", sa.Text(), nullable=False),
+            sa.Column("external_id", sa.String(length=255), nullable=True),
+            sa.Column("fetched_at", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("duplicate_of", postgresql.UUID(as_uuid=True), nullable=True),
+            sa.PrimaryKeyConstraint("id", name="api_data_pkey"),
+            sa.UniqueConstraint("external_id", "source", name="uq_api_data_external_id_source"),
+        )
+
+    if _missing("fetch_jobs"):
+        op.create_table(
+            "fetch_jobs",
+            sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+            sa.Column("number", sa.Integer(), nullable=True),
+            sa.Column("status", sa.String(length=16), nullable=False),
+            sa.Column("result_id", postgresql.UUID(as_uuid=True), nullable=True),
+            sa.Column("error", sa.Text(), nullable=True),
+            sa.Column("attempts", sa.Integer(), nullable=False),
+            sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+            sa.PrimaryKeyConstraint("id", name="fetch_jobs_pkey"),
+        )
+        op.create_index("fetch_jobs_status_idx", "fetch_jobs", ["status"])
+
+    if _missing("harvest_checkpoints"):
+        op.create_table(
+            "harvest_checkpoints",
+            sa.Column("name", sa.String(length=64), nullable=False),
+            sa.Column("plan", sa.Text(), nullable=False),
+            sa.Column("position", sa.BigInteger(), nullable=False),
+            sa.Column("random_pulled", sa.Integer(), nullable=False),
+            sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+            sa.PrimaryKeyConstraint("name", name="harvest_checkpoints_pkey"),
+        )
+
+    if _missing("idempotency_keys"):
+        op.create_table(
+            "idempotency_keys",
+            sa.Column("key", sa.String(length=255), nullable=False),
+            sa.Column("request_hash", sa.String(length=64), nullable=False),
+            sa.Column("status_code", sa.Integer(), nullable=True),
+            sa.Column("response_body", postgresql.JSONB(), nullable=True),
+            sa.Column("response_headers", postgresql.JSONB(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+            sa.PrimaryKeyConstraint("key", name="idempotency_keys_pkey"),
+        )
+        op.create_index("idempotency_keys_expires_at_idx", "idempotency_keys", ["expires_at"])
+
+    if _missing("upstream_quota"):
+        op.create_table(
+            "upstream_quota",
+            sa.Column("bucket", sa.String(length=64), nullable=False),
+            sa.Column("window_start", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("used", sa.Integer(), nullable=False),
+            sa.Column("last_grant", sa.Integer(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+            sa.PrimaryKeyConstraint("bucket", "window_start", name="upstream_quota_pkey"),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("upstream_quota")
+    op.drop_table("idempotency_keys")
+    op.drop_table("harvest_checkpoints")
+    op.drop_table("fetch_jobs")
+    op.drop_table("api_data")
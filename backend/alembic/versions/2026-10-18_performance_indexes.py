@@ -0,0 +1,53 @@
+"""Индексы для запросов репозиториев, создаваемые без блокировки записи
+
+Revision ID: 0002_performance_indexes
+Revises: 0001_initial
+Create Date: 2026-10-18 10:30:00
+
+CREATE INDEX CONCURRENTLY не работает в транзакции, поэтому индексы создаются в
+autocommit блоке. Если построение прервалось, в БД остается невалидный индекс: его
+нужно удалить (DROP INDEX CONCURRENTLY) и повторить миграцию.
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0002_performance_indexes"
+down_revision = "0001_initial"
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    # Список от новых записей к старым и курсорная пагинация
+    ("ix_api_data_fetched_at_id", "api_data", ["fetched_at", "id"]),
+    # Тот же список по источнику
+    ("ix_api_data_source_fetched_at_id", "api_data", ["source", "fetched_at", "id"]),
+    # Выборка очереди заданий: WHERE status = 'queued' ORDER BY created_at
+    ("ix_fetch_jobs_status_created_at", "fetch_jobs", ["status", "created_at"]),
+)
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+        # Покрывается ix_fetch_jobs_status_created_at
+        op.drop_index(
+            "fetch_jobs_status_idx",
+            table_name="fetch_jobs",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "fetch_jobs_status_idx",
+            "fetch_jobs",
+            ["status"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -2,11 +2,16 @@
 Команда для получения данных из внешнего API и сохранения в БД
 """
 
-from datetime import UTC, datetime
+from datetime import UTC, datetime, timedelta
 from typing import Protocol
+from uuid import UUID
 
+from src.app.application.common.deadline import check_deadline
+from src.app.application.common.ports import ApiClientProtocol, NearDuplicateDetectorProtocol
+from src.app.application.common.services.near_duplicates import resolve_near_duplicate
+from src.app.application.common.services.provider_responses import is_stored, to_entity
 from src.app.domain.entities.api_data import ApiDataEntity
-from src.app.infrastructure.adapters.public_api_client import PublicApiClient
+from src.app.infrastructure.adapters.public_api_client import API_NINJAS_SOURCE, PublicApiClient
 
 
 class ApiDataRepositoryProtocol(Protocol):
@@ -14,29 +19,60 @@ class ApiDataRepositoryProtocol(Protocol):
 
     async def create(self, entity: ApiDataEntity) -> ApiDataEntity: ...
 
+    async def get_latest_by_external_id(
+        self, external_id: str, source: str
+    ) -> ApiDataEntity | None: ...
+
+    async def get_by_id(self, data_id: UUID) -> ApiDataEntity | None: ...
+
 
 class FetchApiDataCommand:
-    """Команда для получения и сохранения данных из внешнего API"""
+    """Команда для получения и сохранения данных из внешнего API.
+
+    Если задан freshness, вопрос по числу сначала ищется в БД среди записей source и
+    запрашивается у внешнего API, только когда сохраненная запись старше freshness.
+    Если задан near_duplicates, новый вопрос перед сохранением проверяется на почти дубликат.
+    """
 
     def __init__(
-        self, repository: ApiDataRepositoryProtocol, api_client: PublicApiClient | None = None
+        self,
+        repository: ApiDataRepositoryProtocol,
+        api_client: ApiClientProtocol | None = None,
+        freshness: timedelta | None = None,
+        near_duplicates: NearDuplicateDetectorProtocol | None = None,
+        source: str = API_NINJAS_SOURCE,
     ):
         self.repository = repository
         self.api_client = api_client or PublicApiClient()
+        self.freshness = freshness
+        self.source = source
+        self.near_duplicates = near_duplicates
 
     async def execute(self, number: int | None = None) -> ApiDataEntity:
         """Выполнение команды получения данных"""
+        stored = None
+        if number and self.freshness is not None:
+            stored = await self.repository.get_latest_by_external_id(str(number), self.source)
+            if stored is not None and datetime.now(UTC) - stored.fetched_at < self.freshness:
+                return stored
+
         if number:
             data_dict = await self.api_client.get_number_fact(number)
         else:
             data_dict = await self.api_client.get_random_fact()
 
-        entity = ApiDataEntity(
-            source=data_dict["source"],
-            title=data_dict["title"],
-            content=data_dict["content"],
-            external_id=data_dict.get("external_id"),
-            fetched_at=datetime.now(UTC),
-        )
+        entity = to_entity(data_dict)
+        if is_stored(data_dict):
+            return entity
+
+        # Ответ уже никто не ждет - не тратим на его сохранение соединение с БД
+        check_deadline()
+        if stored is not None and stored.source == entity.source:
+            # Обновление той же строки: id не меняется и для буфера отложенной записи
+            entity.id = stored.id
 
+        if self.near_duplicates is not None:
+            resolved = await resolve_near_duplicate(entity, self.near_duplicates, self.repository)
+            if resolved is not entity:
+                return resolved
         return await self.repository.create(entity)
@@ -0,0 +1,139 @@
+"""
+Команда пакетного получения данных из внешнего API и сохранения в БД
+"""
+
+import asyncio
+import logging
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from itertools import islice
+from typing import Protocol
+from uuid import UUID
+
+from src.app.application.common.deadline import check_deadline
+from src.app.application.common.exceptions import NearDuplicateError
+from src.app.application.common.ports import ApiClientProtocol, NearDuplicateDetectorProtocol
+from src.app.application.common.services.near_duplicates import resolve_near_duplicate
+from src.app.application.common.services.provider_responses import is_stored, to_entity
+from src.app.domain.entities.api_data import ApiDataEntity
+
+logger = logging.getLogger(__name__)
+
+
+class ApiDataBatchRepositoryProtocol(Protocol):
+    """Протокол репозитория для пакетного сохранения данных API"""
+
+    async def create_many(self, entities: list[ApiDataEntity]) -> list[ApiDataEntity]: ...
+
+    async def get_by_id(self, data_id: UUID) -> ApiDataEntity | None: ...
+
+
+@dataclass
+class BatchItemResult:
+    """Результат получения одного элемента пакета"""
+
+    number: int | None
+    entity: ApiDataEntity | None = None
+    error: str | None = None
+    # Вопрос уже был сохранен (ответ провайдера local или почти дубликат, слитый с оригиналом)
+    stored: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.entity is not None
+
+    @property
+    def to_store(self) -> bool:
+        return self.ok and not self.stored
+
+
+class FetchApiDataBatchCommand:
+    """Команда получения нескольких вопросов с ограничением параллельных запросов"""
+
+    def __init__(
+        self,
+        repository: ApiDataBatchRepositoryProtocol,
+        api_client: ApiClientProtocol,
+        concurrency: int = 8,
+        near_duplicates: NearDuplicateDetectorProtocol | None = None,
+    ):
+        self.repository = repository
+        self.api_client = api_client
+        self.concurrency = max(concurrency, 1)
+        self.near_duplicates = near_duplicates
+
+    async def execute(self, numbers: list[int], random_count: int = 0) -> list[BatchItemResult]:
+        """Получение вопросов по числам и случайных; ошибки фиксируются по элементам"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(number: int | None) -> BatchItemResult:
+            async with semaphore:
+                return await self._fetch(number)
+
+        results = await asyncio.gather(
+            *(fetch(number) for number in _requested(numbers, random_count))
+        )
+
+        succeeded = [result.entity for result in results if result.to_store]
+        if succeeded:
+            check_deadline()
+            await self.repository.create_many(succeeded)
+        return results
+
+    async def stream(
+        self, numbers: list[int], random_count: int = 0
+    ) -> AsyncIterator[BatchItemResult]:
+        """Выдача элементов по мере получения и сохранения.
+
+        Новые запросы к внешнему API запускаются только когда потребитель забирает
+        готовые элементы, поэтому медленный клиент сдерживает и запросы к API.
+        """
+        requested = iter(_requested(numbers, random_count))
+        in_flight: set[asyncio.Task[BatchItemResult]] = set()
+
+        def launch() -> None:
+            for number in islice(requested, self.concurrency - len(in_flight)):
+                in_flight.add(asyncio.create_task(self._fetch(number)))
+
+        try:
+            launch()
+            while in_flight:
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                results = [task.result() for task in done]
+                succeeded = [result.entity for result in results if result.to_store]
+                if succeeded:
+                    check_deadline()
+                    await self.repository.create_many(succeeded)
+                for result in results:
+                    yield result
+                launch()
+        finally:
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+    async def _fetch(self, number: int | None) -> BatchItemResult:
+        try:
+            if number is None:
+                data_dict = await self.api_client.get_random_fact()
+            else:
+                data_dict = await self.api_client.get_number_fact(number)
+        except Exception as e:
+            logger.warning(f"Не удалось получить элемент пакета (число {number}): {e}")
+            return BatchItemResult(number=number, error=str(e) or type(e).__name__)
+
+        entity = to_entity(data_dict)
+        if is_stored(data_dict):
+            return BatchItemResult(number=number, entity=entity, stored=True)
+        if self.near_duplicates is None:
+            return BatchItemResult(number=number, entity=entity)
+        try:
+            resolved = await resolve_near_duplicate(entity, self.near_duplicates, self.repository)
+        except NearDuplicateError as e:
+            return BatchItemResult(number=number, error=str(e))
+        return BatchItemResult(number=number, entity=resolved, stored=resolved is not entity)
+
+
+def _requested(numbers: list[int], random_count: int) -> list[int | None]:
+    """Числа для запросов по числу, затем None для каждого случайного вопроса"""
+    return [*numbers, *([None] * random_count)]
@@ -0,0 +1,58 @@
+"""
+Срок обработки запроса, общий для всех слоев приложения
+"""
+
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from src.app.application.common.exceptions import DeadlineExceededError
+
+_deadline: ContextVar[float | None] = ContextVar("request_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(timeout: float | None) -> Iterator[None]:
+    """Установка срока; вложенный срок не может быть позже внешнего"""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    current = _deadline.get()
+    if current is not None and (deadline is None or current < deadline):
+        deadline = current
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def no_deadline() -> Iterator[None]:
+    """Снятие срока для фоновой работы, запущенной из обработки запроса"""
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_remaining() -> float | None:
+    """Оставшееся до срока время в секундах; None, если срок не задан"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline() -> None:
+    """Отказ, если срок обработки запроса уже истек"""
+    remaining = time_remaining()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceededError("Истек срок обработки запроса")
+
+
+def bounded_timeout(timeout: float) -> float:
+    """Таймаут операции, не выходящий за срок обработки запроса"""
+    check_deadline()
+    remaining = time_remaining()
+    return timeout if remaining is None else min(timeout, remaining)
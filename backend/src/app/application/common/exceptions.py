@@ -0,0 +1,49 @@
+"""
+Исключения прикладного слоя
+"""
+
+from uuid import UUID
+
+
+class UpstreamUnavailableError(ConnectionError):
+    """Внешний API временно недоступен, запрос отклонен без обращения к нему"""
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class UpstreamQuotaExceededError(UpstreamUnavailableError):
+    """Клиентская квота запросов к внешнему API исчерпана"""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Истек срок, отведенный на обработку запроса"""
+
+
+class JobQueueFullError(Exception):
+    """Очередь фоновых заданий заполнена, новое задание не принято"""
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class IdempotencyKeyInProgressError(Exception):
+    """Запрос с тем же ключом идемпотентности еще выполняется"""
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class IdempotencyKeyMismatchError(ValueError):
+    """Ключ идемпотентности уже использован для другого запроса"""
+
+
+class NearDuplicateError(ValueError):
+    """Полученный вопрос почти совпадает с уже сохраненным"""
+
+    def __init__(self, message: str, original_id: UUID):
+        super().__init__(message)
+        self.original_id = original_id
@@ -0,0 +1,35 @@
+"""
+Порты приложения для внешних сервисов
+"""
+
+from typing import Protocol
+from uuid import UUID
+
+from src.app.domain.entities.api_data import ApiDataEntity
+from src.app.domain.entities.fetch_job import FetchJobEntity
+
+
+class ApiClientProtocol(Protocol):
+    """Протокол клиента внешнего API с вопросами викторины"""
+
+    async def get_number_fact(self, number: int) -> dict: ...
+
+    async def get_random_fact(self) -> dict: ...
+
+    async def get_random_facts(self, count: int) -> list[dict]: ...
+
+
+class FetchJobQueueProtocol(Protocol):
+    """Протокол очереди фоновых заданий получения данных"""
+
+    async def submit(self, number: int | None) -> FetchJobEntity: ...
+
+
+class NearDuplicateDetectorProtocol(Protocol):
+    """Протокол поиска почти дубликатов среди сохраненных вопросов"""
+
+    action: str
+
+    def check(self, entity: ApiDataEntity) -> UUID | None: ...
+
+    def add(self, entities: list[ApiDataEntity]) -> None: ...
@@ -0,0 +1,58 @@
+"""
+Обработка почти дубликатов при сохранении полученных вопросов
+"""
+
+from enum import StrEnum
+from typing import Protocol
+from uuid import UUID
+
+from src.app.application.common.exceptions import NearDuplicateError
+from src.app.application.common.ports import NearDuplicateDetectorProtocol
+from src.app.domain.entities.api_data import ApiDataEntity
+
+
+class DuplicateAction(StrEnum):
+    """Действие с новым вопросом, почти совпадающим с сохраненным"""
+
+    FLAG = "flag"
+    MERGE = "merge"
+    REJECT = "reject"
+
+
+class ApiDataLookupProtocol(Protocol):
+    """Протокол получения сохраненной записи по ID"""
+
+    async def get_by_id(self, data_id: UUID) -> ApiDataEntity | None: ...
+
+
+async def resolve_near_duplicate(
+    entity: ApiDataEntity,
+    detector: NearDuplicateDetectorProtocol,
+    repository: ApiDataLookupProtocol,
+) -> ApiDataEntity:
+    """Проверка нового вопроса перед сохранением.
+
+    Возвращает запись для сохранения (flag - с заполненным duplicate_of) или уже
+    сохраненный оригинал (merge), который сохранять не нужно; reject - NearDuplicateError.
+    """
+    original_id = detector.check(entity)
+    if original_id is None:
+        return entity
+
+    original = await repository.get_by_id(original_id)
+    if original is None:
+        # Оригинал еще не записан или его запись не удалась - сохраняем как новый
+        return entity
+    if original.external_id is not None and (original.source, original.external_id) == (
+        entity.source,
+        entity.external_id,
+    ):
+        # Тот же вопрос получен повторно: upsert обновит исходную строку
+        return entity
+
+    if detector.action == DuplicateAction.REJECT:
+        raise NearDuplicateError("Почти такой же вопрос уже сохранен", original_id=original_id)
+    if detector.action == DuplicateAction.MERGE:
+        return original
+    entity.duplicate_of = original_id
+    return entity
@@ -0,0 +1,25 @@
+"""
+Преобразование ответов провайдеров вопросов в сущности
+"""
+
+from datetime import UTC, datetime
+
+from src.app.domain.entities.api_data import ApiDataEntity
+
+
+def is_stored(data: dict) -> bool:
+    """Ответ - уже сохраненная в БД строка (провайдер local), сохранять ее повторно не нужно"""
+    return data.get("id") is not None
+
+
+def to_entity(data: dict) -> ApiDataEntity:
+    """Сущность из ответа провайдера; сохраненная строка сохраняет свои id, source и даты"""
+    if is_stored(data):
+        return ApiDataEntity.model_validate(data)
+    return ApiDataEntity(
+        source=data["source"],
+        title=data["title"],
+        content=data["content"],
+        external_id=data.get("external_id"),
+        fetched_at=datetime.now(UTC),
+    )
@@ -2,23 +2,61 @@
 Запросы для получения данных из БД
 """
 
+from dataclasses import dataclass
+from datetime import datetime
+from enum import StrEnum
 from typing import Protocol
 from uuid import UUID
 
+from src.app.application.common.deadline import check_deadline
 from src.app.domain.entities.api_data import ApiDataEntity
 
 
+class CountStrategy(StrEnum):
+    """Способ получения общего количества записей для списка"""
+
+    # Тем же запросом, что и страница (оконная функция)
+    EXACT = "exact"
+    # Счетчик, который ведут триггеры при вставке и удалении
+    CACHED = "cached"
+    # Оценка планировщика по pg_class.reltuples
+    ESTIMATE = "estimate"
+    # Без общего количества
+    NONE = "none"
+
+
+@dataclass
+class ApiDataPage:
+    """Страница записей с общим количеством и способом его получения"""
+
+    items: list[ApiDataEntity]
+    total: int | None
+    total_kind: CountStrategy
+
+
 class ApiDataRepositoryProtocol(Protocol):
     """Протокол репозитория для данных API"""
 
     async def get_by_id(self, data_id: UUID) -> ApiDataEntity | None: ...
 
-    async def get_all(self, limit: int, offset: int) -> list[ApiDataEntity]: ...
+    async def get_all(
+        self, limit: int, offset: int, after: tuple[datetime, UUID] | None = None
+    ) -> list[ApiDataEntity]: ...
 
-    async def get_by_source(self, source: str, limit: int, offset: int) -> list[ApiDataEntity]: ...
+    async def get_all_with_total(
+        self, limit: int, offset: int, after: tuple[datetime, UUID] | None = None
+    ) -> tuple[list[ApiDataEntity], int]: ...
+
+    async def get_by_source(
+        self, source: str, limit: int, offset: int, after: tuple[datetime, UUID] | None = None
+    ) -> list[ApiDataEntity]: ...
 
     async def count(self) -> int: ...
 
+    async def count_cached(self) -> int: ...
+
+    async def count_estimate(self) -> int | None: ...
+
 
 class GetApiDataQuery:
     """Запрос для получения данных из БД"""
@@ -30,14 +68,38 @@ class GetApiDataQuery:
         """Получение данных по ID"""
         return await self.repository.get_by_id(data_id)
 
-    async def get_all(self, limit: int = 10, offset: int = 0) -> tuple[list[ApiDataEntity], int]:
-        """Получение всех данных с пагинацией"""
-        items = await self.repository.get_all(limit=limit, offset=offset)
-        total = await self.repository.count()
-        return items, total
+    async def get_all(
+        self,
+        limit: int = 10,
+        offset: int = 0,
+        after: tuple[datetime, UUID] | None = None,
+        count: CountStrategy = CountStrategy.EXACT,
+    ) -> ApiDataPage:
+        """Получение всех данных с пагинацией; after - (fetched_at, id) последней записи"""
+        if count == CountStrategy.EXACT:
+            items, total = await self.repository.get_all_with_total(
+                limit=limit, offset=offset, after=after
+            )
+            return ApiDataPage(items, total, count)
+
+        items = await self.repository.get_all(limit=limit, offset=offset, after=after)
+        if count == CountStrategy.NONE:
+            return ApiDataPage(items, None, count)
+        check_deadline()
+        if count == CountStrategy.ESTIMATE:
+            total = await self.repository.count_estimate()
+            if total is not None:
+                return ApiDataPage(items, total, count)
+            # До первого ANALYZE оценки нет
+            count = CountStrategy.CACHED
+        return ApiDataPage(items, await self.repository.count_cached(), count)
 
     async def get_by_source(
-        self, source: str, limit: int = 10, offset: int = 0
+        self,
+        source: str,
+        limit: int = 10,
+        offset: int = 0,
+        after: tuple[datetime, UUID] | None = None,
     ) -> list[ApiDataEntity]:
         """Получение данных по источнику"""
-        return await self.repository.get_by_source(source, limit=limit, offset=offset)
+        return await self.repository.get_by_source(source, limit=limit, offset=offset, after=after)
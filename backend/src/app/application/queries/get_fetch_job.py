@@ -0,0 +1,25 @@
+"""
+Запрос состояния фонового задания получения данных
+"""
+
+from typing import Protocol
+from uuid import UUID
+
+from src.app.domain.entities.fetch_job import FetchJobEntity
+
+
+class FetchJobRepositoryProtocol(Protocol):
+    """Протокол репозитория фоновых заданий"""
+
+    async def get_by_id(self, job_id: UUID) -> FetchJobEntity | None: ...
+
+
+class GetFetchJobQuery:
+    """Запрос для получения состояния задания"""
+
+    def __init__(self, repository: FetchJobRepositoryProtocol):
+        self.repository = repository
+
+    async def get_by_id(self, job_id: UUID) -> FetchJobEntity | None:
+        """Получение задания по ID"""
+        return await self.repository.get_by_id(job_id)
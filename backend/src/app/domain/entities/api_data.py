@@ -3,6 +3,7 @@
 """
 
 from datetime import datetime
+from uuid import UUID
 
 from src.app.domain.entities.base import BaseEntity
 
@@ -15,3 +16,4 @@ class ApiDataEntity(BaseEntity):
     content: str
     external_id: str | None = None
     fetched_at: datetime
+    duplicate_of: UUID | None = None
@@ -0,0 +1,30 @@
+"""
+Доменная сущность для фоновых заданий получения данных из внешнего API
+"""
+
+from datetime import datetime
+from enum import StrEnum
+from uuid import UUID
+
+from src.app.domain.entities.base import BaseEntity
+
+
+class FetchJobStatus(StrEnum):
+    """Состояние задания"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class FetchJobEntity(BaseEntity):
+    """Задание на получение вопроса и сохранение его в БД"""
+
+    number: int | None = None
+    status: FetchJobStatus = FetchJobStatus.QUEUED
+    result_id: UUID | None = None
+    error: str | None = None
+    attempts: int = 0
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
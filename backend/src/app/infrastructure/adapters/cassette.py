@@ -0,0 +1,191 @@
+"""
+Запись ответов внешнего API в компактную кассету и воспроизведение из нее без сети
+
+Формат файла (little-endian):
+    заголовок   MAGIC, версия u16, число записей u64, смещение индекса u64
+    данные      нормализованные ответы в компактном JSON подряд
+    индекс      отсортированные по (endpoint, number) записи фиксированного размера
+                (endpoint u8, number i64, смещение u64, длина u32)
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from enum import IntEnum
+from pathlib import Path
+
+from prometheus_client import Counter
+
+from src.app.application.common.exceptions import UpstreamUnavailableError
+from src.app.application.common.ports import ApiClientProtocol
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"QZCASSET"
+VERSION = 1
+HEADER = struct.Struct("<8sHxxxxxxQQ")
+INDEX_ENTRY = struct.Struct("<BxxxxxxxqQI4x")
+
+UPSTREAM_CASSETTE_LOOKUPS = Counter(
+    "upstream_cassette_lookups_total",
+    "Обращения к кассете с записанными ответами внешнего API",
+    ["endpoint", "result"],
+)
+
+
+class Endpoint(IntEnum):
+    """Метод внешнего API, ответ которого хранится в кассете"""
+
+    TRIVIA = 1
+    FACTS = 2
+
+
+class CassetteWriter:
+    """Потоковая запись кассеты; индекс дописывается при закрытии"""
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(b"\0" * HEADER.size)
+        self._offset = HEADER.size
+        self._index: dict[tuple[int, int], tuple[int, int]] = {}
+        self._next_fact = 0
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def append(self, endpoint: Endpoint, number: int, data: dict) -> None:
+        """Запись ответа; повторная запись по тому же ключу заменяет предыдущую"""
+        payload = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+        self._file.write(payload)
+        self._index[(int(endpoint), number)] = (self._offset, len(payload))
+        self._offset += len(payload)
+
+    def append_fact(self, data: dict) -> None:
+        """Запись случайного вопроса под следующим порядковым номером"""
+        self.append(Endpoint.FACTS, self._next_fact, data)
+        self._next_fact += 1
+
+    def close(self) -> None:
+        """Запись индекса и заголовка с атомарной заменой файла кассеты"""
+        if self._file.closed:
+            return
+        index_offset = self._offset
+        for (endpoint, number), (offset, length) in sorted(self._index.items()):
+            self._file.write(INDEX_ENTRY.pack(endpoint, number, offset, length))
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, VERSION, len(self._index), index_offset))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+        logger.info(f"Кассета записана: {self.path}, записей: {len(self._index)}")
+
+
+class CassetteReader:
+    """Чтение кассеты через mmap: открытие не зависит от числа записей"""
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = Path(path)
+        with open(self.path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self._count, self._index_offset = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"Файл {self.path} не является кассетой версии {VERSION}")
+
+        self._facts_start = self._lower_bound((Endpoint.FACTS, -(2**63)))
+        self._facts_end = self._lower_bound((Endpoint.FACTS + 1, -(2**63)))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, position: int) -> tuple[int, int]:
+        endpoint, number, _, _ = INDEX_ENTRY.unpack_from(self._mmap, self._entry_offset(position))
+        return endpoint, number
+
+    @property
+    def facts_count(self) -> int:
+        return self._facts_end - self._facts_start
+
+    def get(self, endpoint: Endpoint, number: int) -> dict | None:
+        """Поиск ответа по методу и числу двоичным поиском по индексу"""
+        position = self._lower_bound((int(endpoint), number))
+        if position < self._count and self[position] == (endpoint, number):
+            return self._load(position)
+        return None
+
+    def fact_at(self, position: int) -> dict:
+        """Случайный вопрос по позиции среди записанных (по кругу)"""
+        return self._load(self._facts_start + position % self.facts_count)
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def _lower_bound(self, key: tuple[int, int]) -> int:
+        return bisect_left(self, key, hi=self._count)
+
+    def _entry_offset(self, position: int) -> int:
+        return self._index_offset + position * INDEX_ENTRY.size
+
+    def _load(self, position: int) -> dict:
+        _, _, offset, length = INDEX_ENTRY.unpack_from(self._mmap, self._entry_offset(position))
+        return json.loads(self._mmap[offset : offset + length])
+
+
+class RecordingApiClient:
+    """Клиент внешнего API, записывающий нормализованные ответы в кассету"""
+
+    def __init__(self, inner: ApiClientProtocol, writer: CassetteWriter):
+        self.inner = inner
+        self.writer = writer
+
+    async def get_number_fact(self, number: int) -> dict:
+        data = await self.inner.get_number_fact(number)
+        self.writer.append(Endpoint.TRIVIA, number, data)
+        return data
+
+    async def get_random_fact(self) -> dict:
+        data = await self.inner.get_random_fact()
+        self.writer.append_fact(data)
+        return data
+
+    async def get_random_facts(self, count: int) -> list[dict]:
+        facts = await self.inner.get_random_facts(count)
+        for data in facts:
+            self.writer.append_fact(data)
+        return facts
+
+
+class ReplayApiClient:
+    """Клиент, отвечающий из кассеты без обращения к сети"""
+
+    def __init__(self, reader: CassetteReader):
+        self.reader = reader
+        self._next_fact = 0
+
+    async def get_number_fact(self, number: int) -> dict:
+        data = self.reader.get(Endpoint.TRIVIA, number)
+        if data is None:
+            UPSTREAM_CASSETTE_LOOKUPS.labels("trivia", "miss").inc()
+            raise UpstreamUnavailableError(f"В кассете нет ответа для числа {number}")
+        UPSTREAM_CASSETTE_LOOKUPS.labels("trivia", "hit").inc()
+        return data
+
+    async def get_random_fact(self) -> dict:
+        facts = await self.get_random_facts(1)
+        return facts[0]
+
+    async def get_random_facts(self, count: int) -> list[dict]:
+        if self.reader.facts_count == 0:
+            UPSTREAM_CASSETTE_LOOKUPS.labels("facts", "miss").inc()
+            raise UpstreamUnavailableError("В кассете нет случайных вопросов")
+        UPSTREAM_CASSETTE_LOOKUPS.labels("facts", "hit").inc(count)
+        start, self._next_fact = self._next_fact, self._next_fact + count
+        return [self.reader.fact_at(position) for position in range(start, start + count)]
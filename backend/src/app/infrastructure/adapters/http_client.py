@@ -0,0 +1,108 @@
+"""
+Общий пул HTTP-соединений для запросов к внешним API
+"""
+
+import asyncio
+import importlib.util
+import logging
+
+import httpx
+from prometheus_client import Gauge
+
+from src.app.setup.config.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_POOL_CONNECTIONS = Gauge(
+    "upstream_http_pool_connections",
+    "Количество соединений в пуле HTTP-клиента внешних API",
+    ["state"],
+)
+UPSTREAM_REQUESTS_IN_FLIGHT = Gauge(
+    "upstream_http_requests_in_flight",
+    "Количество выполняющихся запросов к внешним API",
+    ["host"],
+)
+
+
+class HostConcurrencyLimitTransport(httpx.AsyncBaseTransport):
+    """Транспорт, ограничивающий число одновременных запросов к одному хосту"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_per_host: int):
+        self._transport = transport
+        self._max_per_host = max_per_host
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def pool(self):
+        """Пул соединений нижележащего транспорта"""
+        return getattr(self._transport, "_pool", None)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        in_flight = UPSTREAM_REQUESTS_IN_FLIGHT.labels(host)
+
+        if self._max_per_host <= 0:
+            with in_flight.track_inprogress():
+                return await self._transport.handle_async_request(request)
+
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(self._max_per_host))
+        async with semaphore:
+            with in_flight.track_inprogress():
+                return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def _count_connections(transport: HostConcurrencyLimitTransport, idle: bool) -> int:
+    """Подсчет соединений пула в заданном состоянии"""
+    pool = transport.pool
+    if pool is None:
+        return 0
+    return sum(1 for conn in pool.connections if not conn.is_closed() and conn.is_idle() == idle)
+
+
+def create_http_client(settings: Settings) -> httpx.AsyncClient:
+    """Создание долгоживущего HTTP-клиента с пулом keep-alive соединений"""
+    http2 = settings.UPSTREAM_HTTP2
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP/2 запрошен, но пакет h2 не установлен, используется HTTP/1.1")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY,
+    )
+    transport = HostConcurrencyLimitTransport(
+        httpx.AsyncHTTPTransport(limits=limits, http2=http2),
+        max_per_host=settings.UPSTREAM_MAX_CONCURRENCY_PER_HOST,
+    )
+
+    UPSTREAM_POOL_CONNECTIONS.labels("idle").set_function(
+        lambda: _count_connections(transport, idle=True)
+    )
+    UPSTREAM_POOL_CONNECTIONS.labels("active").set_function(
+        lambda: _count_connections(transport, idle=False)
+    )
+
+    return httpx.AsyncClient(transport=transport, follow_redirects=True)
+
+
+async def warm_up_http_client(client: httpx.AsyncClient, url: str, connections: int) -> None:
+    """Предварительное открытие соединений, чтобы первые запросы не платили за handshake"""
+    if connections <= 0:
+        return
+
+    results = await asyncio.gather(
+        *(client.head(url, timeout=5.0) for _ in range(connections)),
+        return_exceptions=True,
+    )
+    failed = [result for result in results if isinstance(result, Exception)]
+    if failed:
+        logger.warning(
+            f"Не удалось прогреть {len(failed)} из {connections} соединений: {failed[0]}"
+        )
+    else:
+        logger.info(f"Прогрето {connections} соединений к {url}")
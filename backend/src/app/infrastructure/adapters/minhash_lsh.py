@@ -0,0 +1,220 @@
+"""
+MinHash сигнатуры текстов и LSH индекс для поиска почти дубликатов
+"""
+
+import re
+from dataclasses import dataclass, field
+from uuid import UUID
+
+import numpy as np
+
+_WORD_SEPARATOR = re.compile(r"[\W_]+")
+_BYTE = np.uint64(8)
+_SHIFT = np.uint64(32)
+
+
+class MinHasher:
+    """MinHash по символьным шинглам нормализованного текста.
+
+    Шингл из shingle_size байт (до 8) упаковывается в uint64 без хэширования, все
+    num_perm перестановок считаются одной матричной операцией: multiply-shift хэши
+    (a * x + b) >> 32 по модулю 2^64, минимум берется по оси шинглов.
+    """
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        if not 1 <= shingle_size <= 8:
+            raise ValueError("Размер шингла должен быть от 1 до 8 байт")
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # Нечетные множители дают биекцию по модулю 2^64
+        self._a = rng.integers(1, 2**63, size=(num_perm, 1), dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=(num_perm, 1), dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """Сигнатура текста: num_perm минимальных хэшей uint32"""
+        hashed = np.multiply(self._a, self._shingles(text))
+        hashed += self._b
+        hashed >>= _SHIFT
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def signatures(self, texts: list[str]) -> np.ndarray:
+        """Сигнатуры нескольких текстов, матрица len(texts) x num_perm"""
+        result = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        for row, text in enumerate(texts):
+            result[row] = self.signature(text)
+        return result
+
+    def _shingles(self, text: str) -> np.ndarray:
+        normalized = _WORD_SEPARATOR.sub(" ", text.lower()).strip().encode()
+        codes = np.frombuffer(normalized, dtype=np.uint8).astype(np.uint64)
+        if len(codes) < self.shingle_size:
+            codes = np.pad(codes, (0, self.shingle_size - len(codes)))
+        count = len(codes) - self.shingle_size + 1
+        # Повторы шинглов не влияют на минимум, поэтому unique не нужен
+        shingles = codes[:count].copy()
+        for offset in range(1, self.shingle_size):
+            shingles <<= _BYTE
+            shingles |= codes[offset : offset + count]
+        return shingles
+
+
+@dataclass(frozen=True)
+class _SortedKeys:
+    """Отсортированные ключи полос с номерами записей; заменяется целиком"""
+
+    keys: np.ndarray
+    rows: np.ndarray
+
+
+@dataclass
+class _Tail:
+    """Записи, еще не слитые с отсортированным массивом"""
+
+    start: int
+    keys: list[np.ndarray] = field(default_factory=list)
+    lookup: dict[int, list[int]] = field(default_factory=dict)
+
+
+class LshIndex:
+    """LSH индекс MinHash сигнатур: bands полос по num_perm / bands значений.
+
+    Кандидаты - записи, у которых совпала хотя бы одна полоса; сходство проверяется по
+    младшим 16 битам сохраненных сигнатур (b-bit MinHash). Ключи всех полос лежат в
+    одном отсортированном массиве (номер полосы в старших битах), поэтому поиск - два
+    вызова searchsorted. Новые записи попадают в хвост со словарем ключей; слияние
+    хвоста с массивом (merge) разбито на три шага, чтобы линейную по размеру индекса
+    часть можно было выполнить в отдельном потоке, не останавливая поиск и добавление.
+    Запись занимает около 2 * num_perm + 12 * bands байт.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 8):
+        if num_perm % bands:
+            raise ValueError("num_perm должно делиться на количество полос")
+        self.num_perm = num_perm
+        self.bands = bands
+        rng = np.random.default_rng(num_perm * 1000 + bands)
+        self._band_mix = rng.integers(
+            1, 2**63, size=(bands, num_perm // bands), dtype=np.uint64
+        ) | np.uint64(1)
+        self._band_prefix = np.arange(bands, dtype=np.uint64) << _SHIFT
+        self._size = 0
+        self._signatures = np.empty((1024, num_perm), dtype=np.uint16)
+        self._ids = bytearray()
+        self._sorted = _SortedKeys(np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.uint32))
+        self._tail = _Tail(start=0)
+        self._merging: _Tail | None = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def tail_size(self) -> int:
+        """Количество записей, ожидающих слияния"""
+        return self._size - self._tail.start
+
+    def band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """Ключи полос для матрицы сигнатур n x num_perm: номер полосы и 32 бита хэша"""
+        bands = signatures.astype(np.uint64).reshape(len(signatures), self.bands, -1)
+        mixed = (bands * self._band_mix).sum(axis=2, dtype=np.uint64) >> _SHIFT
+        return mixed | self._band_prefix
+
+    def add(self, data_id: UUID, signature: np.ndarray) -> None:
+        """Добавление одной записи"""
+        self.add_many([data_id], signature.reshape(1, -1))
+
+    def add_many(self, ids: list[UUID], signatures: np.ndarray) -> None:
+        """Добавление записей в хвост"""
+        count = len(ids)
+        if not count:
+            return
+        start = self._size
+        self._reserve(start + count)
+        self._signatures[start : start + count] = signatures.astype(np.uint16)
+        self._ids += b"".join(data_id.bytes for data_id in ids)
+        self._size += count
+
+        keys = self.band_keys(signatures)
+        self._tail.keys.append(keys)
+        lookup = self._tail.lookup
+        for row, row_keys in enumerate(keys.tolist(), start):
+            for key in row_keys:
+                lookup.setdefault(key, []).append(row)
+
+    def query(
+        self, signature: np.ndarray, threshold: float, exclude: UUID | None = None
+    ) -> tuple[UUID, float] | None:
+        """Наиболее похожая запись со сходством не ниже threshold"""
+        if not self._size:
+            return None
+        keys = self.band_keys(signature.reshape(1, -1))[0]
+        candidates = self._candidates(keys)
+        rows = np.unique(np.concatenate(candidates)) if candidates else ()
+        if not len(rows):
+            return None
+
+        similarity = (self._signatures[rows] == signature.astype(np.uint16)).mean(axis=1)
+        for position in np.argsort(-similarity, kind="stable"):
+            if similarity[position] < threshold:
+                break
+            data_id = self._id(int(rows[position]))
+            if data_id != exclude:
+                return data_id, float(similarity[position])
+        return None
+
+    def begin_merge(self) -> tuple[_SortedKeys, _Tail] | None:
+        """Шаг 1: фиксация хвоста для слияния; None, если сливать нечего или слияние идет"""
+        if self._merging is not None or not self.tail_size:
+            return None
+        self._merging, self._tail = self._tail, _Tail(start=self._size)
+        return self._sorted, self._merging
+
+    @staticmethod
+    def build_merged(sorted_keys: _SortedKeys, tail: _Tail) -> _SortedKeys:
+        """Шаг 2: новый отсортированный массив; не меняет индекс, безопасен в другом потоке"""
+        keys = np.concatenate(tail.keys)
+        bands = keys.shape[1]
+        rows = np.repeat(np.arange(tail.start, tail.start + len(keys), dtype=np.uint32), bands)
+        keys = keys.ravel()
+        order = np.argsort(keys, kind="stable")
+        positions = np.searchsorted(sorted_keys.keys, keys[order], side="right")
+        return _SortedKeys(
+            np.insert(sorted_keys.keys, positions, keys[order]),
+            np.insert(sorted_keys.rows, positions, rows[order]),
+        )
+
+    def finish_merge(self, merged: _SortedKeys) -> None:
+        """Шаг 3: подмена массива и удаление слитого хвоста"""
+        self._sorted = merged
+        self._merging = None
+
+    def merge(self) -> None:
+        """Слияние хвоста в текущем потоке"""
+        pending = self.begin_merge()
+        if pending is not None:
+            self.finish_merge(self.build_merged(*pending))
+
+    def _candidates(self, keys: np.ndarray) -> list[np.ndarray]:
+        sorted_keys = self._sorted
+        left = np.searchsorted(sorted_keys.keys, keys, side="left")
+        right = np.searchsorted(sorted_keys.keys, keys, side="right")
+        candidates = [sorted_keys.rows[start:end] for start, end in zip(left, right) if end > start]
+        for tail in (self._merging, self._tail):
+            if tail is not None and tail.lookup:
+                rows = [row for key in keys.tolist() for row in tail.lookup.get(key, ())]
+                if rows:
+                    candidates.append(np.array(rows, dtype=np.uint32))
+        return candidates
+
+    def _id(self, row: int) -> UUID:
+        return UUID(bytes=bytes(self._ids[row * 16 : row * 16 + 16]))
+
+    def _reserve(self, size: int) -> None:
+        capacity = len(self._signatures)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        grown = np.empty((capacity, self.num_perm), dtype=np.uint16)
+        grown[: self._size] = self._signatures[: self._size]
+        self._signatures = grown
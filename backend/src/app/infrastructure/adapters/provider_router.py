@@ -0,0 +1,190 @@
+"""
+Маршрутизация запросов вопросов викторины между несколькими провайдерами
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from enum import StrEnum
+from typing import TypeVar
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from src.app.application.common.ports import ApiClientProtocol
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+TRIVIA_PROVIDER_REQUESTS = Counter(
+    "trivia_provider_requests_total",
+    "Запросы к провайдерам вопросов викторины",
+    ["provider", "result"],
+)
+TRIVIA_PROVIDER_LATENCY = Histogram(
+    "trivia_provider_latency_seconds",
+    "Задержка успешных ответов провайдеров вопросов викторины",
+    ["provider"],
+)
+TRIVIA_PROVIDER_LATENCY_EWMA = Gauge(
+    "trivia_provider_latency_ewma_seconds",
+    "Сглаженная задержка провайдера, используемая при маршрутизации",
+    ["provider"],
+)
+
+
+class RoutingMode(StrEnum):
+    """Режим выбора провайдера"""
+
+    WEIGHTED = "weighted"
+    FASTEST = "fastest"
+
+
+class ProviderStats:
+    """Экспоненциально сглаженные задержка и доля ошибок провайдера"""
+
+    def __init__(self, alpha: float = 0.2, initial_latency: float = 0.1):
+        self.alpha = alpha
+        self.latency = initial_latency
+        self.error_rate = 0.0
+
+    def observe_success(self, seconds: float) -> None:
+        self.latency += self.alpha * (seconds - self.latency)
+        self.error_rate += self.alpha * (0.0 - self.error_rate)
+
+    def observe_failure(self) -> None:
+        self.error_rate += self.alpha * (1.0 - self.error_rate)
+
+    def observe_cancelled(self, seconds: float) -> None:
+        """Отмененный запрос длился не меньше seconds: учитывается как нижняя граница"""
+        if seconds > self.latency:
+            self.latency += self.alpha * (seconds - self.latency)
+
+    def cost(self) -> float:
+        """Ожидаемая стоимость запроса: задержка с поправкой на вероятность отказа"""
+        return max(self.latency, 1e-3) / max(1.0 - self.error_rate, 0.05)
+
+
+@dataclass
+class TriviaProvider:
+    """Источник вопросов викторины с весом маршрутизации"""
+
+    name: str
+    client: ApiClientProtocol
+    weight: float = 1.0
+    stats: ProviderStats = field(default_factory=ProviderStats)
+
+    def score(self) -> float:
+        return self.weight / self.stats.cost()
+
+
+class ProviderRouter:
+    """Клиент, распределяющий запросы между провайдерами по весу и наблюдаемой задержке.
+
+    В режиме weighted запрос уходит одному провайдеру, выбранному случайно с
+    вероятностью, пропорциональной весу и обратной стоимости, а при ошибке -
+    следующему по рейтингу. В режиме fastest запрос одновременно уходит fanout
+    лучшим провайдерам, побеждает первый успешный ответ, остальные отменяются.
+    """
+
+    def __init__(
+        self,
+        providers: list[TriviaProvider],
+        mode: RoutingMode = RoutingMode.WEIGHTED,
+        fanout: int = 2,
+        rng: random.Random | None = None,
+    ):
+        if not any(provider.weight > 0 for provider in providers):
+            raise ValueError("Нужен хотя бы один провайдер с положительным весом")
+        self.providers = providers
+        self.mode = mode
+        self.fanout = max(fanout, 1)
+        self._rng = rng or random.Random()
+        for provider in providers:
+            TRIVIA_PROVIDER_LATENCY_EWMA.labels(provider.name).set_function(
+                lambda stats=provider.stats: stats.latency
+            )
+
+    async def get_number_fact(self, number: int) -> dict:
+        return await self._route(lambda client: client.get_number_fact(number))
+
+    async def get_random_fact(self) -> dict:
+        return await self._route(lambda client: client.get_random_fact())
+
+    async def get_random_facts(self, count: int) -> list[dict]:
+        return await self._route(lambda client: client.get_random_facts(count))
+
+    def ranked(self) -> list[TriviaProvider]:
+        """Провайдеры с положительным весом по убыванию рейтинга"""
+        active = [provider for provider in self.providers if provider.weight > 0]
+        return sorted(active, key=lambda provider: provider.score(), reverse=True)
+
+    async def _route(self, fn: Callable[[ApiClientProtocol], Awaitable[T]]) -> T:
+        if self.mode is RoutingMode.FASTEST:
+            return await self._fastest(fn)
+        return await self._weighted(fn)
+
+    async def _weighted(self, fn: Callable[[ApiClientProtocol], Awaitable[T]]) -> T:
+        """Запрос выбранному провайдеру с переходом к следующим при ошибке"""
+        ranked = self.ranked()
+        first = self._rng.choices(ranked, weights=[provider.score() for provider in ranked])[0]
+        ranked.remove(first)
+
+        error: Exception | None = None
+        for provider in [first, *ranked]:
+            try:
+                return await self._call(provider, fn)
+            except Exception as e:
+                logger.warning(f"Провайдер '{provider.name}' не ответил: {e}")
+                error = e
+        raise error
+
+    async def _fastest(self, fn: Callable[[ApiClientProtocol], Awaitable[T]]) -> T:
+        """Одновременный запрос нескольким провайдерам; побеждает первый успешный"""
+        started = time.perf_counter()
+        tasks = {
+            asyncio.ensure_future(self._call(provider, fn)): provider
+            for provider in self.ranked()[: self.fanout]
+        }
+        pending = set(tasks)
+        error: BaseException | None = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                    logger.warning(f"Провайдер '{tasks[task].name}' не ответил: {error}")
+            raise error
+        finally:
+            elapsed = time.perf_counter() - started
+            for task in pending:
+                task.cancel()
+                provider = tasks[task]
+                provider.stats.observe_cancelled(elapsed)
+                TRIVIA_PROVIDER_REQUESTS.labels(provider.name, "cancelled").inc()
+
+    async def _call(
+        self, provider: TriviaProvider, fn: Callable[[ApiClientProtocol], Awaitable[T]]
+    ) -> T:
+        started = time.perf_counter()
+        try:
+            result = await fn(provider.client)
+        except LookupError:
+            # У провайдера нет такого вопроса - это не признак его неисправности
+            TRIVIA_PROVIDER_REQUESTS.labels(provider.name, "miss").inc()
+            raise
+        except Exception:
+            provider.stats.observe_failure()
+            TRIVIA_PROVIDER_REQUESTS.labels(provider.name, "error").inc()
+            raise
+
+        elapsed = time.perf_counter() - started
+        provider.stats.observe_success(elapsed)
+        TRIVIA_PROVIDER_REQUESTS.labels(provider.name, "success").inc()
+        TRIVIA_PROVIDER_LATENCY.labels(provider.name).observe(elapsed)
+        return result
@@ -0,0 +1,116 @@
+"""
+Буфер заранее полученных случайных вопросов с фоновым пополнением
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from src.app.application.common.ports import ApiClientProtocol
+from src.app.infrastructure.adapters.rate_limiter import Priority, upstream_priority
+
+logger = logging.getLogger(__name__)
+
+RANDOM_BUFFER_DEPTH = Gauge(
+    "random_fact_buffer_depth",
+    "Количество готовых случайных вопросов в буфере",
+)
+RANDOM_BUFFER_REQUESTS = Counter(
+    "random_fact_buffer_requests_total",
+    "Запросы случайных вопросов к буферу",
+    ["result"],
+)
+RANDOM_BUFFER_REFILL_SECONDS = Histogram(
+    "random_fact_buffer_refill_seconds",
+    "Длительность одного запроса пополнения буфера случайных вопросов",
+)
+
+
+class RandomFactBuffer:
+    """Клиент внешнего API, отдающий случайные вопросы из заранее заполненного буфера"""
+
+    def __init__(
+        self,
+        inner: ApiClientProtocol,
+        high_watermark: int,
+        low_watermark: int,
+        batch_size: int = 1,
+        max_backoff: float = 30.0,
+    ):
+        self.inner = inner
+        self.high_watermark = high_watermark
+        self.low_watermark = min(low_watermark, high_watermark)
+        self.batch_size = max(batch_size, 1)
+        self.max_backoff = max_backoff
+        self._items: deque[dict] = deque(maxlen=high_watermark)
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        RANDOM_BUFFER_DEPTH.set_function(lambda: len(self._items))
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def start(self) -> None:
+        """Запуск фонового пополнения буфера"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            self._wakeup.set()
+
+    async def aclose(self) -> None:
+        """Остановка фонового пополнения"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def get_number_fact(self, number: int) -> dict:
+        """Вопросы по числу буфером не обслуживаются"""
+        return await self.inner.get_number_fact(number)
+
+    async def get_random_fact(self) -> dict:
+        """Получение случайного вопроса из буфера или напрямую, если буфер пуст"""
+        if self._items:
+            RANDOM_BUFFER_REQUESTS.labels("hit").inc()
+            fact = self._items.popleft()
+            if len(self._items) < self.low_watermark:
+                self._wakeup.set()
+            return fact
+
+        RANDOM_BUFFER_REQUESTS.labels("miss").inc()
+        self._wakeup.set()
+        return await self.inner.get_random_fact()
+
+    async def get_random_facts(self, count: int) -> list[dict]:
+        """Пакетное получение случайных вопросов в обход буфера"""
+        return await self.inner.get_random_facts(count)
+
+    async def _run(self) -> None:
+        """Пополнение буфера до верхней границы после опускания ниже нижней"""
+        with upstream_priority(Priority.BACKGROUND):
+            await self._refill_forever()
+
+    async def _refill_forever(self) -> None:
+        backoff = 1.0
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            while len(self._items) < self.high_watermark:
+                count = min(self.batch_size, self.high_watermark - len(self._items))
+                started = time.perf_counter()
+                try:
+                    facts = await self.inner.get_random_facts(count)
+                except Exception as e:
+                    logger.warning(f"Не удалось пополнить буфер случайных вопросов: {e}")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+                    continue
+
+                RANDOM_BUFFER_REFILL_SECONDS.observe(time.perf_counter() - started)
+                if not facts:
+                    break
+                self._items.extend(facts)
+                backoff = 1.0
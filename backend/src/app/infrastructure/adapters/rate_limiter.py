@@ -0,0 +1,296 @@
+"""
+Планировщик запросов к внешнему API с token bucket, дневной квотой и приоритетами
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import UTC, datetime, timedelta
+from enum import IntEnum
+from typing import Protocol
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from src.app.application.common.deadline import time_remaining
+from src.app.application.common.exceptions import UpstreamQuotaExceededError
+from src.app.application.common.ports import ApiClientProtocol
+
+UPSTREAM_RATE_LIMIT_QUEUE = Gauge(
+    "upstream_rate_limit_queue_depth",
+    "Количество запросов к внешнему API, ожидающих токен",
+)
+UPSTREAM_RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "upstream_rate_limit_wait_seconds",
+    "Время ожидания токена перед запросом к внешнему API",
+    ["priority"],
+)
+UPSTREAM_RATE_LIMIT_REJECTED = Counter(
+    "upstream_rate_limit_rejected_total",
+    "Запросы к внешнему API, отклоненные планировщиком квоты",
+    ["priority", "reason"],
+)
+UPSTREAM_DAILY_QUOTA_REMAINING = Gauge(
+    "upstream_daily_quota_remaining",
+    "Остаток дневной квоты внешнего API",
+)
+
+
+class Priority(IntEnum):
+    """Приоритет запроса к внешнему API; меньшее значение обслуживается раньше"""
+
+    INTERACTIVE = 0
+    BACKGROUND = 10
+
+
+_current_priority: ContextVar[Priority] = ContextVar(
+    "upstream_priority", default=Priority.INTERACTIVE
+)
+
+
+@contextmanager
+def upstream_priority(priority: Priority) -> Iterator[None]:
+    """Установка приоритета для запросов к внешнему API в текущем контексте"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority() -> Priority:
+    return _current_priority.get()
+
+
+class DailyBudget:
+    """Дневная квота запросов, сбрасываемая в полночь UTC"""
+
+    def __init__(self, limit: int, now: Callable[[], datetime] = lambda: datetime.now(UTC)):
+        self.limit = limit
+        self._now = now
+        self._day = now().date()
+        self._used = 0
+        UPSTREAM_DAILY_QUOTA_REMAINING.set_function(self.remaining)
+
+    def remaining(self) -> int:
+        self._roll_over()
+        return max(self.limit - self._used, 0)
+
+    def try_consume(self, amount: int = 1) -> bool:
+        self._roll_over()
+        if self._used + amount > self.limit:
+            return False
+        self._used += amount
+        return True
+
+    def give_back(self, amount: int = 1) -> None:
+        """Возврат неизрасходованных запросов текущего дня"""
+        self._roll_over()
+        self._used = max(self._used - amount, 0)
+
+    def seconds_until_reset(self) -> float:
+        now = self._now()
+        tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), UTC)
+        return (tomorrow - now).total_seconds()
+
+    def _roll_over(self) -> None:
+        today = self._now().date()
+        if today != self._day:
+            self._day = today
+            self._used = 0
+
+
+class SharedQuotaProtocol(Protocol):
+    """Квота, общая для нескольких реплик приложения"""
+
+    def try_take(self) -> bool: ...
+
+    def give_back(self) -> None: ...
+
+    async def replenish(self) -> float: ...
+
+    def available_tokens(self) -> float: ...
+
+    def daily_allowance(self) -> tuple[int, float] | None: ...
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    future: asyncio.Future = field(compare=False)
+    deadline: float = field(compare=False)
+
+
+class TokenBucketScheduler:
+    """Token bucket с очередью ожидающих по приоритету и ограниченным временем ожидания"""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        daily_budget: DailyBudget | None = None,
+        max_wait: dict[Priority, float] | None = None,
+        shared_quota: SharedQuotaProtocol | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.daily_budget = daily_budget
+        self.shared_quota = shared_quota
+        self.max_wait = max_wait or {}
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated_at = clock()
+        self._waiters: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._dispatcher: asyncio.Task | None = None
+        UPSTREAM_RATE_LIMIT_QUEUE.set_function(lambda: len(self._waiters))
+
+    def available_tokens(self) -> float:
+        """Количество токенов, доступных прямо сейчас, с учетом общей квоты реплик"""
+        self._refill()
+        if self.shared_quota is None:
+            return self._tokens
+        return min(self._tokens, self.shared_quota.available_tokens())
+
+    def daily_allowance(self) -> tuple[int, float] | None:
+        """Остаток дневной квоты и время до ее сброса; None - квота не задана"""
+        if self.daily_budget is not None:
+            return self.daily_budget.remaining(), self.daily_budget.seconds_until_reset()
+        if self.shared_quota is not None:
+            return self.shared_quota.daily_allowance()
+        return None
+
+    async def acquire(self, priority: Priority | None = None) -> None:
+        """Ожидание токена; отказ, если он не может быть выдан до истечения срока ожидания"""
+        priority = current_priority() if priority is None else priority
+        started = self._clock()
+        self._check_daily_budget(priority)
+
+        self._refill()
+        if not self._waiters and self._tokens >= 1 and self._take_shared():
+            self._grant()
+            UPSTREAM_RATE_LIMIT_WAIT_SECONDS.labels(priority.name.lower()).observe(0)
+            return
+
+        max_wait = self.max_wait.get(priority, float("inf"))
+        remaining = time_remaining()
+        if remaining is not None:
+            max_wait = min(max_wait, remaining)
+        deadline = started + max_wait
+        ahead = sum(1 for waiter in self._waiters if waiter.priority <= priority)
+        estimated_wait = max(ahead + 1 - self._tokens, 0) / self.rate
+        if started + estimated_wait > deadline:
+            self._reject(priority, "deadline", retry_after=estimated_wait)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, _Waiter(priority, next(self._seq), future, deadline))
+        self._ensure_dispatcher()
+
+        timeout = None if deadline == float("inf") else deadline - started
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except TimeoutError:
+            if not future.done():
+                future.cancel()
+                self._reject(priority, "timeout", retry_after=1 / self.rate)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Токен уже выдан, но вызывающий отменен — возвращаем его в ведро и квоты
+                self._give_back()
+            future.cancel()
+            raise
+
+        UPSTREAM_RATE_LIMIT_WAIT_SECONDS.labels(priority.name.lower()).observe(
+            self._clock() - started
+        )
+
+    def _check_daily_budget(self, priority: Priority) -> None:
+        if self.daily_budget is not None and self.daily_budget.remaining() <= 0:
+            self._reject(
+                priority, "daily_quota", retry_after=self.daily_budget.seconds_until_reset()
+            )
+
+    def _take_shared(self) -> bool:
+        return self.shared_quota is None or self.shared_quota.try_take()
+
+    def _grant(self) -> None:
+        self._tokens -= 1
+        if self.daily_budget is not None:
+            self.daily_budget.try_consume()
+
+    def _give_back(self) -> None:
+        self._tokens = min(self._tokens + 1, self.burst)
+        if self.daily_budget is not None:
+            self.daily_budget.give_back()
+        if self.shared_quota is not None:
+            self.shared_quota.give_back()
+
+    def _reject(self, priority: Priority, reason: str, retry_after: float) -> None:
+        UPSTREAM_RATE_LIMIT_REJECTED.labels(priority.name.lower(), reason).inc()
+        raise UpstreamQuotaExceededError(
+            "Квота запросов к внешнему API исчерпана", retry_after=retry_after
+        )
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def _ensure_dispatcher(self) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        """Выдача токенов ожидающим в порядке приоритета по мере пополнения ведра"""
+        while self._waiters:
+            self._refill()
+            shared_wait = 0.0
+            while self._waiters and self._tokens >= 1:
+                waiter = self._waiters[0]
+                if waiter.future.done():
+                    heapq.heappop(self._waiters)
+                    continue
+                if self.daily_budget is not None and self.daily_budget.remaining() <= 0:
+                    heapq.heappop(self._waiters)
+                    waiter.future.set_exception(
+                        UpstreamQuotaExceededError(
+                            "Квота запросов к внешнему API исчерпана",
+                            retry_after=self.daily_budget.seconds_until_reset(),
+                        )
+                    )
+                    continue
+                if not self._take_shared():
+                    shared_wait = await self.shared_quota.replenish()
+                    break
+                heapq.heappop(self._waiters)
+                self._grant()
+                waiter.future.set_result(None)
+
+            if self._waiters:
+                await asyncio.sleep(max(max(1 - self._tokens, 0) / self.rate, shared_wait))
+
+
+class RateLimitedApiClient:
+    """Клиент внешнего API, согласующий каждый запрос с планировщиком квоты"""
+
+    def __init__(self, inner: ApiClientProtocol, scheduler: TokenBucketScheduler):
+        self.inner = inner
+        self.scheduler = scheduler
+
+    async def get_number_fact(self, number: int) -> dict:
+        await self.scheduler.acquire()
+        return await self.inner.get_number_fact(number)
+
+    async def get_random_fact(self) -> dict:
+        await self.scheduler.acquire()
+        return await self.inner.get_random_fact()
+
+    async def get_random_facts(self, count: int) -> list[dict]:
+        await self.scheduler.acquire()
+        return await self.inner.get_random_facts(count)
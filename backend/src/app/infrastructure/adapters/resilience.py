@@ -0,0 +1,292 @@
+"""
+Устойчивость обращений к внешнему API: circuit breaker, бюджет повторов и hedged-запросы
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from enum import IntEnum
+from typing import TypeVar
+
+from prometheus_client import Counter, Gauge
+
+from src.app.application.common.deadline import time_remaining
+from src.app.application.common.exceptions import DeadlineExceededError, UpstreamUnavailableError
+from src.app.application.common.ports import ApiClientProtocol
+from src.app.infrastructure.adapters.public_api_client import UpstreamHTTPError
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_CIRCUIT_STATE = Gauge(
+    "upstream_circuit_breaker_state",
+    "Состояние circuit breaker внешнего API (0 - закрыт, 1 - полуоткрыт, 2 - открыт)",
+)
+UPSTREAM_CIRCUIT_TRANSITIONS = Counter(
+    "upstream_circuit_breaker_transitions_total",
+    "Переходы circuit breaker внешнего API между состояниями",
+    ["state"],
+)
+UPSTREAM_RETRIES = Counter(
+    "upstream_retries_total",
+    "Повторные запросы к внешнему API",
+)
+UPSTREAM_RETRY_BUDGET_EXHAUSTED = Counter(
+    "upstream_retry_budget_exhausted_total",
+    "Повторы и hedged-запросы, не выполненные из-за исчерпания бюджета",
+)
+UPSTREAM_HEDGED_REQUESTS = Counter(
+    "upstream_hedged_requests_total",
+    "Hedged-запросы к внешнему API",
+    ["winner"],
+)
+
+
+class CircuitState(IntEnum):
+    """Состояние circuit breaker"""
+
+    CLOSED = 0
+    HALF_OPEN = 1
+    OPEN = 2
+
+
+class CircuitBreaker:
+    """Circuit breaker, размыкающийся после серии последовательных ошибок"""
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        recovery_timeout: float,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        UPSTREAM_CIRCUIT_STATE.set(self._state)
+
+    @property
+    def state(self) -> CircuitState:
+        if (
+            self._state is CircuitState.OPEN
+            and self._clock() - self._opened_at >= self.recovery_timeout
+        ):
+            self._transition(CircuitState.HALF_OPEN)
+        return self._state
+
+    def allow(self) -> bool:
+        """Проверка возможности запроса; при разомкнутой цепи сразу выбрасывает ошибку.
+
+        Возвращает True, если запрос занял место пробного в полуоткрытом состоянии: его
+        результат нужно записать (record_success/record_failure) или освободить место (release).
+        """
+        state = self.state
+        if state is CircuitState.CLOSED:
+            return False
+        if state is CircuitState.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+            self._half_open_calls += 1
+            return True
+
+        retry_after = max(self.recovery_timeout - (self._clock() - self._opened_at), 0.0)
+        raise UpstreamUnavailableError(
+            "Внешний API временно недоступен (circuit breaker разомкнут)",
+            retry_after=retry_after,
+        )
+
+    def record_success(self) -> None:
+        self._failures = 0
+        if self._state is not CircuitState.CLOSED:
+            self._transition(CircuitState.CLOSED)
+
+    def release(self) -> None:
+        """Освобождение места пробного запроса, результат которого не говорит о состоянии API"""
+        if self._state is CircuitState.HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._state is CircuitState.HALF_OPEN or self._failures >= self.failure_threshold:
+            self._opened_at = self._clock()
+            if self._state is not CircuitState.OPEN:
+                self._transition(CircuitState.OPEN)
+
+    def _transition(self, state: CircuitState) -> None:
+        logger.warning(f"Circuit breaker внешнего API: {self._state.name} -> {state.name}")
+        self._state = state
+        self._half_open_calls = 0
+        UPSTREAM_CIRCUIT_STATE.set(state)
+        UPSTREAM_CIRCUIT_TRANSITIONS.labels(state.name.lower()).inc()
+
+
+class RetryBudget:
+    """Глобальный бюджет повторов: каждый запрос пополняет его на долю токена"""
+
+    def __init__(self, ratio: float, max_tokens: float):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+
+    def record_request(self) -> None:
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        if self._tokens < 1:
+            UPSTREAM_RETRY_BUDGET_EXHAUSTED.inc()
+            return False
+        self._tokens -= 1
+        return True
+
+
+class LatencyTracker:
+    """Скользящее окно задержек для вычисления перцентиля"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def is_retryable(error: Exception) -> bool:
+    """Повторяются только сетевые ошибки, таймауты, 429 и 5xx"""
+    if isinstance(error, (UpstreamUnavailableError, DeadlineExceededError)):
+        return False
+    if isinstance(error, UpstreamHTTPError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+class ResilientApiClient:
+    """Клиент внешнего API с быстрым отказом, повторами с джиттером и hedged-запросами"""
+
+    def __init__(
+        self,
+        inner: ApiClientProtocol,
+        breaker: CircuitBreaker,
+        retry_budget: RetryBudget,
+        max_retries: int = 2,
+        base_delay: float = 0.1,
+        max_delay: float = 2.0,
+        hedge_percentile: float | None = None,
+        hedge_min_delay: float = 0.05,
+        latency: LatencyTracker | None = None,
+    ):
+        self.inner = inner
+        self.breaker = breaker
+        self.retry_budget = retry_budget
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.latency = latency or LatencyTracker()
+
+    async def get_number_fact(self, number: int) -> dict:
+        return await self._call(lambda: self.inner.get_number_fact(number))
+
+    async def get_random_fact(self) -> dict:
+        return await self._call(self.inner.get_random_fact)
+
+    async def get_random_facts(self, count: int) -> list[dict]:
+        return await self._call(lambda: self.inner.get_random_facts(count))
+
+    async def _call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Выполнение запроса с повторами в пределах бюджета"""
+        self.retry_budget.record_request()
+        attempt = 0
+        while True:
+            probe = self.breaker.allow()
+            try:
+                result = await self._attempt(fn)
+            except Exception as e:
+                if not is_retryable(e):
+                    # 4xx в закрытой цепи не меняет счетчик сбоев
+                    if probe and isinstance(e, UpstreamHTTPError):
+                        # API ответил: пробный запрос закрывает цепь
+                        self.breaker.record_success()
+                    elif probe:
+                        self.breaker.release()
+                    raise
+                self.breaker.record_failure()
+                if (
+                    attempt >= self.max_retries
+                    or self.breaker.state is CircuitState.OPEN
+                    or not self.retry_budget.try_withdraw()
+                ):
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt + 1)))
+                remaining = time_remaining()
+                if remaining is not None and remaining <= delay:
+                    raise
+                attempt += 1
+                UPSTREAM_RETRIES.inc()
+                logger.warning(f"Повтор запроса к внешнему API через {delay:.2f}с: {e}")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Отмена (отключение клиента, срок запроса) не говорит о состоянии API
+                if probe:
+                    self.breaker.release()
+                raise
+
+            self.breaker.record_success()
+            return result
+
+    async def _attempt(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Одна попытка; при медленном ответе дублируется hedged-запросом"""
+        hedge_delay = None
+        if self.hedge_percentile is not None:
+            hedge_delay = self.latency.percentile(self.hedge_percentile)
+        if hedge_delay is None:
+            return await self._timed(fn)
+
+        primary = asyncio.ensure_future(self._timed(fn))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=max(hedge_delay, self.hedge_min_delay))
+            if done or not self.retry_budget.try_withdraw():
+                return await primary
+
+            hedge = asyncio.ensure_future(self._timed(fn))
+            pending.add(hedge)
+            error: BaseException | None = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled():
+                        # Отмененная попытка не дает ни ответа, ни ошибки API
+                        continue
+                    if task.exception() is None:
+                        UPSTREAM_HEDGED_REQUESTS.labels(
+                            "hedge" if task is hedge else "primary"
+                        ).inc()
+                        return task.result()
+                    error = task.exception()
+            if error is None:
+                raise asyncio.CancelledError()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _timed(self, fn: Callable[[], Awaitable[T]]) -> T:
+        started = time.perf_counter()
+        result = await fn()
+        self.latency.observe(time.perf_counter() - started)
+        return result
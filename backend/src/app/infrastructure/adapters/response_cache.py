@@ -0,0 +1,144 @@
+"""
+Кэш ответов внешнего API с вытеснением LRU, TTL и stale-while-revalidate
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+from typing import Any
+
+from prometheus_client import Counter, Gauge
+
+from src.app.application.common.deadline import no_deadline
+from src.app.application.common.ports import ApiClientProtocol
+from src.app.infrastructure.adapters.rate_limiter import Priority, upstream_priority
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_CACHE_REQUESTS = Counter(
+    "upstream_cache_requests_total",
+    "Обращения к кэшу ответов внешнего API",
+    ["result"],
+)
+UPSTREAM_CACHE_SIZE = Gauge(
+    "upstream_cache_entries",
+    "Количество записей в кэше ответов внешнего API",
+)
+
+
+@dataclass(slots=True)
+class CacheLookup:
+    """Результат поиска в кэше"""
+
+    value: Any
+    stale: bool
+
+
+@dataclass(slots=True)
+class _CacheEntry:
+    value: Any
+    expires_at: float
+
+
+class TtlLruCache:
+    """Ограниченный по размеру кэш с TTL и окном отдачи устаревших значений"""
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        stale_ttl: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, _CacheEntry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> CacheLookup | None:
+        """Получение значения; None, если записи нет или она устарела сверх окна"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        now = self._clock()
+        if now >= entry.expires_at + self.stale_ttl:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return CacheLookup(value=entry.value, stale=now >= entry.expires_at)
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """Сохранение значения с вытеснением наименее используемых записей"""
+        ttl = self.ttl if ttl is None else ttl
+        self._entries[key] = _CacheEntry(value=value, expires_at=self._clock() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class CachedApiClient:
+    """Клиент внешнего API, отвечающий на повторные запросы по числу из памяти"""
+
+    def __init__(self, inner: ApiClientProtocol, cache: TtlLruCache):
+        self.inner = inner
+        self.cache = cache
+        self._refreshing: dict[int, asyncio.Task] = {}
+        UPSTREAM_CACHE_SIZE.set_function(lambda: len(self.cache))
+
+    async def get_number_fact(self, number: int) -> dict:
+        """Получение вопроса по числу из кэша или внешнего API"""
+        cached = self.cache.get(number)
+        if cached is not None and not cached.stale:
+            UPSTREAM_CACHE_REQUESTS.labels("hit").inc()
+            return dict(cached.value)
+
+        if cached is not None:
+            UPSTREAM_CACHE_REQUESTS.labels("stale").inc()
+            self._schedule_refresh(number)
+            return dict(cached.value)
+
+        UPSTREAM_CACHE_REQUESTS.labels("miss").inc()
+        data = await self.inner.get_number_fact(number)
+        self.cache.set(number, data)
+        return dict(data)
+
+    async def get_random_fact(self) -> dict:
+        """Случайные вопросы не кэшируются"""
+        return await self.inner.get_random_fact()
+
+    async def get_random_facts(self, count: int) -> list[dict]:
+        """Пакетное получение случайных вопросов без изменений"""
+        return await self.inner.get_random_facts(count)
+
+    async def aclose(self) -> None:
+        """Отмена фоновых обновлений кэша"""
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _schedule_refresh(self, number: int) -> None:
+        """Запуск фонового обновления устаревшей записи, если оно еще не идет"""
+        if number in self._refreshing:
+            return
+        task = asyncio.create_task(self._refresh(number))
+        self._refreshing[number] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(number, None))
+
+    async def _refresh(self, number: int) -> None:
+        try:
+            with no_deadline(), upstream_priority(Priority.BACKGROUND):
+                data = await self.inner.get_number_fact(number)
+        except Exception as e:
+            logger.warning(f"Не удалось обновить кэш для числа {number}: {e}")
+            return
+        self.cache.set(number, data)
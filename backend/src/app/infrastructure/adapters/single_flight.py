@@ -0,0 +1,98 @@
+"""
+Объединение одновременных одинаковых запросов к внешнему API (single-flight)
+"""
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass
+from typing import TypeVar
+
+from prometheus_client import Counter
+
+from src.app.application.common.deadline import no_deadline, time_remaining
+from src.app.application.common.exceptions import DeadlineExceededError
+from src.app.application.common.ports import ApiClientProtocol
+from src.app.infrastructure.adapters.rate_limiter import Priority, current_priority
+
+T = TypeVar("T")
+
+UPSTREAM_COALESCED_REQUESTS = Counter(
+    "upstream_coalesced_requests_total",
+    "Запросы, присоединившиеся к уже выполняющемуся запросу к внешнему API",
+)
+
+
+@dataclass
+class _Flight:
+    """Общий вызов и приоритет, с которым он выполняется"""
+
+    task: asyncio.Task
+    priority: Priority
+
+
+class SingleFlight:
+    """Группа вызовов, в которой на каждый ключ выполняется не более одного запроса.
+
+    Общий вызов не наследует срок первого вызывающего: каждый ожидающий ждет его в
+    пределах своего срока. Вызывающий с более высоким приоритетом, чем у идущего
+    вызова, не встает за ним, а запускает новый; следующие присоединяются к новому.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, _Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Выполнение fn или присоединение к уже запущенному вызову с тем же ключом"""
+        priority = current_priority()
+        flight = self._calls.get(key)
+        if flight is None or priority < flight.priority:
+            # Задача копирует контекст: приоритет вызывающего, но без его срока
+            with no_deadline():
+                task = asyncio.ensure_future(fn())
+            flight = _Flight(task, priority)
+            self._calls[key] = flight
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            UPSTREAM_COALESCED_REQUESTS.inc()
+
+        remaining = time_remaining()
+        if remaining is None:
+            # shield: отмена одного ожидающего не должна отменять общий запрос для остальных
+            return await asyncio.shield(flight.task)
+        # wait не отменяет задачу по таймауту и не путает срок с TimeoutError самого запроса
+        done, _ = await asyncio.wait({flight.task}, timeout=max(remaining, 0))
+        if not done:
+            raise DeadlineExceededError("Истек срок обработки запроса")
+        return flight.task.result()
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        flight = self._calls.get(key)
+        if flight is not None and flight.task is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Ошибка доставлена ожидающим; помечаем ее полученной на случай, если все отменились
+            task.exception()
+
+
+class CoalescingApiClient:
+    """Клиент внешнего API, объединяющий одновременные запросы по одному числу"""
+
+    def __init__(self, inner: ApiClientProtocol):
+        self.inner = inner
+        self._flights = SingleFlight()
+
+    async def get_number_fact(self, number: int) -> dict:
+        """Получение вопроса по числу с общим запросом для одновременных вызовов"""
+        data = await self._flights.do(number, lambda: self.inner.get_number_fact(number))
+        return dict(data)
+
+    async def get_random_fact(self) -> dict:
+        """Случайные вопросы должны различаться, поэтому не объединяются"""
+        return await self.inner.get_random_fact()
+
+    async def get_random_facts(self, count: int) -> list[dict]:
+        """Пакетное получение случайных вопросов без изменений"""
+        return await self.inner.get_random_facts(count)
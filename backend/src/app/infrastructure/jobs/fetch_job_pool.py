@@ -0,0 +1,188 @@
+"""
+Пул фоновых обработчиков заданий получения данных из внешнего API
+"""
+
+import asyncio
+import logging
+import time
+from datetime import UTC, datetime, timedelta
+from uuid import UUID
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.app.application.commands.fetch_api_data import FetchApiDataCommand
+from src.app.application.common.exceptions import JobQueueFullError
+from src.app.application.common.ports import ApiClientProtocol, NearDuplicateDetectorProtocol
+from src.app.domain.entities.fetch_job import FetchJobEntity
+from src.app.infrastructure.adapters.rate_limiter import Priority, upstream_priority
+from src.app.infrastructure.persistence.repositories.api_data_repository import ApiDataRepository
+from src.app.infrastructure.persistence.repositories.fetch_job_repository import (
+    FetchJobRepository,
+)
+
+logger = logging.getLogger(__name__)
+
+FETCH_JOB_QUEUE_DEPTH = Gauge(
+    "fetch_job_queue_depth",
+    "Количество заданий в очереди обработчиков",
+)
+FETCH_JOBS = Counter(
+    "fetch_jobs_total",
+    "Фоновые задания получения данных",
+    ["status"],
+)
+FETCH_JOB_DURATION_SECONDS = Histogram(
+    "fetch_job_duration_seconds",
+    "Длительность выполнения фонового задания",
+)
+
+
+class FetchJobPool:
+    """Очередь заданий в памяти с состоянием в Postgres и ограниченным числом обработчиков.
+
+    Задание сначала сохраняется в fetch_jobs, затем его ID попадает в очередь. Обработчик
+    атомарно забирает задание (queued -> running), поэтому одно задание не выполнится
+    дважды ни в этом процессе, ни в других репликах. Периодический обход возвращает в
+    очередь задания, оставшиеся в БД после перезапуска или переполнения очереди.
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker[AsyncSession],
+        api_client: ApiClientProtocol,
+        concurrency: int = 4,
+        max_queue: int = 1000,
+        stale_after: float = 300.0,
+        sweep_interval: float = 30.0,
+        freshness: timedelta | None = None,
+        near_duplicates: NearDuplicateDetectorProtocol | None = None,
+    ):
+        self.session_maker = session_maker
+        self.api_client = api_client
+        self.concurrency = max(concurrency, 1)
+        self.max_queue = max(max_queue, 1)
+        self.stale_after = stale_after
+        self.sweep_interval = sweep_interval
+        self.freshness = freshness
+        self.near_duplicates = near_duplicates
+        self._queue: asyncio.Queue[UUID] = asyncio.Queue(maxsize=self.max_queue)
+        self._queued_ids: set[UUID] = set()
+        self._running_ids: set[UUID] = set()
+        self._reserved = 0
+        self._tasks: list[asyncio.Task] = []
+        FETCH_JOB_QUEUE_DEPTH.set_function(self._queue.qsize)
+
+    def start(self) -> None:
+        """Запуск обработчиков и обхода незавершенных заданий"""
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._sweep_forever()))
+
+    async def aclose(self) -> None:
+        """Остановка обработчиков; прерванные задания будут выполнены после перезапуска"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        if self._running_ids:
+            try:
+                async with self.session_maker() as session:
+                    await FetchJobRepository(session).release(list(self._running_ids))
+            except Exception as e:
+                logger.error(f"Не удалось вернуть прерванные задания в очередь: {e}")
+            self._running_ids.clear()
+
+    async def submit(self, number: int | None) -> FetchJobEntity:
+        """Сохранение задания и постановка его в очередь"""
+        if self._queue.qsize() + self._reserved >= self.max_queue:
+            FETCH_JOBS.labels("rejected").inc()
+            raise JobQueueFullError("Очередь фоновых заданий заполнена", retry_after=1)
+
+        self._reserved += 1
+        try:
+            job = FetchJobEntity(number=number)
+            async with self.session_maker() as session:
+                await FetchJobRepository(session).create(job)
+        finally:
+            self._reserved -= 1
+
+        self._enqueue(job.id)
+        FETCH_JOBS.labels("queued").inc()
+        return job
+
+    def _enqueue(self, job_id: UUID) -> bool:
+        if job_id in self._queued_ids or self._queue.full():
+            return False
+        self._queue.put_nowait(job_id)
+        self._queued_ids.add(job_id)
+        return True
+
+    async def _work(self) -> None:
+        with upstream_priority(Priority.BACKGROUND):
+            while True:
+                job_id = await self._queue.get()
+                self._queued_ids.discard(job_id)
+                try:
+                    await self._process(job_id)
+                except Exception as e:
+                    logger.error(f"Ошибка обработки задания {job_id}: {e}")
+                finally:
+                    self._queue.task_done()
+
+    async def _process(self, job_id: UUID) -> None:
+        """Выполнение задания; отмена оставляет его в running до повторного обхода"""
+        async with self.session_maker() as session:
+            job = await FetchJobRepository(session).claim(job_id)
+        if job is None:
+            return
+
+        started = time.perf_counter()
+        result_id = None
+        error = None
+        self._running_ids.add(job_id)
+        try:
+            async with self.session_maker() as session:
+                command = FetchApiDataCommand(
+                    ApiDataRepository(session, near_duplicates=self.near_duplicates),
+                    self.api_client,
+                    freshness=self.freshness,
+                    near_duplicates=self.near_duplicates,
+                )
+                result_id = (await command.execute(job.number)).id
+        except Exception as e:
+            logger.warning(f"Задание {job_id} завершилось ошибкой: {e}")
+            error = str(e) or type(e).__name__
+        # При отмене задание остается в _running_ids и возвращается в очередь в aclose
+        self._running_ids.discard(job_id)
+
+        async with self.session_maker() as session:
+            await FetchJobRepository(session).finish(job_id, result_id=result_id, error=error)
+        FETCH_JOBS.labels("failed" if error else "succeeded").inc()
+        FETCH_JOB_DURATION_SECONDS.observe(time.perf_counter() - started)
+
+    async def _sweep_forever(self) -> None:
+        while True:
+            try:
+                await self._sweep()
+            except Exception as e:
+                logger.error(f"Не удалось загрузить незавершенные задания: {e}")
+            await asyncio.sleep(self.sweep_interval)
+
+    async def _sweep(self) -> None:
+        """Возврат в очередь заданий, ожидающих в БД"""
+        free = self.max_queue - self._queue.qsize() - self._reserved
+        if free <= 0:
+            return
+
+        started_before = datetime.now(UTC) - timedelta(seconds=self.stale_after)
+        async with self.session_maker() as session:
+            repository = FetchJobRepository(session)
+            await repository.requeue_stale(started_before)
+            job_ids = await repository.get_queued_ids(limit=free)
+
+        restored = sum(self._enqueue(job_id) for job_id in job_ids)
+        if restored:
+            logger.info(f"Восстановлено заданий из БД: {restored}")
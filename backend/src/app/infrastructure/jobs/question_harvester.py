@@ -0,0 +1,263 @@
+"""
+Фоновое наполнение банка вопросов за счет свободной квоты внешнего API
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import UTC, datetime
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.app.application.common.exceptions import NearDuplicateError, UpstreamQuotaExceededError
+from src.app.application.common.ports import ApiClientProtocol, NearDuplicateDetectorProtocol
+from src.app.application.common.services.near_duplicates import resolve_near_duplicate
+from src.app.domain.entities.api_data import ApiDataEntity
+from src.app.infrastructure.adapters.public_api_client import API_NINJAS_SOURCE
+from src.app.infrastructure.adapters.rate_limiter import (
+    Priority,
+    TokenBucketScheduler,
+    upstream_priority,
+)
+from src.app.infrastructure.persistence.repositories.api_data_repository import ApiDataRepository
+from src.app.infrastructure.persistence.repositories.harvest_checkpoint_repository import (
+    HarvestCheckpoint,
+    HarvestCheckpointRepository,
+)
+
+logger = logging.getLogger(__name__)
+
+HARVEST_SOURCE = API_NINJAS_SOURCE
+
+HARVESTER_ITEMS = Counter(
+    "harvester_items_total",
+    "Вопросы, обработанные фоновым наполнением банка",
+    ["kind", "result"],
+)
+HARVESTER_THROTTLED_SECONDS = Counter(
+    "harvester_throttled_seconds_total",
+    "Время ожидания свободной квоты фоновым наполнением",
+)
+HARVESTER_PROGRESS = Gauge(
+    "harvester_progress_ratio",
+    "Доля выполненного плана наполнения банка вопросов",
+)
+
+
+@dataclass(frozen=True)
+class HarvestPlan:
+    """План наполнения: диапазоны чисел (включительно) и количество случайных вопросов"""
+
+    ranges: tuple[tuple[int, int], ...] = ()
+    random_count: int = 0
+
+    @property
+    def numbers_count(self) -> int:
+        return sum(end - start + 1 for start, end in self.ranges)
+
+    @property
+    def total(self) -> int:
+        return self.numbers_count + self.random_count
+
+    def numbers(self, position: int, count: int) -> list[int]:
+        """Числа плана с позиции position (сквозная нумерация по диапазонам)"""
+        numbers: list[int] = []
+        for start, end in self.ranges:
+            size = end - start + 1
+            if position >= size:
+                position -= size
+                continue
+            take = min(size - position, count - len(numbers))
+            numbers.extend(range(start + position, start + position + take))
+            position = 0
+            if len(numbers) == count:
+                break
+        return numbers
+
+    def describe(self) -> str:
+        """Строковое описание плана; при его изменении прогресс начинается заново"""
+        ranges = ",".join(f"{start}-{end}" for start, end in self.ranges)
+        return f"{ranges};random={self.random_count}"
+
+
+class QuestionHarvester:
+    """Последовательное получение вопросов по плану с сохранением прогресса в БД.
+
+    Запросы идут с фоновым приоритетом и только когда в token bucket есть свободные
+    токены, а от дневной квоты остается больше резерва для пользовательских запросов.
+    Уже сохраненные числа пропускаются без запроса к API. После каждой пачки позиция
+    записывается в harvest_checkpoints, поэтому после перезапуска работа продолжается.
+    Почти дубликаты, которые не нужно сохранять (merge, reject), пропускаются.
+    Наполнение рассчитано на одну реплику.
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker[AsyncSession],
+        api_client: ApiClientProtocol,
+        plan: HarvestPlan,
+        scheduler: TokenBucketScheduler | None = None,
+        name: str = "default",
+        batch_size: int = 10,
+        spare_tokens: float = 1.0,
+        daily_reserve: int = 0,
+        idle_interval: float = 5.0,
+        max_backoff: float = 300.0,
+        near_duplicates: NearDuplicateDetectorProtocol | None = None,
+    ):
+        self.session_maker = session_maker
+        self.api_client = api_client
+        self.plan = plan
+        self.scheduler = scheduler
+        self.name = name
+        self.batch_size = max(batch_size, 1)
+        self.spare_tokens = spare_tokens
+        self.daily_reserve = daily_reserve
+        self.idle_interval = idle_interval
+        self.max_backoff = max_backoff
+        self.near_duplicates = near_duplicates
+        self.checkpoint: HarvestCheckpoint | None = None
+        self._task: asyncio.Task | None = None
+        HARVESTER_PROGRESS.set_function(self.progress)
+
+    def start(self) -> None:
+        """Запуск наполнения в фоне"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def aclose(self) -> None:
+        """Остановка; прогресс последней сохраненной пачки не теряется"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def progress(self) -> float:
+        if self.checkpoint is None or self.plan.total == 0:
+            return 0.0
+        done = self.checkpoint.position + self.checkpoint.random_pulled
+        return done / self.plan.total
+
+    def quota_wait(self) -> float:
+        """Время до появления свободной квоты; 0 - можно запрашивать"""
+        if self.scheduler is None:
+            return 0.0
+        daily = self.scheduler.daily_allowance()
+        if daily is not None and daily[0] <= self.daily_reserve:
+            return daily[1]
+        missing = self.spare_tokens - self.scheduler.available_tokens()
+        return missing / self.scheduler.rate if missing > 0 else 0.0
+
+    async def load_checkpoint(self) -> HarvestCheckpoint:
+        """Загрузка прогресса; при смене плана наполнение начинается сначала"""
+        async with self.session_maker() as session:
+            checkpoint = await HarvestCheckpointRepository(session).get(self.name)
+        plan = self.plan.describe()
+        if checkpoint is None or checkpoint.plan != plan:
+            checkpoint = HarvestCheckpoint(name=self.name, plan=plan)
+        self.checkpoint = checkpoint
+        return checkpoint
+
+    async def run_batch(self) -> bool:
+        """Обработка одной пачки плана; False, если план выполнен"""
+        checkpoint = self.checkpoint or await self.load_checkpoint()
+        if checkpoint.position < self.plan.numbers_count:
+            await self._harvest_numbers(checkpoint)
+            return True
+        if checkpoint.random_pulled < self.plan.random_count:
+            await self._harvest_random(checkpoint)
+            return True
+
+        if checkpoint.finished_at is None:
+            checkpoint.finished_at = datetime.now(UTC)
+            await self._save([], checkpoint)
+        return False
+
+    async def _run(self) -> None:
+        failures = 0
+        with upstream_priority(Priority.BACKGROUND):
+            while True:
+                try:
+                    if not await self.run_batch():
+                        logger.info(f"Наполнение банка вопросов '{self.name}' завершено")
+                        return
+                    failures = 0
+                except UpstreamQuotaExceededError as e:
+                    await asyncio.sleep(e.retry_after or self.idle_interval)
+                except Exception as e:
+                    failures += 1
+                    delay = min(self.idle_interval * 2 ** (failures - 1), self.max_backoff)
+                    logger.warning(f"Ошибка наполнения банка вопросов, пауза {delay:.0f} с: {e}")
+                    await asyncio.sleep(delay)
+
+    async def _harvest_numbers(self, checkpoint: HarvestCheckpoint) -> None:
+        numbers = self.plan.numbers(checkpoint.position, self.batch_size)
+        async with self.session_maker() as session:
+            existing = await ApiDataRepository(session).get_existing_external_ids(
+                HARVEST_SOURCE, [str(number) for number in numbers]
+            )
+
+        entities: list[ApiDataEntity] = []
+        try:
+            for number in numbers:
+                if str(number) in existing:
+                    HARVESTER_ITEMS.labels("number", "skipped").inc()
+                else:
+                    await self._wait_for_quota()
+                    data = await self.api_client.get_number_fact(number)
+                    entities.append(_to_entity(data))
+                    HARVESTER_ITEMS.labels("number", "stored").inc()
+                checkpoint.position += 1
+        except Exception:
+            HARVESTER_ITEMS.labels("number", "error").inc()
+            raise
+        finally:
+            # Полученное до ошибки сохраняется, позиция указывает на первое необработанное число
+            await self._save(entities, checkpoint)
+
+    async def _harvest_random(self, checkpoint: HarvestCheckpoint) -> None:
+        count = min(self.batch_size, self.plan.random_count - checkpoint.random_pulled)
+        await self._wait_for_quota()
+        try:
+            facts = await self.api_client.get_random_facts(count)
+        except Exception:
+            HARVESTER_ITEMS.labels("random", "error").inc()
+            raise
+        HARVESTER_ITEMS.labels("random", "stored").inc(len(facts))
+        checkpoint.random_pulled += len(facts)
+        await self._save([_to_entity(data) for data in facts], checkpoint)
+
+    async def _wait_for_quota(self) -> None:
+        while (wait := self.quota_wait()) > 0:
+            HARVESTER_THROTTLED_SECONDS.inc(wait)
+            await asyncio.sleep(wait)
+
+    async def _save(self, entities: list[ApiDataEntity], checkpoint: HarvestCheckpoint) -> None:
+        async with self.session_maker() as session:
+            repository = ApiDataRepository(session, near_duplicates=self.near_duplicates)
+            if self.near_duplicates is not None:
+                entities = [entity for entity in entities if await self._keep(entity, repository)]
+            await repository.create_many(entities)
+            await HarvestCheckpointRepository(session).save(checkpoint)
+
+    async def _keep(self, entity: ApiDataEntity, repository: ApiDataRepository) -> bool:
+        try:
+            resolved = await resolve_near_duplicate(entity, self.near_duplicates, repository)
+        except NearDuplicateError:
+            resolved = None
+        if resolved is entity:
+            return True
+        kind = "random" if entity.external_id is None else "number"
+        HARVESTER_ITEMS.labels(kind, "duplicate").inc()
+        return False
+
+
+def _to_entity(data: dict) -> ApiDataEntity:
+    return ApiDataEntity(
+        source=data["source"],
+        title=data["title"],
+        content=data["content"],
+        external_id=data.get("external_id"),
+        fetched_at=datetime.now(UTC),
+    )
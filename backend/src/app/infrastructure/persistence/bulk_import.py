@@ -0,0 +1,347 @@
+"""
+Массовая загрузка вопросов в api_data через COPY
+"""
+
+import asyncio
+import codecs
+import csv
+import json
+import logging
+import time
+from collections.abc import AsyncIterator, Callable
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from enum import StrEnum
+
+from prometheus_client import Counter, Histogram
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.app.domain.entities.api_data import ApiDataEntity
+from src.app.infrastructure.persistence.models.api_data import ApiDataModel
+from src.app.infrastructure.persistence.near_duplicates import NearDuplicateDetector
+
+logger = logging.getLogger(__name__)
+
+BULK_IMPORT_ROWS = Counter(
+    "bulk_import_rows_total",
+    "Строки массовой загрузки вопросов по результату",
+    ["result"],
+)
+BULK_IMPORT_BATCH_SECONDS = Histogram(
+    "bulk_import_batch_seconds",
+    "Длительность COPY и переноса одной пачки массовой загрузки",
+)
+
+COPY_COLUMNS = ("id", "source", "title", "content", "external_id", "fetched_at")
+STAGING_TABLE = "api_data_import"
+
+# Таблица живет одну транзакцию: после commit соединение возвращается в пул, и
+# следующая пачка может получить другое соединение, где временной таблицы нет
+_CREATE_STAGING = text(
+    f"CREATE TEMP TABLE {STAGING_TABLE} (LIKE api_data INCLUDING DEFAULTS) ON COMMIT DROP"
+)
+_INSERT_SKIP = text(
+    "INSERT INTO api_data (id, source, title, content, external_id, fetched_at, created_at) "
+    f"SELECT id, source, title, content, external_id, fetched_at, now() FROM {STAGING_TABLE} "
+    "ON CONFLICT (external_id, source) DO NOTHING"
+)
+# Один ключ не может обновляться дважды в одном INSERT - оставляем последнюю версию
+_INSERT_UPDATE = text(
+    "INSERT INTO api_data (id, source, title, content, external_id, fetched_at, created_at) "
+    "SELECT DISTINCT ON (COALESCE(external_id, id::text), source) "
+    "id, source, title, content, external_id, fetched_at, now() "
+    f"FROM {STAGING_TABLE} ORDER BY COALESCE(external_id, id::text), source, fetched_at DESC "
+    "ON CONFLICT (external_id, source) DO UPDATE SET title = EXCLUDED.title, "
+    "content = EXCLUDED.content, fetched_at = EXCLUDED.fetched_at, updated_at = now()"
+)
+
+# Сохраненные строки для индекса почти дубликатов: id строки в api_data и ее текст
+_RETURNING_STORED = " RETURNING id, content, duplicate_of"
+
+_MAX_LENGTHS = {
+    name: column.type.length
+    for name, column in ApiDataModel.__table__.columns.items()
+    if getattr(column.type, "length", None)
+}
+
+
+class ImportFormat(StrEnum):
+    """Формат входных данных"""
+
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+class ConflictPolicy(StrEnum):
+    """Действие для строк с уже сохраненными (source, external_id)"""
+
+    SKIP = "skip"
+    UPDATE = "update"
+
+
+@dataclass(frozen=True)
+class RejectedRow:
+    """Отклоненная строка входных данных"""
+
+    line: int
+    error: str
+
+
+@dataclass
+class ImportReport:
+    """Прогресс и итог загрузки; errors ограничен max_errors первыми ошибками"""
+
+    received: int = 0
+    imported: int = 0
+    skipped: int = 0
+    rejected: int = 0
+    errors: list[RejectedRow] = field(default_factory=list)
+    started_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+
+@dataclass
+class _Batch:
+    rows: list[tuple] = field(default_factory=list)
+    rejected: list[RejectedRow] = field(default_factory=list)
+
+
+async def iter_records(
+    chunks: AsyncIterator[bytes], import_format: ImportFormat
+) -> AsyncIterator[tuple[int, dict | RejectedRow]]:
+    """Записи входного потока с номерами строк; нераспознанные строки - RejectedRow"""
+    lines = _iter_lines(chunks)
+    if import_format == ImportFormat.CSV:
+        async for item in _iter_csv(lines):
+            yield item
+        return
+
+    async for line_number, line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, RejectedRow(line_number, f"Некорректный JSON: {e.msg}")
+            continue
+        if not isinstance(record, dict):
+            yield line_number, RejectedRow(line_number, "Ожидался JSON объект")
+            continue
+        yield line_number, record
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, str]]:
+    """Строки UTF-8 текста из произвольно нарезанных кусков байт"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    line_number = 0
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            line_number += 1
+            yield line_number, line.removesuffix("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield line_number + 1, pending.removesuffix("\r")
+
+
+async def _iter_csv(
+    lines: AsyncIterator[tuple[int, str]],
+) -> AsyncIterator[tuple[int, dict | RejectedRow]]:
+    """CSV с заголовком; поле в кавычках может занимать несколько строк"""
+    header: list[str] | None = None
+    parts: list[str] = []
+    first_line = 0
+    async for line_number, line in lines:
+        if not parts:
+            first_line = line_number
+        parts.append(line)
+        # Четное число кавычек - запись закончилась (экранированная "" сохраняет четность)
+        if sum(part.count('"') for part in parts) % 2:
+            continue
+        record_text, parts = "\n".join(parts), []
+        if not record_text.strip():
+            continue
+        values = next(csv.reader([record_text]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield (
+                first_line,
+                RejectedRow(first_line, f"Ожидалось полей: {len(header)}, получено: {len(values)}"),
+            )
+            continue
+        yield first_line, {name: value for name, value in zip(header, values) if value != ""}
+    if parts:
+        yield first_line, RejectedRow(first_line, "Незакрытые кавычки в конце файла")
+
+
+def validate_batch(
+    records: list[tuple[int, dict | RejectedRow]], default_source: str | None = None
+) -> _Batch:
+    """Проверка записей по полям ApiDataEntity и размерам колонок api_data"""
+    batch = _Batch()
+    imported_at = datetime.now(UTC)
+    for line_number, record in records:
+        if isinstance(record, RejectedRow):
+            batch.rejected.append(record)
+            continue
+        external_id = record.get("external_id")
+        try:
+            entity = ApiDataEntity(
+                source=record.get("source") or default_source,
+                title=record.get("title"),
+                content=record.get("content"),
+                # В дампах номер часто записан числом
+                external_id=None if external_id is None else str(external_id),
+                fetched_at=record.get("fetched_at") or imported_at,
+            )
+        except ValidationError as e:
+            error = e.errors()[0]
+            location = ".".join(str(part) for part in error["loc"])
+            batch.rejected.append(RejectedRow(line_number, f"{location}: {error['msg']}"))
+            continue
+
+        blank = next(
+            (name for name in ("title", "content") if not getattr(entity, name).strip()), None
+        )
+        if blank:
+            batch.rejected.append(RejectedRow(line_number, f"{blank}: пустое значение"))
+            continue
+        too_long = next(
+            (
+                name
+                for name, length in _MAX_LENGTHS.items()
+                if len(getattr(entity, name, None) or "") > length
+            ),
+            None,
+        )
+        if too_long:
+            batch.rejected.append(
+                RejectedRow(line_number, f"{too_long}: длиннее {_MAX_LENGTHS[too_long]} символов")
+            )
+            continue
+        batch.rows.append(tuple(getattr(entity, column) for column in COPY_COLUMNS))
+    return batch
+
+
+class ApiDataImporter:
+    """Потоковая загрузка вопросов пачками: COPY во временную таблицу и перенос в api_data.
+
+    Разбор и проверка следующей пачки (в отдельном потоке) идут одновременно с COPY
+    предыдущей; между ними не больше двух пачек, поэтому память не зависит от размера
+    файла. Каждая пачка фиксируется отдельной транзакцией: при обрыве загруженное
+    сохраняется, а повторная загрузка с on_conflict=skip не создает дубликатов
+    (строки без external_id при повторе добавятся снова). Если задан near_duplicates,
+    сохраненные строки пачки добавляются в индекс почти дубликатов после ее фиксации.
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker[AsyncSession],
+        batch_size: int = 5000,
+        on_conflict: ConflictPolicy = ConflictPolicy.SKIP,
+        max_errors: int = 100,
+        default_source: str | None = None,
+        near_duplicates: NearDuplicateDetector | None = None,
+    ):
+        self.session_maker = session_maker
+        self.near_duplicates = near_duplicates
+        self.batch_size = max(batch_size, 1)
+        self.on_conflict = on_conflict
+        self.max_errors = max_errors
+        self.default_source = default_source
+
+    async def run(
+        self,
+        chunks: AsyncIterator[bytes],
+        import_format: ImportFormat,
+        on_progress: Callable[[ImportReport], None] | None = None,
+    ) -> ImportReport:
+        """Загрузка потока; on_progress вызывается после каждой пачки"""
+        report = ImportReport()
+        batches: asyncio.Queue[_Batch | None] = asyncio.Queue(maxsize=1)
+        producer = asyncio.create_task(self._produce(chunks, import_format, batches))
+        try:
+            async with self.session_maker() as session:
+                while (batch := await batches.get()) is not None:
+                    await self._load(session, batch, report)
+                    if on_progress is not None:
+                        on_progress(report)
+            await producer
+        finally:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+        logger.info(
+            f"Загрузка вопросов завершена за {report.elapsed:.1f} с: получено {report.received}, "
+            f"загружено {report.imported}, пропущено {report.skipped}, "
+            f"отклонено {report.rejected}"
+        )
+        return report
+
+    async def _produce(
+        self,
+        chunks: AsyncIterator[bytes],
+        import_format: ImportFormat,
+        batches: asyncio.Queue[_Batch | None],
+    ) -> None:
+        records: list[tuple[int, dict | RejectedRow]] = []
+        async for item in iter_records(chunks, import_format):
+            records.append(item)
+            if len(records) >= self.batch_size:
+                await batches.put(await self._validate(records))
+                records = []
+        if records:
+            await batches.put(await self._validate(records))
+        await batches.put(None)
+
+    async def _validate(self, records: list[tuple[int, dict | RejectedRow]]) -> _Batch:
+        # Проверка тысяч записей pydantic заметно занимает цикл событий
+        return await asyncio.to_thread(validate_batch, records, self.default_source)
+
+    async def _load(self, session: AsyncSession, batch: _Batch, report: ImportReport) -> None:
+        report.received += len(batch.rows) + len(batch.rejected)
+        report.rejected += len(batch.rejected)
+        room = self.max_errors - len(report.errors)
+        report.errors.extend(batch.rejected[: max(room, 0)])
+        BULK_IMPORT_ROWS.labels("rejected").inc(len(batch.rejected))
+        if not batch.rows:
+            return
+
+        started = time.perf_counter()
+        imported = await self._copy(session, batch.rows)
+        BULK_IMPORT_BATCH_SECONDS.observe(time.perf_counter() - started)
+        report.imported += imported
+        report.skipped += len(batch.rows) - imported
+        BULK_IMPORT_ROWS.labels("imported").inc(imported)
+        BULK_IMPORT_ROWS.labels("skipped").inc(len(batch.rows) - imported)
+
+    async def _copy(self, session: AsyncSession, rows: list[tuple]) -> int:
+        """COPY пачки во временную таблицу и перенос в api_data; возвращает число строк"""
+        # CREATE через сессию заодно открывает транзакцию, в которой пойдут COPY и перенос
+        await session.execute(_CREATE_STAGING)
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            STAGING_TABLE, records=rows, columns=COPY_COLUMNS
+        )
+        insert = _INSERT_UPDATE if self.on_conflict == ConflictPolicy.UPDATE else _INSERT_SKIP
+        if self.near_duplicates is None:
+            result = await session.execute(insert)
+            await session.commit()
+            return result.rowcount
+
+        stored = (await session.execute(text(insert.text + _RETURNING_STORED))).all()
+        await session.commit()
+        await self.near_duplicates.add_rows(
+            [(row.id, row.content) for row in stored if row.duplicate_of is None]
+        )
+        return len(stored)
@@ -2,14 +2,29 @@
 Настройка подключения к базе данных
 """
 
-from sqlalchemy import MetaData
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from sqlalchemy.orm import declarative_base
+import logging
+import math
 
+from sqlalchemy import URL, MetaData, event, make_url, text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import Session, declarative_base
+
+from src.app.application.common.deadline import check_deadline, time_remaining
+from src.app.infrastructure.persistence.pool_metrics import InstrumentedQueuePool, instrument_engine
 from src.app.setup.config.settings import get_settings
 
+logger = logging.getLogger(__name__)
+
 settings = get_settings()
 
+# Последняя миграция alembic/versions, под которую написан код
+SCHEMA_REVISION = "0004_api_data_unique_key"
+
 POSTGRES_INDEXES_NAMING_CONVENTION = {
     "ix": "%(column_0_label)s_idx",
     "uq": "%(table_name)s_%(column_0_name)s_key",
@@ -21,22 +36,98 @@ POSTGRES_INDEXES_NAMING_CONVENTION = {
 metadata = MetaData(naming_convention=POSTGRES_INDEXES_NAMING_CONVENTION)
 Base = declarative_base(metadata=metadata)
 
-engine = create_async_engine(
-    settings.database_url,
-    echo=settings.DB_ECHO,
-    future=True,
-)
 
-async_session_maker = async_sessionmaker(
-    engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-    autocommit=False,
-    autoflush=False,
-)
+def create_db_engine(url: str, pool_name: str, server_settings: dict | None = None) -> AsyncEngine:
+    """Движок с пулом соединений и кэшем подготовленных выражений из настроек"""
+    # Кэш подготовленных выражений есть и у диалекта SQLAlchemy, и у самого asyncpg;
+    # за pgbouncer в режиме transaction оба нужно отключить (DB_STATEMENT_CACHE_SIZE=0)
+    engine_url: URL = make_url(url).update_query_dict(
+        {"prepared_statement_cache_size": str(settings.DB_STATEMENT_CACHE_SIZE)}
+    )
+    connect_args: dict = {"statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+    if server_settings:
+        connect_args["server_settings"] = server_settings
+    created = create_async_engine(
+        engine_url,
+        echo=settings.DB_ECHO,
+        future=True,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_logging_name=pool_name,
+        connect_args=connect_args,
+    )
+    instrument_engine(created, pool_name)
+    return created
+
+
+engine = create_db_engine(settings.database_url, "primary")
+
+
+class DeadlineSession(Session):
+    """Сессия, ограничивающая время выполнения запросов сроком обработки HTTP запроса"""
+
+
+@event.listens_for(DeadlineSession, "after_begin")
+def _apply_statement_timeout(session, transaction, connection) -> None:
+    """Установка statement_timeout на время транзакции по оставшемуся сроку"""
+    remaining = time_remaining()
+    if remaining is None:
+        return
+    check_deadline()
+    timeout_ms = max(math.ceil(remaining * 1000), 1)
+    connection.exec_driver_sql(f"SELECT set_config('statement_timeout', '{timeout_ms}', true)")
+
+
+def create_session_maker(bind: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    """Фабрика сессий приложения для движка (основной БД или реплики)"""
+    return async_sessionmaker(
+        bind,
+        class_=AsyncSession,
+        sync_session_class=DeadlineSession,
+        expire_on_commit=False,
+        autocommit=False,
+        autoflush=False,
+    )
+
+
+def create_replica_engine(url: str, name: str) -> AsyncEngine:
+    """Движок реплики для чтения: транзакции только на чтение по умолчанию"""
+    return create_db_engine(url, name, server_settings={"default_transaction_read_only": "on"})
+
+
+async_session_maker = create_session_maker(engine)
 
 
 async def get_db_session() -> AsyncSession:
     """Получение сессии базы данных"""
     async with async_session_maker() as session:
         yield session
+
+
+async def check_schema_revision(mode: str = "strict") -> None:
+    """Сверка версии схемы в alembic_version с SCHEMA_REVISION вместо создания таблиц.
+
+    strict - несовпадение останавливает запуск, warn - только предупреждение, off - без проверки.
+    """
+    if mode == "off":
+        return
+    async with engine.connect() as connection:
+        revision = None
+        if (await connection.execute(text("SELECT to_regclass('alembic_version')"))).scalar():
+            revision = (
+                await connection.execute(text("SELECT version_num FROM alembic_version"))
+            ).scalar()
+    if revision == SCHEMA_REVISION:
+        return
+
+    message = (
+        f"Версия схемы БД {revision or 'не задана'}, код ожидает {SCHEMA_REVISION}: "
+        "выполните alembic upgrade head"
+    )
+    if mode == "strict":
+        raise RuntimeError(message)
+    logger.warning(message)
@@ -0,0 +1,210 @@
+"""
+Выполнение запросов не более одного раза на ключ идемпотентности
+"""
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from datetime import timedelta
+
+from prometheus_client import Counter
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.app.application.common.deadline import no_deadline, time_remaining
+from src.app.application.common.exceptions import (
+    IdempotencyKeyInProgressError,
+    IdempotencyKeyMismatchError,
+)
+from src.app.infrastructure.adapters.response_cache import TtlLruCache
+from src.app.infrastructure.persistence.models.api_data import utc_now
+from src.app.infrastructure.persistence.repositories.idempotency_key_repository import (
+    IdempotencyKeyRepository,
+    IdempotencyRecord,
+    StoredResponse,
+)
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_REQUESTS = Counter(
+    "idempotency_requests_total",
+    "Запросы с ключом идемпотентности по результату",
+    ["result"],
+)
+
+
+class IdempotencyStore:
+    """Хранилище ключей идемпотентности в Postgres с кэшем ответов в памяти.
+
+    Первый запрос захватывает ключ строкой в idempotency_keys на lease секунд и
+    выполняется; успешный (2xx) ответ сохраняется на ttl секунд и отдается повторным
+    запросам. Одновременные повторы ждут первый запрос: в этом процессе - по событию, из
+    других реплик - опрашивая строку ключа. Если первый запрос завершился ошибкой, ключ
+    освобождается и повтор выполняется заново; если реплика упала, не освободив ключ,
+    он освобождается по истечении lease.
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker[AsyncSession],
+        ttl: float = 86400.0,
+        lease: float = 120.0,
+        wait_timeout: float = 10.0,
+        poll_interval: float = 0.05,
+        cache: TtlLruCache | None = None,
+        purge_interval: float = 3600.0,
+    ):
+        self.session_maker = session_maker
+        self.ttl = ttl
+        self.lease = lease
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.cache = cache
+        self.purge_interval = purge_interval
+        self._in_flight: dict[str, asyncio.Event] = {}
+        self._purger: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """Запуск периодического удаления истекших ключей"""
+        if self._purger is None:
+            self._purger = asyncio.create_task(self._purge_forever())
+
+    async def aclose(self) -> None:
+        if self._purger is not None:
+            self._purger.cancel()
+            await asyncio.gather(self._purger, return_exceptions=True)
+            self._purger = None
+
+    async def execute(
+        self, key: str, request_hash: str, handler: Callable[[], Awaitable[StoredResponse]]
+    ) -> tuple[StoredResponse, bool]:
+        """Выполнение handler один раз на ключ; возвращает ответ и признак повтора"""
+        loop = asyncio.get_running_loop()
+        remaining = time_remaining()
+        wait_timeout = self.wait_timeout if remaining is None else min(self.wait_timeout, remaining)
+        wait_until = loop.time() + wait_timeout
+
+        while True:
+            cached = self.cache.get(key) if self.cache is not None else None
+            if cached is not None:
+                return self._replay(cached.value, request_hash)
+
+            in_flight = self._in_flight.get(key)
+            if in_flight is not None:
+                await self._wait_local(in_flight, wait_until - loop.time())
+                continue
+
+            async with self.session_maker() as session:
+                record = await IdempotencyKeyRepository(session).reserve(
+                    key, request_hash, utc_now() + timedelta(seconds=self.lease)
+                )
+            if record.owned:
+                return await self._run(record, handler), False
+
+            self._check_request(record, request_hash)
+            if record.response is None:
+                record = await self._wait_remote(key, wait_until - loop.time())
+            if record is not None:
+                self._remember(record)
+                return self._replay(record, request_hash)
+
+    async def _run(
+        self, record: IdempotencyRecord, handler: Callable[[], Awaitable[StoredResponse]]
+    ) -> StoredResponse:
+        key = record.key
+        done = self._in_flight[key] = asyncio.Event()
+        try:
+            response = await handler()
+        except BaseException:
+            await asyncio.shield(self._release(key))
+            raise
+        finally:
+            del self._in_flight[key]
+            done.set()
+
+        if not 200 <= response.status_code < 300:
+            await asyncio.shield(self._release(key))
+            return response
+
+        expires_at = utc_now() + timedelta(seconds=self.ttl)
+        try:
+            with no_deadline():
+                async with self.session_maker() as session:
+                    await IdempotencyKeyRepository(session).complete(key, response, expires_at)
+        except Exception as e:
+            # Без сохраненного ответа ключ не должен держать повторы до истечения аренды
+            logger.error(f"Не удалось сохранить ответ для ключа идемпотентности: {e}")
+            await asyncio.shield(self._release(key))
+            return response
+        record.response = response
+        record.expires_at = expires_at
+        self._remember(record)
+        IDEMPOTENCY_REQUESTS.labels("executed").inc()
+        return response
+
+    def _replay(self, record: IdempotencyRecord, request_hash: str) -> tuple[StoredResponse, bool]:
+        self._check_request(record, request_hash)
+        IDEMPOTENCY_REQUESTS.labels("replayed").inc()
+        return record.response, True
+
+    def _check_request(self, record: IdempotencyRecord, request_hash: str) -> None:
+        if record.request_hash != request_hash:
+            IDEMPOTENCY_REQUESTS.labels("mismatch").inc()
+            raise IdempotencyKeyMismatchError(
+                "Ключ идемпотентности уже использован для другого запроса"
+            )
+
+    def _remember(self, record: IdempotencyRecord) -> None:
+        if self.cache is None:
+            return
+        # Ответ в памяти не переживает запись в БД
+        ttl = min((record.expires_at - utc_now()).total_seconds(), self.cache.ttl)
+        if ttl > 0:
+            self.cache.set(record.key, record, ttl=ttl)
+
+    async def _wait_local(self, in_flight: asyncio.Event, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(in_flight.wait(), timeout=max(timeout, 0))
+        except TimeoutError:
+            self._in_progress()
+
+    async def _wait_remote(self, key: str, timeout: float) -> IdempotencyRecord | None:
+        """Ожидание ответа другой реплики; None, если ключ освобожден"""
+        loop = asyncio.get_running_loop()
+        wait_until = loop.time() + timeout
+        delay = self.poll_interval
+        while loop.time() + delay < wait_until:
+            await asyncio.sleep(delay)
+            async with self.session_maker() as session:
+                record = await IdempotencyKeyRepository(session).get(key)
+            if record is None:
+                return None
+            if record.response is not None:
+                return record
+            delay = min(delay * 2, 1.0)
+        self._in_progress()
+
+    def _in_progress(self) -> None:
+        IDEMPOTENCY_REQUESTS.labels("in_progress").inc()
+        raise IdempotencyKeyInProgressError(
+            "Запрос с этим ключом идемпотентности еще выполняется", retry_after=1
+        )
+
+    async def _release(self, key: str) -> None:
+        try:
+            with no_deadline():
+                async with self.session_maker() as session:
+                    await IdempotencyKeyRepository(session).release(key)
+        except Exception as e:
+            # Ключ освободится сам по истечении аренды
+            logger.error(f"Не удалось освободить ключ идемпотентности: {e}")
+
+    async def _purge_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                async with self.session_maker() as session:
+                    purged = await IdempotencyKeyRepository(session).purge_expired(utc_now())
+                if purged:
+                    logger.info(f"Удалено истекших ключей идемпотентности: {purged}")
+            except Exception as e:
+                logger.warning(f"Не удалось удалить истекшие ключи идемпотентности: {e}")
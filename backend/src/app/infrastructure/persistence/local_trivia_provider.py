@@ -0,0 +1,80 @@
+"""
+Провайдер вопросов викторины из ранее сохраненных в базе данных записей
+"""
+
+from uuid import uuid4
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.app.infrastructure.adapters.public_api_client import API_NINJAS_SOURCE
+from src.app.infrastructure.persistence.models.api_data import ApiDataModel
+
+
+class DatabaseTriviaProvider:
+    """Провайдер, отвечающий вопросами из таблицы api_data без обращения к сети"""
+
+    def __init__(
+        self, session_maker: async_sessionmaker[AsyncSession], source: str = API_NINJAS_SOURCE
+    ):
+        self.session_maker = session_maker
+        self.source = source
+
+    async def get_number_fact(self, number: int) -> dict:
+        """Сохраненный вопрос источника source для числа"""
+        statement = select(ApiDataModel).where(
+            ApiDataModel.external_id == str(number), ApiDataModel.source == self.source
+        )
+        async with self.session_maker() as session:
+            model = (await session.execute(statement)).scalar_one_or_none()
+
+        if model is None:
+            raise LookupError(f"В локальной базе нет вопроса для числа {number}")
+        return _to_dict(model)
+
+    async def get_random_fact(self) -> dict:
+        facts = await self.get_random_facts(1)
+        return facts[0]
+
+    async def get_random_facts(self, count: int) -> list[dict]:
+        """Случайные вопросы: чтение по первичному ключу начиная со случайного UUID"""
+        pivot = uuid4()
+        async with self.session_maker() as session:
+            models = list(
+                (
+                    await session.execute(
+                        select(ApiDataModel)
+                        .where(ApiDataModel.id >= pivot)
+                        .order_by(ApiDataModel.id)
+                        .limit(count)
+                    )
+                ).scalars()
+            )
+            if len(models) < count:
+                models += (
+                    await session.execute(
+                        select(ApiDataModel)
+                        .where(ApiDataModel.id < pivot)
+                        .order_by(ApiDataModel.id)
+                        .limit(count - len(models))
+                    )
+                ).scalars()
+
+        if not models:
+            raise LookupError("В локальной базе нет вопросов")
+        return [_to_dict(model) for model in models]
+
+
+def _to_dict(model: ApiDataModel) -> dict:
+    # id строки отличает сохраненный вопрос от ответа внешнего API: команды отдают его как есть
+    return {
+        "id": model.id,
+        "source": model.source,
+        "title": model.title,
+        "content": model.content,
+        "external_id": model.external_id,
+        "fetched_at": model.fetched_at,
+        "duplicate_of": model.duplicate_of,
+        "created_at": model.created_at,
+        "updated_at": model.updated_at,
+    }
@@ -5,7 +5,7 @@ SQLAlchemy модель для таблицы api_data
 from datetime import UTC, datetime
 from uuid import uuid4
 
-from sqlalchemy import Column, DateTime, String, Text
+from sqlalchemy import Column, DateTime, Index, String, Text, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID as PostgresUUID  # noqa: N811
 
 from src.app.infrastructure.persistence.database import Base
@@ -20,6 +20,13 @@ class ApiDataModel(Base):
     """Модель данных из внешнего API"""
 
     __tablename__ = "api_data"
+    # external_id первым: индекс обслуживает и поиск по числу без источника
+    __table_args__ = (
+        UniqueConstraint("external_id", "source", name="uq_api_data_external_id_source"),
+        # Курсорная пагинация списка: (fetched_at, id) в порядке ORDER BY
+        Index("ix_api_data_fetched_at_id", "fetched_at", "id"),
+        Index("ix_api_data_source_fetched_at_id", "source", "fetched_at", "id"),
+    )
 
     id = Column(PostgresUUID(as_uuid=True), primary_key=True, default=uuid4)
     source = Column(String(255), nullable=False)
@@ -29,3 +36,5 @@ class ApiDataModel(Base):
     fetched_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
     created_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
     updated_at = Column(DateTime(timezone=True), nullable=True, onupdate=utc_now)
+    # Сохраненный вопрос, почти совпадающий с этим (режим NEAR_DUPLICATES=flag)
+    duplicate_of = Column(PostgresUUID(as_uuid=True), nullable=True)
@@ -0,0 +1,16 @@
+"""
+SQLAlchemy модель для таблицы api_data_counter
+"""
+
+from sqlalchemy import BigInteger, Column, SmallInteger
+
+from src.app.infrastructure.persistence.database import Base
+
+
+class ApiDataCounterModel(Base):
+    """Количество строк api_data, разложенное по слотам; обновляется триггерами"""
+
+    __tablename__ = "api_data_counter"
+
+    slot = Column(SmallInteger, primary_key=True, autoincrement=False)
+    row_count = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,30 @@
+"""
+SQLAlchemy модель для таблицы fetch_jobs
+"""
+
+from uuid import uuid4
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text
+from sqlalchemy.dialects.postgresql import UUID as PostgresUUID  # noqa: N811
+
+from src.app.infrastructure.persistence.database import Base
+from src.app.infrastructure.persistence.models.api_data import utc_now
+
+
+class FetchJobModel(Base):
+    """Фоновое задание получения данных из внешнего API"""
+
+    __tablename__ = "fetch_jobs"
+    # Выборка очереди: WHERE status = 'queued' ORDER BY created_at
+    __table_args__ = (Index("ix_fetch_jobs_status_created_at", "status", "created_at"),)
+
+    id = Column(PostgresUUID(as_uuid=True), primary_key=True, default=uuid4)
+    number = Column(Integer, nullable=True)
+    status = Column(String(16), nullable=False)
+    result_id = Column(PostgresUUID(as_uuid=True), nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
+    updated_at = Column(DateTime(timezone=True), nullable=True, onupdate=utc_now)
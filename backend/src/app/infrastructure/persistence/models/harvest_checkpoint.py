@@ -0,0 +1,21 @@
+"""
+SQLAlchemy модель для таблицы harvest_checkpoints
+"""
+
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, Text
+
+from src.app.infrastructure.persistence.database import Base
+from src.app.infrastructure.persistence.models.api_data import utc_now
+
+
+class HarvestCheckpointModel(Base):
+    """Позиция фонового наполнения банка вопросов для возобновления после перезапуска"""
+
+    __tablename__ = "harvest_checkpoints"
+
+    name = Column(String(64), primary_key=True)
+    plan = Column(Text, nullable=False)
+    position = Column(BigInteger, nullable=False, default=0)
+    random_pulled = Column(Integer, nullable=False, default=0)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
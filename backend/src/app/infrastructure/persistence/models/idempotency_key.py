@@ -0,0 +1,23 @@
+"""
+SQLAlchemy модель для таблицы idempotency_keys
+"""
+
+from sqlalchemy import Column, DateTime, Integer, String
+from sqlalchemy.dialects.postgresql import JSONB
+
+from src.app.infrastructure.persistence.database import Base
+from src.app.infrastructure.persistence.models.api_data import utc_now
+
+
+class IdempotencyKeyModel(Base):
+    """Ключ идемпотентности запроса и сохраненный ответ на него"""
+
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(JSONB, nullable=True)
+    response_headers = Column(JSONB, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
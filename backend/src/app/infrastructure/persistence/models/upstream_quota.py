@@ -0,0 +1,20 @@
+"""
+SQLAlchemy модель для таблицы upstream_quota
+"""
+
+from sqlalchemy import Column, DateTime, Integer, String
+
+from src.app.infrastructure.persistence.database import Base
+from src.app.infrastructure.persistence.models.api_data import utc_now
+
+
+class UpstreamQuotaModel(Base):
+    """Счетчик квоты внешнего API, общий для всех реплик, по окнам времени"""
+
+    __tablename__ = "upstream_quota"
+
+    bucket = Column(String(64), primary_key=True)
+    window_start = Column(DateTime(timezone=True), primary_key=True)
+    used = Column(Integer, nullable=False, default=0)
+    last_grant = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
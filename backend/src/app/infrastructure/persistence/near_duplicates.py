@@ -0,0 +1,154 @@
+"""
+Поиск почти дубликатов вопросов по MinHash/LSH индексу в памяти
+"""
+
+import asyncio
+import logging
+import time
+from uuid import UUID
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.app.application.common.services.near_duplicates import DuplicateAction
+from src.app.domain.entities.api_data import ApiDataEntity
+from src.app.infrastructure.adapters.minhash_lsh import LshIndex, MinHasher
+from src.app.infrastructure.persistence.repositories.api_data_repository import ApiDataRepository
+
+logger = logging.getLogger(__name__)
+
+NEAR_DUPLICATE_CHECKS = Counter(
+    "near_duplicate_checks_total",
+    "Проверки новых вопросов на почти дубликаты по результату",
+    ["result"],
+)
+NEAR_DUPLICATE_CHECK_SECONDS = Histogram(
+    "near_duplicate_check_seconds",
+    "Длительность проверки вопроса на почти дубликат",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01),
+)
+NEAR_DUPLICATE_INDEX_SIZE = Gauge(
+    "near_duplicate_index_size",
+    "Количество вопросов в индексе почти дубликатов",
+)
+
+
+class NearDuplicateDetector:
+    """Индекс MinHash сигнатур сохраненных вопросов для проверки при записи.
+
+    При запуске индекс заполняется из api_data в фоне (записи, отмеченные как почти
+    дубликаты, не загружаются); пока загрузка идет, проверка работает по уже
+    загруженной части. Проверка индекс не меняет: новые вопросы добавляет тот, кто их
+    записал, после фиксации транзакции и с id, под которым строка сохранена. Слияние
+    хвоста индекса выполняется в отдельном потоке. Индекс свой у каждой реплики.
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker[AsyncSession],
+        action: DuplicateAction = DuplicateAction.FLAG,
+        threshold: float = 0.8,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 5,
+        merge_size: int = 4096,
+        load_batch_size: int = 10_000,
+    ):
+        self.session_maker = session_maker
+        self.action = action
+        self.threshold = threshold
+        self.merge_size = merge_size
+        self.load_batch_size = load_batch_size
+        self.hasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+        self.index = LshIndex(num_perm=num_perm, bands=bands)
+        self.loaded = False
+        self._loader: asyncio.Task | None = None
+        self._merger: asyncio.Task | None = None
+        NEAR_DUPLICATE_INDEX_SIZE.set_function(lambda: len(self.index))
+
+    def start(self) -> None:
+        """Запуск загрузки индекса из БД в фоне"""
+        if self._loader is None:
+            self._loader = asyncio.create_task(self._load())
+
+    async def aclose(self) -> None:
+        for task in (self._loader, self._merger):
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(
+            *(task for task in (self._loader, self._merger) if task is not None),
+            return_exceptions=True,
+        )
+
+    def check(self, entity: ApiDataEntity) -> UUID | None:
+        """ID сохраненного почти дубликата"""
+        started = time.perf_counter()
+        signature = self.hasher.signature(entity.content)
+        match = self.index.query(signature, self.threshold, exclude=entity.id)
+        NEAR_DUPLICATE_CHECKS.labels("unique" if match is None else "duplicate").inc()
+        NEAR_DUPLICATE_CHECK_SECONDS.observe(time.perf_counter() - started)
+        return match[0] if match else None
+
+    def add(self, entities: list[ApiDataEntity]) -> None:
+        """Добавление сохраненных вопросов; отмеченные как почти дубликаты пропускаются"""
+        originals = {
+            entity.id: entity.content for entity in entities if entity.duplicate_of is None
+        }
+        if not originals:
+            return
+        self.index.add_many(list(originals), self.hasher.signatures(list(originals.values())))
+        self._schedule_merge()
+
+    async def add_rows(self, rows: list[tuple[UUID, str]]) -> None:
+        """Добавление большой пачки сохраненных вопросов (id, content)"""
+        if not rows:
+            return
+        # Сигнатуры пачки считаются в отдельном потоке, чтобы не задерживать запросы
+        signatures = await asyncio.to_thread(
+            self.hasher.signatures, [content for _, content in rows]
+        )
+        self.index.add_many([data_id for data_id, _ in rows], signatures)
+        self._schedule_merge()
+
+    async def load(self) -> int:
+        """Заполнение индекса сохраненными вопросами; возвращает число загруженных"""
+        loaded = 0
+        async with self.session_maker() as session:
+            async for rows in ApiDataRepository(session).iter_originals(self.load_batch_size):
+                ids = [data_id for data_id, _ in rows]
+                # Сигнатуры пачки считаются в отдельном потоке, чтобы не задерживать запросы
+                signatures = await asyncio.to_thread(
+                    self.hasher.signatures, [content for _, content in rows]
+                )
+                self.index.add_many(ids, signatures)
+                loaded += len(ids)
+                if self.index.tail_size >= self.load_batch_size * 5:
+                    await self._merge()
+        await self._merge()
+        self.loaded = True
+        return loaded
+
+    async def _load(self) -> None:
+        started = time.perf_counter()
+        try:
+            loaded = await self.load()
+        except Exception as e:
+            logger.error(f"Не удалось загрузить индекс почти дубликатов: {e}")
+            return
+        logger.info(
+            f"Индекс почти дубликатов загружен: {loaded} вопросов "
+            f"за {time.perf_counter() - started:.1f} с"
+        )
+
+    def _schedule_merge(self) -> None:
+        if self.index.tail_size >= self.merge_size and (
+            self._merger is None or self._merger.done()
+        ):
+            self._merger = asyncio.create_task(self._merge())
+
+    async def _merge(self) -> None:
+        pending = self.index.begin_merge()
+        if pending is None:
+            return
+        merged = await asyncio.to_thread(LshIndex.build_merged, *pending)
+        self.index.finish_merge(merged)
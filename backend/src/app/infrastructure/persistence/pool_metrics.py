@@ -0,0 +1,80 @@
+"""
+Пул соединений с БД с метриками ожидания и занятости соединений
+"""
+
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
+
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Ожидание соединения из пула, включая открытие нового соединения",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total",
+    "Запросы соединения, не дождавшиеся свободного соединения за pool_timeout",
+    ["pool"],
+)
+DB_POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use",
+    "Соединения, выданные из пула",
+    ["pool"],
+)
+DB_POOL_IDLE = Gauge(
+    "db_pool_connections_idle",
+    "Открытые соединения, свободные в пуле",
+    ["pool"],
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow",
+    "Соединения сверх pool_size, открытые из запаса max_overflow",
+    ["pool"],
+)
+DB_POOL_INVALIDATED = Counter(
+    "db_pool_invalidated_total",
+    "Соединения, признанные негодными: hard - закрыты (обрыв, ошибка pre-ping), "
+    "soft - будут переоткрыты при следующей выдаче",
+    ["pool", "kind"],
+)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Асинхронный пул соединений, измеряющий ожидание соединения.
+
+    Имя пула для метрик берется из pool_logging_name движка и сохраняется при
+    пересоздании пула (engine.dispose).
+    """
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        name = getattr(self, "logging_name", None) or "primary"
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except sa_exc.TimeoutError:
+            DB_POOL_CHECKOUT_TIMEOUTS.labels(name).inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(name).observe(time.perf_counter() - started)
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> None:
+    """Метрики занятости пула движка и счетчик негодных соединений"""
+    sync_engine = engine.sync_engine
+    # Пул берется из движка при каждом сборе метрик: dispose заменяет его новым
+    DB_POOL_IN_USE.labels(name).set_function(lambda: sync_engine.pool.checkedout())
+    DB_POOL_IDLE.labels(name).set_function(lambda: sync_engine.pool.checkedin())
+    DB_POOL_OVERFLOW.labels(name).set_function(lambda: max(sync_engine.pool.overflow(), 0))
+
+    @event.listens_for(sync_engine, "invalidate")
+    def _count_invalidated(dbapi_connection, connection_record, exception) -> None:
+        DB_POOL_INVALIDATED.labels(name, "hard").inc()
+
+    @event.listens_for(sync_engine, "soft_invalidate")
+    def _count_soft_invalidated(dbapi_connection, connection_record, exception) -> None:
+        DB_POOL_INVALIDATED.labels(name, "soft").inc()
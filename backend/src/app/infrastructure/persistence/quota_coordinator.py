@@ -0,0 +1,280 @@
+"""
+Общая для всех реплик квота внешнего API на основе счетчиков в Postgres
+"""
+
+import asyncio
+import logging
+import math
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from typing import Protocol
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.app.infrastructure.persistence.models.upstream_quota import UpstreamQuotaModel
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_QUOTA_LEASE_TOKENS = Gauge(
+    "upstream_quota_lease_tokens",
+    "Неизрасходованные токены квоты, выданные этой реплике",
+    ["bucket"],
+)
+UPSTREAM_QUOTA_LEASES = Counter(
+    "upstream_quota_leases_total",
+    "Запросы пакетов токенов у общего счетчика квоты",
+    ["bucket", "result"],
+)
+
+
+@dataclass(frozen=True)
+class QuotaWindow:
+    """Окно квоты: не более limit запросов за seconds секунд на все реплики"""
+
+    bucket: str
+    seconds: int
+    limit: int
+
+    def start(self, now: datetime) -> datetime:
+        """Начало текущего окна, выровненное по эпохе (для суток - полночь UTC)"""
+        timestamp = math.floor(now.timestamp() / self.seconds) * self.seconds
+        return datetime.fromtimestamp(timestamp, UTC)
+
+
+class QuotaStoreProtocol(Protocol):
+    """Хранилище общих счетчиков квоты"""
+
+    async def grant(
+        self, window: QuotaWindow, window_start: datetime, amount: int
+    ) -> tuple[int, int]: ...
+
+
+class PostgresQuotaStore:
+    """Атомарная выдача токенов из счетчика в таблице upstream_quota"""
+
+    def __init__(self, session_maker: async_sessionmaker[AsyncSession]):
+        self.session_maker = session_maker
+
+    async def grant(
+        self, window: QuotaWindow, window_start: datetime, amount: int
+    ) -> tuple[int, int]:
+        """Выдача до amount токенов окна одним запросом.
+
+        Возвращает фактически выданное и общий расход окна всеми репликами после выдачи.
+        """
+        table = UpstreamQuotaModel.__table__
+        granted = func.greatest(func.least(amount, window.limit - table.c.used), 0)
+        initial = min(amount, window.limit)
+        statement = (
+            insert(table)
+            .values(
+                bucket=window.bucket,
+                window_start=window_start,
+                used=initial,
+                last_grant=initial,
+                updated_at=func.now(),
+            )
+            .on_conflict_do_update(
+                index_elements=[table.c.bucket, table.c.window_start],
+                set_={
+                    "last_grant": granted,
+                    "used": table.c.used + granted,
+                    "updated_at": func.now(),
+                },
+            )
+            .returning(table.c.last_grant, table.c.used)
+        )
+
+        async with self.session_maker() as session:
+            result = await session.execute(statement)
+            await session.commit()
+            row = result.one()
+            return row.last_grant, row.used
+
+    async def purge(self, bucket: str, older_than: datetime) -> None:
+        """Удаление счетчиков завершившихся окон одного вида квоты"""
+        async with self.session_maker() as session:
+            await session.execute(
+                delete(UpstreamQuotaModel).where(
+                    UpstreamQuotaModel.bucket == bucket,
+                    UpstreamQuotaModel.window_start < older_than,
+                )
+            )
+            await session.commit()
+
+
+@dataclass
+class _Lease:
+    window_start: datetime | None = None
+    tokens: int = 0
+    exhausted: bool = False
+    fallback_used: bool = False
+    # Расход окна всеми репликами по последнему пакету; None - пакетов из БД еще не было
+    window_used: int | None = None
+
+
+class DistributedQuota:
+    """Локальные пакеты токенов, получаемые у общего счетчика.
+
+    Обычный вызов расходует токен из пакета в памяти без обращения к БД; новый
+    пакет запрашивается заранее, когда остаток опускается ниже нижней границы.
+    Пакеты привязаны к окну, поэтому токены упавшей реплики сгорают вместе с ее
+    окном и квота никогда не превышается. Счетчики завершившихся окон удаляются при
+    смене окна, но не чаще раза в purge_interval секунд для каждого вида квоты.
+    """
+
+    def __init__(
+        self,
+        store: QuotaStoreProtocol,
+        windows: list[QuotaWindow],
+        lease_size: int,
+        low_watermark: int = 0,
+        fallback_share: float = 0.0,
+        purge_interval: float = 60.0,
+        now: Callable[[], datetime] = lambda: datetime.now(UTC),
+    ):
+        self.store = store
+        self.windows = windows
+        self.lease_size = lease_size
+        self.low_watermark = low_watermark
+        self.fallback_share = fallback_share
+        self.purge_interval = purge_interval
+        self._now = now
+        self._purged_at: dict[str, datetime] = {}
+        self._leases = {window.bucket: _Lease() for window in windows}
+        self._replenishing: asyncio.Task | None = None
+        for window in windows:
+            UPSTREAM_QUOTA_LEASE_TOKENS.labels(window.bucket).set_function(
+                lambda bucket=window.bucket: self._leases[bucket].tokens
+            )
+
+    def try_take(self) -> bool:
+        """Расход токена из локальных пакетов без ввода-вывода"""
+        now = self._now()
+        leases = [self._leases[window.bucket] for window in self.windows]
+        ready = all(
+            lease.window_start == window.start(now) and lease.tokens >= 1
+            for window, lease in zip(self.windows, leases, strict=True)
+        )
+        if not ready:
+            self._schedule_replenish()
+            return False
+
+        for lease in leases:
+            lease.tokens -= 1
+        if any(lease.tokens <= self.low_watermark and not lease.exhausted for lease in leases):
+            self._schedule_replenish()
+        return True
+
+    def give_back(self) -> None:
+        """Возврат токена, взятого try_take, но не израсходованного вызывающим"""
+        now = self._now()
+        for window in self.windows:
+            lease = self._leases[window.bucket]
+            # Токен завершившегося окна сгорает вместе с его пакетом
+            if lease.window_start == window.start(now):
+                lease.tokens += 1
+
+    def allowance(self, window: QuotaWindow) -> int:
+        """Оценка остатка текущего окна, доступного этой реплике.
+
+        Общий остаток по последнему пакету плюс свои неизрасходованные токены: токены
+        пакетов других реплик уже выданы им. Без координатора - только свои токены.
+        """
+        lease = self._leases[window.bucket]
+        if lease.window_start != window.start(self._now()) or (
+            lease.window_used is None and not lease.fallback_used
+        ):
+            # Пакет нового окна еще не запрошен: расхода в нем мы не знаем
+            return window.limit
+        if lease.window_used is None:
+            return lease.tokens
+        return max(window.limit - lease.window_used, 0) + lease.tokens
+
+    def available_tokens(self) -> float:
+        """Оценка остатка самого тесного окна короче суток"""
+        short = [window for window in self.windows if window.seconds < 86400]
+        return min((self.allowance(window) for window in short), default=float("inf"))
+
+    def daily_allowance(self) -> tuple[int, float] | None:
+        """Оценка остатка суточной квоты и время до ее сброса; None - квота не задана"""
+        window = next((window for window in self.windows if window.seconds >= 86400), None)
+        if window is None:
+            return None
+        now = self._now()
+        window_end = window.start(now) + timedelta(seconds=window.seconds)
+        return self.allowance(window), (window_end - now).total_seconds()
+
+    async def replenish(self) -> float:
+        """Получение новых пакетов; возвращает время до появления токенов (0 - уже есть)"""
+        self._schedule_replenish()
+        await asyncio.shield(self._replenishing)
+
+        now = self._now()
+        wait = 0.0
+        for window in self.windows:
+            lease = self._leases[window.bucket]
+            if lease.tokens < 1 or lease.window_start != window.start(now):
+                window_end = window.start(now) + timedelta(seconds=window.seconds)
+                wait = max(wait, (window_end - now).total_seconds())
+        return wait
+
+    async def aclose(self) -> None:
+        """Ожидание незавершенного запроса пакета"""
+        if self._replenishing is not None:
+            self._replenishing.cancel()
+            await asyncio.gather(self._replenishing, return_exceptions=True)
+
+    def _schedule_replenish(self) -> None:
+        if self._replenishing is None or self._replenishing.done():
+            self._replenishing = asyncio.create_task(self._replenish_leases())
+
+    async def _replenish_leases(self) -> None:
+        now = self._now()
+        for window in self.windows:
+            lease = self._leases[window.bucket]
+            window_start = window.start(now)
+            if lease.window_start != window_start:
+                if lease.window_start is not None:
+                    await self._purge(window, window_start, now)
+                self._leases[window.bucket] = lease = _Lease(window_start=window_start)
+
+            if lease.exhausted or lease.tokens > self.low_watermark:
+                continue
+
+            try:
+                granted, lease.window_used = await self.store.grant(
+                    window, window_start, self.lease_size
+                )
+                UPSTREAM_QUOTA_LEASES.labels(window.bucket, "granted").inc()
+            except Exception as e:
+                logger.error(f"Не удалось получить пакет квоты '{window.bucket}': {e}")
+                UPSTREAM_QUOTA_LEASES.labels(window.bucket, "error").inc()
+                if lease.fallback_used:
+                    continue
+                # Без координатора реплика довольствуется своей долей окна
+                lease.fallback_used = True
+                granted = math.floor(window.limit * self.fallback_share)
+
+            lease.tokens += granted
+            if granted < self.lease_size:
+                lease.exhausted = True
+
+    async def _purge(self, window: QuotaWindow, window_start: datetime, now: datetime) -> None:
+        purge = getattr(self.store, "purge", None)
+        if purge is None:
+            return
+        # Короткие окна сменяются каждые несколько секунд - удаляем их пачкой
+        last = self._purged_at.get(window.bucket)
+        interval = max(self.purge_interval, window.seconds)
+        if last is not None and (now - last).total_seconds() < interval:
+            return
+        self._purged_at[window.bucket] = now
+        try:
+            await purge(window.bucket, window_start)
+        except Exception as e:
+            logger.warning(f"Не удалось удалить устаревшие счетчики квоты: {e}")
@@ -0,0 +1,194 @@
+"""
+Маршрутизация чтения по репликам БД с учетом отставания и чтения своих записей
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import StrEnum
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+DB_READS = Counter(
+    "db_reads_total",
+    "Сессии чтения по цели (реплика или primary) и причине выбора",
+    ["target", "reason"],
+)
+DB_REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds",
+    "Отставание реплики от основной БД по последней проверке",
+    ["replica"],
+)
+DB_REPLICA_IN_ROTATION = Gauge(
+    "db_replica_in_rotation",
+    "Реплика участвует в ротации чтения (1) или выведена из нее (0)",
+    ["replica"],
+)
+
+# Весь полученный WAL воспроизведен - реплика догнала основную БД, даже если последняя
+# транзакция была давно. Но без потокового приемника WAL новые данные не поступают:
+# отставание неизвестно (NULL), и реплика выводится из ротации
+_LAG_QUERY = text(
+    "SELECT CASE "
+    "WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+_primary_pinned: ContextVar[bool] = ContextVar("db_primary_pinned", default=False)
+
+
+@contextmanager
+def primary_pinned(pinned: bool = True) -> Iterator[None]:
+    """Чтение внутри блока идет в основную БД (запрос с записью или сразу после нее)"""
+    token = _primary_pinned.set(pinned)
+    try:
+        yield
+    finally:
+        _primary_pinned.reset(token)
+
+
+def is_primary_pinned() -> bool:
+    """Закреплено ли чтение в текущем контексте за основной БД"""
+    return _primary_pinned.get()
+
+
+class ReplicaSelection(StrEnum):
+    """Способ выбора реплики для чтения"""
+
+    ROUND_ROBIN = "round_robin"
+    LEAST_LATENCY = "least_latency"
+
+
+@dataclass
+class Replica:
+    """Реплика для чтения и результаты ее последней проверки"""
+
+    name: str
+    engine: AsyncEngine
+    session_maker: async_sessionmaker[AsyncSession]
+    in_rotation: bool = False
+    lag: float | None = None
+    latency: float | None = None
+
+
+class ReplicaRouter:
+    """Выбор фабрики сессий для чтения: реплика из ротации или основная БД.
+
+    Фоновая проверка раз в check_interval измеряет отставание каждой реплики и
+    время ответа (скользящее среднее). Реплика с отставанием больше max_lag или
+    не ответившая выводится из ротации и возвращается, когда отставание падает
+    до половины max_lag. До первой проверки и без реплик в ротации чтение идет
+    в основную БД; так же - при закреплении контекста (primary_pinned).
+    """
+
+    def __init__(
+        self,
+        replicas: list[Replica],
+        primary_session_maker: async_sessionmaker[AsyncSession],
+        selection: ReplicaSelection = ReplicaSelection.ROUND_ROBIN,
+        max_lag: float = 5.0,
+        check_interval: float = 2.0,
+        check_timeout: float = 1.0,
+        latency_smoothing: float = 0.3,
+    ):
+        self.replicas = replicas
+        self.primary_session_maker = primary_session_maker
+        self.selection = selection
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self.latency_smoothing = latency_smoothing
+        self._turn = itertools.count()
+        self._checker: asyncio.Task | None = None
+        for replica in replicas:
+            DB_REPLICA_IN_ROTATION.labels(replica.name).set(0)
+
+    def start(self) -> None:
+        """Запуск фоновой проверки реплик"""
+        if self._checker is None:
+            self._checker = asyncio.create_task(self._run())
+
+    async def aclose(self) -> None:
+        if self._checker is not None:
+            self._checker.cancel()
+            await asyncio.gather(self._checker, return_exceptions=True)
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def session_maker(self) -> async_sessionmaker[AsyncSession]:
+        """Фабрика сессий для очередного чтения"""
+        if is_primary_pinned():
+            DB_READS.labels("primary", "pinned").inc()
+            return self.primary_session_maker
+        available = [replica for replica in self.replicas if replica.in_rotation]
+        if not available:
+            DB_READS.labels("primary", "no_replica").inc()
+            return self.primary_session_maker
+
+        if self.selection == ReplicaSelection.LEAST_LATENCY:
+            replica = min(available, key=lambda replica: replica.latency or 0.0)
+        else:
+            replica = available[next(self._turn) % len(available)]
+        DB_READS.labels(replica.name, "replica").inc()
+        return replica.session_maker
+
+    async def check(self, replica: Replica) -> None:
+        """Проверка отставания реплики и обновление ее места в ротации"""
+        started = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.check_timeout):
+                async with replica.engine.connect() as connection:
+                    lag = (await connection.execute(_LAG_QUERY)).scalar()
+        except Exception as e:
+            replica.lag = None
+            self._set_rotation(replica, False, f"недоступна: {e}")
+            return
+
+        elapsed = time.perf_counter() - started
+        if replica.latency is None:
+            replica.latency = elapsed
+        else:
+            replica.latency += (elapsed - replica.latency) * self.latency_smoothing
+        if lag is None:
+            replica.lag = None
+            self._set_rotation(replica, False, "нет потока WAL от основной БД")
+            return
+        lag = float(lag)
+        replica.lag = lag
+        DB_REPLICA_LAG.labels(replica.name).set(lag)
+
+        if lag > self.max_lag:
+            self._set_rotation(replica, False, f"отставание {lag:.1f} с")
+        elif not replica.in_rotation and lag <= self.max_lag / 2:
+            self._set_rotation(replica, True, f"отставание {lag:.1f} с")
+
+    async def check_all(self) -> None:
+        """Проверка всех реплик параллельно"""
+        await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+
+    async def _run(self) -> None:
+        while True:
+            await self.check_all()
+            await asyncio.sleep(self.check_interval)
+
+    @staticmethod
+    def _set_rotation(replica: Replica, in_rotation: bool, reason: str) -> None:
+        if replica.in_rotation == in_rotation:
+            return
+        replica.in_rotation = in_rotation
+        DB_REPLICA_IN_ROTATION.labels(replica.name).set(int(in_rotation))
+        if in_rotation:
+            logger.info(f"Реплика {replica.name} возвращена в ротацию чтения: {reason}")
+        else:
+            logger.warning(f"Реплика {replica.name} выведена из ротации чтения: {reason}")
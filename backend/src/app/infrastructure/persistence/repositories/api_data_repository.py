@@ -2,35 +2,104 @@
 Репозиторий для работы с данными из внешних API
 """
 
+from collections.abc import AsyncIterator
+from datetime import datetime
 from uuid import UUID
 
-from sqlalchemy import select
+from sqlalchemy import Select, func, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.app.application.common.ports import NearDuplicateDetectorProtocol
 from src.app.domain.entities.api_data import ApiDataEntity
 from src.app.infrastructure.persistence.models.api_data import ApiDataModel
+from src.app.infrastructure.persistence.models.api_data_counter import ApiDataCounterModel
 
 
 class ApiDataRepository:
-    """Репозиторий для работы с api_data"""
+    """Репозиторий для работы с api_data.
 
-    def __init__(self, session: AsyncSession):
+    Если задан near_duplicates, сохраненные вопросы добавляются в индекс почти дубликатов
+    после фиксации транзакции.
+    """
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        near_duplicates: NearDuplicateDetectorProtocol | None = None,
+    ):
         self.session = session
+        self.near_duplicates = near_duplicates
 
     async def create(self, entity: ApiDataEntity) -> ApiDataEntity:
-        """Создание новой записи"""
-        model = ApiDataModel(
-            source=entity.source,
-            title=entity.title,
-            content=entity.content,
-            external_id=entity.external_id,
-            fetched_at=entity.fetched_at,
+        """Создание записи или обновление существующей с теми же (source, external_id)"""
+        await self.create_many([entity])
+        return entity
+
+    async def create_many(self, entities: list[ApiDataEntity]) -> list[ApiDataEntity]:
+        """Вставка записей одним INSERT ... ON CONFLICT DO UPDATE по (source, external_id).
+
+        Для уже сохраненных вопросов обновляется текст и время получения, а сущности
+        получают id существующей строки.
+        """
+        if not entities:
+            return []
+
+        # Один ключ не может обновляться дважды в одном INSERT - оставляем последнюю версию
+        unique = {conflict_key(entity): entity for entity in entities}
+        table = ApiDataModel.__table__
+        statement = insert(table).values(
+            [
+                {
+                    "id": entity.id,
+                    "source": entity.source,
+                    "title": entity.title,
+                    "content": entity.content,
+                    "external_id": entity.external_id,
+                    "fetched_at": entity.fetched_at,
+                    "duplicate_of": entity.duplicate_of,
+                }
+                for entity in unique.values()
+            ]
         )
-        self.session.add(model)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.external_id, table.c.source],
+            set_={
+                "title": statement.excluded.title,
+                "content": statement.excluded.content,
+                "fetched_at": statement.excluded.fetched_at,
+                "duplicate_of": statement.excluded.duplicate_of,
+                "updated_at": func.now(),
+            },
+        ).returning(
+            table.c.id, table.c.source, table.c.external_id, table.c.created_at, table.c.updated_at
+        )
+        result = await self.session.execute(statement)
+        stored = {conflict_key(row): row for row in result}
         await self.session.commit()
-        await self.session.refresh(model)
-        entity.id = model.id
-        return entity
+
+        for entity in entities:
+            row = stored[conflict_key(entity)]
+            entity.id = row.id
+            entity.created_at = row.created_at
+            entity.updated_at = row.updated_at
+        if self.near_duplicates is not None:
+            self.near_duplicates.add(list(unique.values()))
+        return entities
+
+    async def get_latest_by_external_id(
+        self, external_id: str, source: str
+    ) -> ApiDataEntity | None:
+        """Запись источника с данным внешним идентификатором (по уникальному индексу)"""
+        result = await self.session.execute(
+            select(ApiDataModel).where(
+                ApiDataModel.external_id == external_id, ApiDataModel.source == source
+            )
+        )
+        model = result.scalar_one_or_none()
+        if not model:
+            return None
+        return self._to_entity(model)
 
     async def get_by_id(self, data_id: UUID) -> ApiDataEntity | None:
         """Получение записи по ID"""
@@ -40,38 +109,101 @@ class ApiDataRepository:
             return None
         return self._to_entity(model)
 
-    async def get_all(self, limit: int = 10, offset: int = 0) -> list[ApiDataEntity]:
-        """Получение всех записей с пагинацией"""
+    async def get_ids_by_keys(self, keys: list[tuple[str, str]]) -> dict[tuple[str, str], UUID]:
+        """id сохраненных записей по ключам (source, external_id)"""
+        if not keys:
+            return {}
         result = await self.session.execute(
-            select(ApiDataModel)
-            .order_by(ApiDataModel.fetched_at.desc())
-            .limit(limit)
-            .offset(offset)
+            select(ApiDataModel.id, ApiDataModel.source, ApiDataModel.external_id).where(
+                tuple_(ApiDataModel.source, ApiDataModel.external_id).in_(keys)
+            )
+        )
+        return {(row.source, row.external_id): row.id for row in result}
+
+    async def get_existing_external_ids(self, source: str, external_ids: list[str]) -> set[str]:
+        """Внешние идентификаторы источника, для которых записи уже есть"""
+        if not external_ids:
+            return set()
+        result = await self.session.execute(
+            select(ApiDataModel.external_id)
+            .where(ApiDataModel.source == source, ApiDataModel.external_id.in_(external_ids))
+            .distinct()
+        )
+        return set(result.scalars().all())
+
+    async def iter_originals(self, batch_size: int = 10_000) -> AsyncIterator[list[tuple]]:
+        """Пачки (id, content) записей, не отмеченных как почти дубликаты"""
+        result = await self.session.stream(
+            select(ApiDataModel.id, ApiDataModel.content)
+            .where(ApiDataModel.duplicate_of.is_(None))
+            .execution_options(yield_per=batch_size)
         )
+        async for rows in result.partitions(batch_size):
+            yield [tuple(row) for row in rows]
+
+    async def get_all(
+        self, limit: int = 10, offset: int = 0, after: tuple[datetime, UUID] | None = None
+    ) -> list[ApiDataEntity]:
+        """Получение всех записей с пагинацией по смещению или после (fetched_at, id)"""
+        result = await self.session.execute(_page(select(ApiDataModel), limit, offset, after))
         models = result.scalars().all()
         return [self._to_entity(model) for model in models]
 
+    async def get_all_with_total(
+        self, limit: int = 10, offset: int = 0, after: tuple[datetime, UUID] | None = None
+    ) -> tuple[list[ApiDataEntity], int]:
+        """Страница и точное количество записей одним запросом"""
+        if after is None:
+            # Оконная функция считается до LIMIT/OFFSET - по всем строкам выборки
+            total = func.count().over()
+        else:
+            # После курсора выборка неполная, поэтому всю таблицу считает подзапрос
+            total = select(func.count()).select_from(ApiDataModel).scalar_subquery()
+        result = await self.session.execute(
+            _page(select(ApiDataModel, total.label("total")), limit, offset, after)
+        )
+        rows = result.all()
+        if not rows:
+            # Страница за концом списка: строк с итогом нет
+            return [], await self.count()
+        return [self._to_entity(row[0]) for row in rows], rows[0].total
+
     async def get_by_source(
-        self, source: str, limit: int = 10, offset: int = 0
+        self,
+        source: str,
+        limit: int = 10,
+        offset: int = 0,
+        after: tuple[datetime, UUID] | None = None,
     ) -> list[ApiDataEntity]:
         """Получение записей по источнику"""
         result = await self.session.execute(
-            select(ApiDataModel)
-            .where(ApiDataModel.source == source)
-            .order_by(ApiDataModel.fetched_at.desc())
-            .limit(limit)
-            .offset(offset)
+            _page(select(ApiDataModel).where(ApiDataModel.source == source), limit, offset, after)
         )
         models = result.scalars().all()
         return [self._to_entity(model) for model in models]
 
     async def count(self) -> int:
         """Подсчет общего количества записей"""
-        from sqlalchemy import func
-
         result = await self.session.execute(select(func.count(ApiDataModel.id)))
         return result.scalar_one()
 
+    async def count_cached(self) -> int:
+        """Количество записей по счетчику api_data_counter, который ведут триггеры"""
+        result = await self.session.execute(
+            select(func.coalesce(func.sum(ApiDataCounterModel.row_count), 0))
+        )
+        return int(result.scalar_one())
+
+    async def count_estimate(self) -> int | None:
+        """Оценка количества записей планировщиком; None, пока таблица не анализировалась"""
+        result = await self.session.execute(
+            text("SELECT reltuples FROM pg_class WHERE oid = to_regclass('api_data')")
+        )
+        estimate = result.scalar_one_or_none()
+        if estimate is None or estimate < 0:
+            return None
+        return int(estimate)
+
     def _to_entity(self, model: ApiDataModel) -> ApiDataEntity:
         """Преобразование модели в сущность"""
         return ApiDataEntity(
@@ -81,6 +213,31 @@ class ApiDataRepository:
             content=model.content,
             external_id=model.external_id,
             fetched_at=model.fetched_at,
+            duplicate_of=model.duplicate_of,
             created_at=model.created_at,
             updated_at=model.updated_at,
         )
+
+
+def _page(
+    statement: Select, limit: int, offset: int, after: tuple[datetime, UUID] | None
+) -> Select:
+    """Страница от новых к старым; id различает записи с одинаковым fetched_at.
+
+    С after (keyset) страница читается по индексу (fetched_at, id) с нужного места, и ее
+    стоимость не зависит от глубины; offset пропускает строки по одной.
+    """
+    if after is not None:
+        statement = statement.where(tuple_(ApiDataModel.fetched_at, ApiDataModel.id) < after)
+    return (
+        statement.order_by(ApiDataModel.fetched_at.desc(), ApiDataModel.id.desc())
+        .limit(limit)
+        .offset(offset)
+    )
+
+
+def conflict_key(row) -> tuple:
+    """Ключ уникальности записи; без external_id строки не конфликтуют"""
+    if row.external_id is None:
+        return ("id", row.id)
+    return (row.source, row.external_id)
@@ -0,0 +1,123 @@
+"""
+Репозиторий для фоновых заданий получения данных
+"""
+
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.domain.entities.fetch_job import FetchJobEntity, FetchJobStatus
+from src.app.infrastructure.persistence.models.api_data import utc_now
+from src.app.infrastructure.persistence.models.fetch_job import FetchJobModel
+
+
+class FetchJobRepository:
+    """Репозиторий для работы с fetch_jobs"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def create(self, entity: FetchJobEntity) -> FetchJobEntity:
+        """Создание задания в состоянии queued"""
+        self.session.add(
+            FetchJobModel(
+                id=entity.id,
+                number=entity.number,
+                status=entity.status,
+                attempts=entity.attempts,
+                created_at=entity.created_at,
+            )
+        )
+        await self.session.commit()
+        return entity
+
+    async def get_by_id(self, job_id: UUID) -> FetchJobEntity | None:
+        """Получение задания по ID"""
+        result = await self.session.execute(select(FetchJobModel).where(FetchJobModel.id == job_id))
+        model = result.scalar_one_or_none()
+        if not model:
+            return None
+        return self._to_entity(model)
+
+    async def claim(self, job_id: UUID) -> FetchJobEntity | None:
+        """Атомарный перевод задания из queued в running; None, если его уже взяли"""
+        result = await self.session.execute(
+            update(FetchJobModel)
+            .where(FetchJobModel.id == job_id, FetchJobModel.status == FetchJobStatus.QUEUED)
+            .values(
+                status=FetchJobStatus.RUNNING,
+                attempts=FetchJobModel.attempts + 1,
+                started_at=utc_now(),
+                updated_at=utc_now(),
+            )
+            .returning(FetchJobModel)
+        )
+        model = result.scalar_one_or_none()
+        await self.session.commit()
+        return self._to_entity(model) if model else None
+
+    async def finish(
+        self, job_id: UUID, result_id: UUID | None = None, error: str | None = None
+    ) -> None:
+        """Завершение задания с результатом или ошибкой"""
+        status = FetchJobStatus.FAILED if error is not None else FetchJobStatus.SUCCEEDED
+        await self.session.execute(
+            update(FetchJobModel)
+            .where(FetchJobModel.id == job_id)
+            .values(
+                status=status,
+                result_id=result_id,
+                error=error,
+                finished_at=utc_now(),
+                updated_at=utc_now(),
+            )
+        )
+        await self.session.commit()
+
+    async def requeue_stale(self, started_before: datetime) -> None:
+        """Возврат в очередь заданий, прерванных остановкой процесса"""
+        await self.session.execute(
+            update(FetchJobModel)
+            .where(
+                FetchJobModel.status == FetchJobStatus.RUNNING,
+                or_(FetchJobModel.started_at.is_(None), FetchJobModel.started_at < started_before),
+            )
+            .values(status=FetchJobStatus.QUEUED, updated_at=utc_now())
+        )
+        await self.session.commit()
+
+    async def release(self, job_ids: list[UUID]) -> None:
+        """Возврат в очередь заданий, выполнение которых прервано остановкой обработчиков"""
+        await self.session.execute(
+            update(FetchJobModel)
+            .where(FetchJobModel.id.in_(job_ids), FetchJobModel.status == FetchJobStatus.RUNNING)
+            .values(status=FetchJobStatus.QUEUED, updated_at=utc_now())
+        )
+        await self.session.commit()
+
+    async def get_queued_ids(self, limit: int) -> list[UUID]:
+        """ID ожидающих заданий в порядке создания"""
+        result = await self.session.execute(
+            select(FetchJobModel.id)
+            .where(FetchJobModel.status == FetchJobStatus.QUEUED)
+            .order_by(FetchJobModel.created_at)
+            .limit(limit)
+        )
+        return list(result.scalars())
+
+    def _to_entity(self, model: FetchJobModel) -> FetchJobEntity:
+        """Преобразование модели в сущность"""
+        return FetchJobEntity(
+            id=model.id,
+            number=model.number,
+            status=FetchJobStatus(model.status),
+            result_id=model.result_id,
+            error=model.error,
+            attempts=model.attempts,
+            started_at=model.started_at,
+            finished_at=model.finished_at,
+            created_at=model.created_at,
+            updated_at=model.updated_at,
+        )
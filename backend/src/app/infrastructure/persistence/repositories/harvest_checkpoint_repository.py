@@ -0,0 +1,63 @@
+"""
+Репозиторий для контрольных точек фонового наполнения банка вопросов
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.infrastructure.persistence.models.api_data import utc_now
+from src.app.infrastructure.persistence.models.harvest_checkpoint import HarvestCheckpointModel
+
+
+@dataclass
+class HarvestCheckpoint:
+    """Прогресс наполнения: позиция в диапазонах чисел и число случайных вопросов"""
+
+    name: str
+    plan: str
+    position: int = 0
+    random_pulled: int = 0
+    finished_at: datetime | None = None
+
+
+class HarvestCheckpointRepository:
+    """Репозиторий для работы с harvest_checkpoints"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get(self, name: str) -> HarvestCheckpoint | None:
+        """Получение контрольной точки по имени"""
+        result = await self.session.execute(
+            select(HarvestCheckpointModel).where(HarvestCheckpointModel.name == name)
+        )
+        model = result.scalar_one_or_none()
+        if not model:
+            return None
+        return HarvestCheckpoint(
+            name=model.name,
+            plan=model.plan,
+            position=model.position,
+            random_pulled=model.random_pulled,
+            finished_at=model.finished_at,
+        )
+
+    async def save(self, checkpoint: HarvestCheckpoint) -> None:
+        """Создание или обновление контрольной точки"""
+        values = {
+            "plan": checkpoint.plan,
+            "position": checkpoint.position,
+            "random_pulled": checkpoint.random_pulled,
+            "finished_at": checkpoint.finished_at,
+            "updated_at": utc_now(),
+        }
+        await self.session.execute(
+            insert(HarvestCheckpointModel)
+            .values(name=checkpoint.name, **values)
+            .on_conflict_do_update(index_elements=[HarvestCheckpointModel.name], set_=values)
+        )
+        await self.session.commit()
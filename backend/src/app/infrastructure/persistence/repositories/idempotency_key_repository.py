@@ -0,0 +1,130 @@
+"""
+Репозиторий для ключей идемпотентности HTTP запросов
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.infrastructure.persistence.models.api_data import utc_now
+from src.app.infrastructure.persistence.models.idempotency_key import IdempotencyKeyModel
+
+
+@dataclass
+class StoredResponse:
+    """Ответ, повторно отдаваемый на запрос с тем же ключом"""
+
+    status_code: int
+    body: dict | list | None
+    headers: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class IdempotencyRecord:
+    """Состояние ключа: response is None, пока первый запрос выполняется"""
+
+    key: str
+    request_hash: str
+    expires_at: datetime
+    response: StoredResponse | None = None
+    owned: bool = False
+
+
+class IdempotencyKeyRepository:
+    """Репозиторий для работы с idempotency_keys"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def reserve(self, key: str, request_hash: str, expires_at: datetime) -> IdempotencyRecord:
+        """Захват ключа для выполнения запроса; истекший ключ захватывается заново.
+
+        expires_at - срок аренды незавершенного запроса: если выполнявшая его реплика
+        упала, ключ освобождается по его истечении. Если ключ уже занят, возвращается
+        его текущее состояние с owned=False.
+        """
+        table = IdempotencyKeyModel.__table__
+        now = utc_now()
+        values = {
+            "request_hash": request_hash,
+            "status_code": None,
+            "response_body": None,
+            "response_headers": None,
+            "created_at": now,
+            "expires_at": expires_at,
+        }
+        result = await self.session.execute(
+            insert(table)
+            .values(key=key, **values)
+            .on_conflict_do_update(
+                index_elements=[table.c.key], set_=values, where=table.c.expires_at <= now
+            )
+            .returning(table.c.key)
+        )
+        owned = result.scalar_one_or_none() is not None
+        await self.session.commit()
+        if owned:
+            return IdempotencyRecord(key, request_hash, expires_at, owned=True)
+
+        record = await self.get(key)
+        if record is None:
+            # Ключ освобожден между INSERT и SELECT - пробуем снова
+            return await self.reserve(key, request_hash, expires_at)
+        return record
+
+    async def get(self, key: str) -> IdempotencyRecord | None:
+        """Получение состояния ключа"""
+        result = await self.session.execute(
+            select(IdempotencyKeyModel).where(IdempotencyKeyModel.key == key)
+        )
+        model = result.scalar_one_or_none()
+        if not model:
+            return None
+
+        response = None
+        if model.status_code is not None:
+            response = StoredResponse(
+                status_code=model.status_code,
+                body=model.response_body,
+                headers=model.response_headers or {},
+            )
+        return IdempotencyRecord(
+            key=model.key,
+            request_hash=model.request_hash,
+            expires_at=model.expires_at,
+            response=response,
+        )
+
+    async def complete(self, key: str, response: StoredResponse, expires_at: datetime) -> None:
+        """Сохранение ответа на запрос; ключ хранится до expires_at"""
+        await self.session.execute(
+            update(IdempotencyKeyModel)
+            .where(IdempotencyKeyModel.key == key)
+            .values(
+                status_code=response.status_code,
+                response_body=response.body,
+                response_headers=response.headers,
+                expires_at=expires_at,
+            )
+        )
+        await self.session.commit()
+
+    async def release(self, key: str) -> None:
+        """Освобождение ключа незавершенного запроса, чтобы повтор выполнился заново"""
+        await self.session.execute(
+            delete(IdempotencyKeyModel).where(
+                IdempotencyKeyModel.key == key, IdempotencyKeyModel.status_code.is_(None)
+            )
+        )
+        await self.session.commit()
+
+    async def purge_expired(self, now: datetime) -> int:
+        """Удаление истекших ключей"""
+        result = await self.session.execute(
+            delete(IdempotencyKeyModel).where(IdempotencyKeyModel.expires_at <= now)
+        )
+        await self.session.commit()
+        return result.rowcount
@@ -0,0 +1,298 @@
+"""
+Отложенная групповая запись полученных вопросов в БД (write-behind)
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from uuid import UUID
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.app.application.common.deadline import no_deadline
+from src.app.application.common.ports import NearDuplicateDetectorProtocol
+from src.app.domain.entities.api_data import ApiDataEntity
+from src.app.infrastructure.persistence.repositories.api_data_repository import (
+    ApiDataRepository,
+    conflict_key,
+)
+
+logger = logging.getLogger(__name__)
+
+API_DATA_WRITE_BEHIND_PENDING = Gauge(
+    "api_data_write_behind_pending",
+    "Записи api_data, ожидающие групповой записи в БД",
+)
+API_DATA_WRITE_BEHIND_FLUSH_ROWS = Histogram(
+    "api_data_write_behind_flush_rows",
+    "Количество записей в одном групповом INSERT",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+API_DATA_WRITE_BEHIND_FLUSH_SECONDS = Histogram(
+    "api_data_write_behind_flush_seconds",
+    "Длительность группового INSERT с фиксацией транзакции",
+)
+API_DATA_WRITE_BEHIND_FLUSHES = Counter(
+    "api_data_write_behind_flushes_total",
+    "Групповые записи api_data по причине и результату",
+    ["reason", "result"],
+)
+API_DATA_WRITE_BEHIND_LOST = Counter(
+    "api_data_write_behind_lost_total",
+    "Записи api_data, не сохраненные при остановке приложения",
+)
+API_DATA_WRITE_BEHIND_DROPPED = Counter(
+    "api_data_write_behind_dropped_total",
+    "Записи api_data, отброшенные после ошибки при записи по одной",
+)
+
+
+class WriteBehindBuffer:
+    """Буфер новых записей api_data, сбрасываемый одним INSERT по объему или времени.
+
+    Вызывающий сразу получает сущность с id, который сохранится в БД: для записи с
+    external_id это id уже сохраненной или ожидающей сброса строки с тем же
+    (source, external_id) (upsert обновит ее), для новой - id, сгенерированный на клиенте.
+    Запись становится видна другим репликам после ближайшего сброса (не позже
+    flush_interval). Пока запись в буфере, она доступна по id через pending. В индекс
+    почти дубликатов (near_duplicates) записи попадают после сброса. Если INSERT пачки
+    отклонен не из-за соединения с БД, записи пачки сохраняются по одной, а отклоненные
+    отбрасываются с ошибкой в логе, чтобы одна строка не блокировала весь буфер. При
+    остановке буфер сбрасывается до конца; если БД недоступна, потерянные записи попадают
+    в метрику.
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker[AsyncSession],
+        max_rows: int = 500,
+        flush_interval: float = 0.05,
+        max_pending: int = 10_000,
+        shutdown_attempts: int = 3,
+        near_duplicates: NearDuplicateDetectorProtocol | None = None,
+    ):
+        self.session_maker = session_maker
+        self.near_duplicates = near_duplicates
+        self.max_rows = max(max_rows, 1)
+        self.flush_interval = flush_interval
+        self.max_pending = max(max_pending, self.max_rows)
+        self.shutdown_attempts = shutdown_attempts
+        # По ключу уникальности: повторное получение того же вопроса заменяет ожидающую запись
+        self._pending: dict[tuple, ApiDataEntity] = {}
+        self._by_id: dict[UUID, ApiDataEntity] = {}
+        # id сохраненных строк по ключу уникальности: повтор ключа не требует запроса к БД
+        self._stored_ids: OrderedDict[tuple, UUID] = OrderedDict()
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: asyncio.Task | None = None
+        self._closed = False
+        API_DATA_WRITE_BEHIND_PENDING.set_function(lambda: len(self._pending))
+
+    def start(self) -> None:
+        """Запуск периодического сброса"""
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._run())
+
+    async def create(self, entity: ApiDataEntity) -> ApiDataEntity:
+        """Постановка записи в буфер; ожидание сброса, только если буфер переполнен"""
+        await self.create_many([entity])
+        return entity
+
+    async def create_many(self, entities: list[ApiDataEntity]) -> list[ApiDataEntity]:
+        """Постановка нескольких записей в буфер"""
+        if self._closed:
+            raise RuntimeError("Буфер записи api_data остановлен")
+        known = await self._known_ids(entities)
+        for entity in entities:
+            key = conflict_key(entity)
+            current = self._pending.get(key)
+            if current is not None:
+                entity.id = current.id
+            elif key in known:
+                entity.id = known[key]
+            self._pending[key] = entity
+            self._by_id[entity.id] = entity
+        if len(self._pending) >= self.max_pending:
+            # БД не успевает за потоком записей - притормаживаем вызывающих
+            await self.flush(reason="backpressure")
+        elif len(self._pending) >= self.max_rows:
+            self._full.set()
+        return entities
+
+    def pending(self, data_id: UUID) -> ApiDataEntity | None:
+        """Запись, еще не сброшенная в БД"""
+        return self._by_id.get(data_id)
+
+    async def get_by_id(self, data_id: UUID) -> ApiDataEntity | None:
+        """Запись по ID с учетом еще не сброшенных"""
+        entity = self._by_id.get(data_id)
+        if entity is not None:
+            return entity
+        async with self.session_maker() as session:
+            return await ApiDataRepository(session).get_by_id(data_id)
+
+    async def get_latest_by_external_id(
+        self, external_id: str, source: str
+    ) -> ApiDataEntity | None:
+        """Запись источника по внешнему идентификатору с учетом еще не сброшенных"""
+        pending = self._pending.get((source, external_id))
+        if pending is not None:
+            return pending
+        async with self.session_maker() as session:
+            return await ApiDataRepository(session).get_latest_by_external_id(external_id, source)
+
+    async def flush(self, reason: str = "manual") -> int:
+        """Сброс накопленных записей пачками по max_rows; возвращает число сохраненных"""
+        flushed = 0
+        async with self._flush_lock:
+            while self._pending:
+                keys = list(self._pending)[: self.max_rows]
+                batch = [(key, self._pending[key], self._pending[key].id) for key in keys]
+                try:
+                    await self._insert([entity for _, entity, _ in batch], reason)
+                except Exception as e:
+                    if _is_unavailable(e):
+                        raise
+                    if len(batch) > 1:
+                        logger.warning(
+                            f"Пачка из {len(batch)} записей api_data отклонена, "
+                            f"запись по одной: {e}"
+                        )
+                        flushed += await self._insert_each(batch)
+                    else:
+                        self._drop(*batch[0], e)
+                    continue
+                for key, entity, data_id in batch:
+                    self._forget(key, entity, data_id, stored=True)
+                flushed += len(batch)
+        return flushed
+
+    async def aclose(self) -> None:
+        """Остановка с сохранением всех накопленных записей"""
+        self._closed = True
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+
+        for attempt in range(1, self.shutdown_attempts + 1):
+            try:
+                await self.flush(reason="shutdown")
+                return
+            except Exception as e:
+                logger.error(
+                    f"Не удалось сохранить {len(self._pending)} записей при остановке "
+                    f"(попытка {attempt}): {e}"
+                )
+                await asyncio.sleep(self.flush_interval * 2**attempt)
+
+        API_DATA_WRITE_BEHIND_LOST.inc(len(self._pending))
+        logger.critical(f"Потеряны несохраненные записи api_data: {len(self._pending)}")
+
+    async def _insert_each(self, batch: list[tuple[tuple, ApiDataEntity, UUID]]) -> int:
+        """Запись пачки по одной строке с отбрасыванием отклоненных; число сохраненных"""
+        saved = 0
+        for key, entity, data_id in batch:
+            try:
+                await self._insert([entity], "row")
+            except Exception as e:
+                if _is_unavailable(e):
+                    # Оставшиеся записи остаются в буфере до следующего сброса
+                    raise
+                self._drop(key, entity, data_id, e)
+            else:
+                self._forget(key, entity, data_id, stored=True)
+                saved += 1
+        return saved
+
+    def _drop(self, key: tuple, entity: ApiDataEntity, data_id: UUID, error: Exception) -> None:
+        """Отбрасывание записи, которую БД отклоняет"""
+        API_DATA_WRITE_BEHIND_DROPPED.inc()
+        logger.error(
+            f"Запись api_data {data_id} ({entity.source}, {entity.external_id}) отброшена: {error}"
+        )
+        self._forget(key, entity, data_id, stored=False)
+
+    def _forget(self, key: tuple, entity: ApiDataEntity, data_id: UUID, stored: bool) -> None:
+        """Удаление обработанной записи из буфера"""
+        # Пока шел INSERT, запись могли заменить более новой версией
+        if self._pending.get(key) is entity:
+            del self._pending[key]
+        if self._by_id.get(data_id) is entity:
+            del self._by_id[data_id]
+        if stored and entity.external_id is not None:
+            self._remember_id(key, entity.id)
+
+    def _remember_id(self, key: tuple, data_id: UUID) -> None:
+        self._stored_ids[key] = data_id
+        self._stored_ids.move_to_end(key)
+        while len(self._stored_ids) > self.max_pending:
+            self._stored_ids.popitem(last=False)
+
+    async def _known_ids(self, entities: list[ApiDataEntity]) -> dict[tuple, UUID]:
+        """id строк, которые обновит upsert записей с external_id.
+
+        Ключи ищутся сначала среди ожидающих сброса и уже сохраненных буфером записей,
+        в БД запрашиваются только остальные.
+        """
+        known = {}
+        missing = []
+        for entity in entities:
+            if entity.external_id is None:
+                continue
+            key = conflict_key(entity)
+            current = self._pending.get(key)
+            if current is not None:
+                # Запомнить до обращения к БД: за это время запись может уйти в сброс
+                known[key] = current.id
+            elif key in self._stored_ids:
+                known[key] = self._stored_ids[key]
+            else:
+                missing.append(key)
+        if missing:
+            async with self.session_maker() as session:
+                found = await ApiDataRepository(session).get_ids_by_keys(missing)
+            for key, data_id in found.items():
+                self._remember_id(key, data_id)
+            known.update(found)
+        return known
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+                reason = "size"
+            except TimeoutError:
+                reason = "interval"
+            self._full.clear()
+            if not self._pending:
+                continue
+            try:
+                await self.flush(reason=reason)
+            except Exception as e:
+                # Записи остаются в буфере и уйдут при следующем сбросе
+                logger.error(f"Ошибка групповой записи api_data: {e}")
+                await asyncio.sleep(self.flush_interval)
+
+    async def _insert(self, batch: list[ApiDataEntity], reason: str) -> None:
+        started = time.perf_counter()
+        try:
+            # Сброс выполняется от имени буфера, а не запроса, вызвавшего его
+            with no_deadline():
+                async with self.session_maker() as session:
+                    await ApiDataRepository(session, self.near_duplicates).create_many(batch)
+        except Exception:
+            API_DATA_WRITE_BEHIND_FLUSHES.labels(reason, "error").inc()
+            raise
+        API_DATA_WRITE_BEHIND_FLUSHES.labels(reason, "success").inc()
+        API_DATA_WRITE_BEHIND_FLUSH_ROWS.observe(len(batch))
+        API_DATA_WRITE_BEHIND_FLUSH_SECONDS.observe(time.perf_counter() - started)
+
+
+def _is_unavailable(error: Exception) -> bool:
+    """Ошибка соединения с БД, а не отдельной записи: такие записи остаются в буфере"""
+    if isinstance(error, OSError | TimeoutError | OperationalError | InterfaceError):
+        return True
+    return bool(getattr(error, "connection_invalidated", False))
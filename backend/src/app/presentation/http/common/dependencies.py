@@ -0,0 +1,44 @@
+"""
+Общие HTTP зависимости, получаемые из состояния приложения
+"""
+
+from fastapi import Request
+
+from src.app.application.common.ports import (
+    ApiClientProtocol,
+    FetchJobQueueProtocol,
+    NearDuplicateDetectorProtocol,
+)
+from src.app.infrastructure.persistence.idempotency import IdempotencyStore
+from src.app.infrastructure.persistence.read_replicas import ReplicaRouter
+from src.app.infrastructure.persistence.write_behind import WriteBehindBuffer
+
+
+def get_api_client(request: Request) -> ApiClientProtocol:
+    """Получение общего клиента внешнего API"""
+    return request.app.state.api_client
+
+
+def get_job_queue(request: Request) -> FetchJobQueueProtocol:
+    """Получение очереди фоновых заданий"""
+    return request.app.state.job_pool
+
+
+def get_write_buffer(request: Request) -> WriteBehindBuffer | None:
+    """Получение буфера отложенной записи api_data, если он включен"""
+    return getattr(request.app.state, "api_data_buffer", None)
+
+
+def get_idempotency_store(request: Request) -> IdempotencyStore | None:
+    """Получение хранилища ключей идемпотентности"""
+    return getattr(request.app.state, "idempotency_store", None)
+
+
+def get_near_duplicates(request: Request) -> NearDuplicateDetectorProtocol | None:
+    """Получение индекса почти дубликатов, если проверка включена"""
+    return getattr(request.app.state, "near_duplicates", None)
+
+
+def get_read_replicas(request: Request) -> ReplicaRouter | None:
+    """Получение маршрутизатора чтения по репликам, если они настроены"""
+    return getattr(request.app.state, "read_replicas", None)
@@ -2,6 +2,10 @@
 Общие HTTP утилиты для пагинации
 """
 
+import base64
+from datetime import datetime
+from uuid import UUID
+
 from pydantic import BaseModel, Field
 
 
@@ -10,6 +14,11 @@ class PaginationParams(BaseModel):
 
     limit: int = Field(default=10, ge=1, le=100, description="Количество элементов на странице")
     offset: int = Field(default=0, ge=0, description="Количество пропущенных элементов")
+    cursor: str | None = Field(
+        default=None,
+        max_length=200,
+        description="Курсор следующей страницы из next_cursor предыдущего ответа",
+    )
 
 
 class PaginatedResponse(BaseModel):
@@ -19,3 +28,19 @@ class PaginatedResponse(BaseModel):
     total: int
     limit: int
     offset: int
+
+
+def encode_cursor(fetched_at: datetime, data_id: UUID) -> str:
+    """Непрозрачный курсор из ключа сортировки последней записи страницы"""
+    raw = f"{fetched_at.isoformat()}|{data_id}".encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """Ключ сортировки из курсора; ValueError для некорректного курсора"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        fetched_at, _, data_id = raw.partition("|")
+        return datetime.fromisoformat(fetched_at), UUID(data_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Некорректный курсор") from e
@@ -0,0 +1,71 @@
+"""
+Контроллер административных операций
+"""
+
+import hmac
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+
+from src.app.infrastructure.persistence.bulk_import import (
+    ApiDataImporter,
+    ConflictPolicy,
+    ImportFormat,
+)
+from src.app.infrastructure.persistence.database import async_session_maker
+from src.app.presentation.http.common.dependencies import get_near_duplicates
+from src.app.presentation.http.schemas.admin import ImportRejectedRow, ImportSummaryResponse
+from src.app.setup.config.settings import get_settings
+
+router = APIRouter(prefix="/api/admin", tags=["Admin"])
+
+
+async def require_admin(x_admin_token: Annotated[str | None, Header()] = None) -> None:
+    """Проверка токена администратора; без ADMIN_TOKEN операции отключены"""
+    admin_token = get_settings().ADMIN_TOKEN
+    if not admin_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_admin_token is None or not hmac.compare_digest(
+        x_admin_token.encode(), admin_token.encode()
+    ):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Неверный токен")
+
+
+@router.post(
+    "/import",
+    response_model=ImportSummaryResponse,
+    dependencies=[Depends(require_admin)],
+)
+async def import_questions(
+    request: Request,
+    import_format: Annotated[ImportFormat | None, Query(alias="format")] = None,
+    on_conflict: ConflictPolicy = ConflictPolicy.SKIP,
+    source: Annotated[str | None, Query(max_length=255)] = None,
+):
+    """Массовая загрузка вопросов из тела запроса в формате NDJSON или CSV.
+
+    Тело читается потоком; формат по умолчанию определяется по Content-Type.
+    """
+    if import_format is None:
+        content_type = request.headers.get("content-type", "")
+        import_format = ImportFormat.CSV if "csv" in content_type else ImportFormat.NDJSON
+
+    settings = get_settings()
+    importer = ApiDataImporter(
+        async_session_maker,
+        batch_size=settings.BULK_IMPORT_BATCH_SIZE,
+        on_conflict=on_conflict,
+        max_errors=settings.BULK_IMPORT_MAX_ERRORS,
+        default_source=source,
+        # Загруженные вопросы сразу участвуют в поиске почти дубликатов этой реплики
+        near_duplicates=get_near_duplicates(request),
+    )
+    report = await importer.run(request.stream(), import_format)
+    return ImportSummaryResponse(
+        received=report.received,
+        imported=report.imported,
+        skipped=report.skipped,
+        rejected=report.rejected,
+        errors=[ImportRejectedRow.model_validate(row) for row in report.errors],
+        seconds=round(report.elapsed, 3),
+    )
@@ -2,40 +2,198 @@
 Контроллер для работы с данными из внешних API
 """
 
+import hashlib
+import json
+import math
+from collections.abc import AsyncIterator
+from typing import Annotated, Literal
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.app.application.commands.fetch_api_data import FetchApiDataCommand
-from src.app.application.queries.get_api_data import GetApiDataQuery
-from src.app.infrastructure.persistence.database import get_db_session
+from src.app.application.commands.fetch_api_data_batch import (
+    BatchItemResult,
+    FetchApiDataBatchCommand,
+)
+from src.app.application.common.exceptions import (
+    DeadlineExceededError,
+    IdempotencyKeyInProgressError,
+    IdempotencyKeyMismatchError,
+    JobQueueFullError,
+    NearDuplicateError,
+    UpstreamQuotaExceededError,
+    UpstreamUnavailableError,
+)
+from src.app.application.common.ports import (
+    ApiClientProtocol,
+    FetchJobQueueProtocol,
+    NearDuplicateDetectorProtocol,
+)
+from src.app.application.queries.get_api_data import CountStrategy, GetApiDataQuery
+from src.app.infrastructure.persistence.database import async_session_maker, get_db_session
+from src.app.infrastructure.persistence.idempotency import IdempotencyStore
 from src.app.infrastructure.persistence.repositories.api_data_repository import ApiDataRepository
-from src.app.presentation.http.common.pagination import PaginationParams
+from src.app.infrastructure.persistence.repositories.idempotency_key_repository import (
+    StoredResponse,
+)
+from src.app.infrastructure.persistence.write_behind import WriteBehindBuffer
+from src.app.presentation.http.common.dependencies import (
+    get_api_client,
+    get_idempotency_store,
+    get_job_queue,
+    get_near_duplicates,
+    get_read_replicas,
+    get_write_buffer,
+)
+from src.app.presentation.http.common.pagination import (
+    PaginationParams,
+    decode_cursor,
+    encode_cursor,
+)
 from src.app.presentation.http.schemas.api_data import (
     ApiDataListResponse,
     ApiDataResponse,
+    FetchApiDataBatchItem,
+    FetchApiDataBatchRequest,
+    FetchApiDataBatchResponse,
     FetchApiDataRequest,
 )
+from src.app.presentation.http.schemas.fetch_job import FetchJobResponse
+from src.app.setup.config.settings import get_settings
 
 router = APIRouter(prefix="/api/data", tags=["API Data"])
 
 
-async def get_repository(session: AsyncSession = Depends(get_db_session)) -> ApiDataRepository:
-    """Получение репозитория"""
-    return ApiDataRepository(session)
+async def get_repository(
+    session: AsyncSession = Depends(get_db_session),
+    near_duplicates: NearDuplicateDetectorProtocol | None = Depends(get_near_duplicates),
+) -> ApiDataRepository:
+    """Получение репозитория; записанные вопросы попадают в индекс почти дубликатов"""
+    return ApiDataRepository(session, near_duplicates=near_duplicates)
+
+
+async def get_read_repository(request: Request) -> AsyncIterator[ApiDataRepository]:
+    """Получение репозитория для чтения: на реплике, если они настроены"""
+    read_replicas = get_read_replicas(request)
+    session_maker = read_replicas.session_maker() if read_replicas else async_session_maker
+    async with session_maker() as session:
+        yield ApiDataRepository(session)
 
 
-@router.post("/fetch", response_model=ApiDataResponse, status_code=status.HTTP_201_CREATED)
+async def get_writer(
+    request: Request, repository: ApiDataRepository = Depends(get_repository)
+) -> ApiDataRepository | WriteBehindBuffer:
+    """Получение хранилища для новых записей: буфер отложенной записи или репозиторий"""
+    return get_write_buffer(request) or repository
+
+
+def _upstream_unavailable(error: UpstreamUnavailableError) -> HTTPException:
+    """Преобразование отказа внешнего API в HTTP ответ с Retry-After"""
+    headers = None
+    if error.retry_after is not None:
+        headers = {"Retry-After": str(math.ceil(error.retry_after))}
+
+    if isinstance(error, UpstreamQuotaExceededError):
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Превышена квота запросов: {str(error)}",
+            headers=headers,
+        )
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=f"Внешний API недоступен: {str(error)}",
+        headers=headers,
+    )
+
+
+@router.post(
+    "/fetch",
+    response_model=ApiDataResponse,
+    status_code=status.HTTP_201_CREATED,
+    responses={status.HTTP_202_ACCEPTED: {"model": FetchJobResponse}},
+)
 async def fetch_api_data(
     request: FetchApiDataRequest,
-    repository: ApiDataRepository = Depends(get_repository),
+    repository: ApiDataRepository | WriteBehindBuffer = Depends(get_writer),
+    api_client: ApiClientProtocol = Depends(get_api_client),
+    run_async: Annotated[bool, Query(alias="async")] = False,
+    job_queue: FetchJobQueueProtocol = Depends(get_job_queue),
+    idempotency_key: Annotated[
+        str | None, Header(alias="Idempotency-Key", min_length=1, max_length=255)
+    ] = None,
+    idempotency_store: IdempotencyStore | None = Depends(get_idempotency_store),
+    near_duplicates: NearDuplicateDetectorProtocol | None = Depends(get_near_duplicates),
 ):
-    """Получение данных из внешнего API и сохранение в БД"""
-    command = FetchApiDataCommand(repository)
+    """Получение данных из внешнего API и сохранение в БД (или постановка задания в очередь)"""
+    if idempotency_key is None or idempotency_store is None:
+        return await _fetch(request, repository, api_client, run_async, job_queue, near_duplicates)
+
+    async def handler() -> StoredResponse:
+        response = await _fetch(
+            request, repository, api_client, run_async, job_queue, near_duplicates
+        )
+        if isinstance(response, JSONResponse):
+            return StoredResponse(
+                status_code=response.status_code,
+                body=json.loads(response.body),
+                headers={"Location": response.headers["Location"]},
+            )
+        return StoredResponse(status.HTTP_201_CREATED, response.model_dump(mode="json"))
+
+    # Отпечаток запроса: повтор с тем же ключом, но другим телом - ошибка клиента
+    request_hash = hashlib.sha256(
+        f"POST /api/data/fetch?async={run_async}\n{request.model_dump_json()}".encode()
+    ).hexdigest()
+    try:
+        stored, replayed = await idempotency_store.execute(idempotency_key, request_hash, handler)
+    except IdempotencyKeyMismatchError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    except IdempotencyKeyInProgressError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after or 1))},
+        )
+
+    headers = dict(stored.headers)
+    if replayed:
+        headers["Idempotent-Replayed"] = "true"
+    return JSONResponse(status_code=stored.status_code, content=stored.body, headers=headers)
+
+
+async def _fetch(
+    request: FetchApiDataRequest,
+    repository: ApiDataRepository | WriteBehindBuffer,
+    api_client: ApiClientProtocol,
+    run_async: bool,
+    job_queue: FetchJobQueueProtocol,
+    near_duplicates: NearDuplicateDetectorProtocol | None = None,
+) -> ApiDataResponse | JSONResponse:
+    if run_async:
+        return await _submit_fetch_job(request, job_queue)
+
+    command = FetchApiDataCommand(
+        repository,
+        api_client,
+        freshness=get_settings().api_data_freshness,
+        near_duplicates=near_duplicates,
+    )
     try:
         entity = await command.execute(request.number)
         return ApiDataResponse.model_validate(entity)
+    except UpstreamUnavailableError as e:
+        raise _upstream_unavailable(e)
+    except NearDuplicateError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e),
+            headers={"Location": f"/api/data/{e.original_id}"},
+        )
+    except DeadlineExceededError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -43,14 +201,133 @@ async def fetch_api_data(
         )
 
 
+async def _submit_fetch_job(
+    request: FetchApiDataRequest, job_queue: FetchJobQueueProtocol
+) -> JSONResponse:
+    """Постановка задания в очередь с ответом 202 и ссылкой на его состояние"""
+    try:
+        job = await job_queue.submit(request.number)
+    except JobQueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after or 1))},
+        )
+
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=FetchJobResponse.model_validate(job).model_dump(mode="json"),
+        headers={"Location": f"/api/jobs/{job.id}"},
+    )
+
+
+@router.post(
+    "/fetch/batch",
+    response_model=FetchApiDataBatchResponse,
+    status_code=status.HTTP_201_CREATED,
+    responses={status.HTTP_207_MULTI_STATUS: {"model": FetchApiDataBatchResponse}},
+)
+async def fetch_api_data_batch(
+    request: FetchApiDataBatchRequest,
+    response: Response,
+    repository: ApiDataRepository | WriteBehindBuffer = Depends(get_writer),
+    api_client: ApiClientProtocol = Depends(get_api_client),
+    near_duplicates: NearDuplicateDetectorProtocol | None = Depends(get_near_duplicates),
+):
+    """Пакетное получение данных из внешнего API и сохранение одним запросом к БД"""
+    command = FetchApiDataBatchCommand(
+        repository,
+        api_client,
+        concurrency=get_settings().FETCH_BATCH_CONCURRENCY,
+        near_duplicates=near_duplicates,
+    )
+    results = await command.execute(request.numbers, request.random_count)
+
+    items = [_batch_item(result) for result in results]
+    failed = sum(1 for item in items if item.status == "error")
+    if failed:
+        response.status_code = status.HTTP_207_MULTI_STATUS
+    return FetchApiDataBatchResponse(items=items, succeeded=len(items) - failed, failed=failed)
+
+
+@router.post(
+    "/fetch/stream",
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            "content": {"application/x-ndjson": {}, "text/event-stream": {}},
+            "description": "Элементы FetchApiDataBatchItem по мере получения",
+        }
+    },
+)
+async def fetch_api_data_stream(
+    request: FetchApiDataBatchRequest,
+    repository: ApiDataRepository | WriteBehindBuffer = Depends(get_writer),
+    api_client: ApiClientProtocol = Depends(get_api_client),
+    stream_format: Annotated[Literal["ndjson", "sse"] | None, Query(alias="format")] = None,
+    accept: Annotated[str, Header()] = "",
+    near_duplicates: NearDuplicateDetectorProtocol | None = Depends(get_near_duplicates),
+):
+    """Потоковая выдача полученных и сохраненных вопросов в формате NDJSON или SSE"""
+    if stream_format is None:
+        stream_format = "sse" if "text/event-stream" in accept else "ndjson"
+
+    command = FetchApiDataBatchCommand(
+        repository,
+        api_client,
+        concurrency=get_settings().FETCH_BATCH_CONCURRENCY,
+        near_duplicates=near_duplicates,
+    )
+    results = command.stream(request.numbers, request.random_count)
+    if stream_format == "sse":
+        body, media_type = _sse_events(results), "text/event-stream"
+    else:
+        body, media_type = _ndjson_lines(results), "application/x-ndjson"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        # Отключение буферизации в nginx, иначе элементы дойдут до клиента одним куском
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _batch_item(result: BatchItemResult) -> FetchApiDataBatchItem:
+    """Преобразование результата элемента пакета в схему ответа"""
+    return FetchApiDataBatchItem(
+        number=result.number,
+        status="ok" if result.ok else "error",
+        data=ApiDataResponse.model_validate(result.entity) if result.ok else None,
+        error=result.error,
+    )
+
+
+async def _ndjson_lines(results: AsyncIterator[BatchItemResult]) -> AsyncIterator[str]:
+    async for result in results:
+        yield _batch_item(result).model_dump_json() + "\n"
+
+
+async def _sse_events(results: AsyncIterator[BatchItemResult]) -> AsyncIterator[str]:
+    succeeded = failed = 0
+    async for result in results:
+        succeeded += result.ok
+        failed += not result.ok
+        yield f"event: item\ndata: {_batch_item(result).model_dump_json()}\n\n"
+    # Явное завершение, чтобы EventSource-клиент не переподключался
+    yield f'event: end\ndata: {{"succeeded": {succeeded}, "failed": {failed}}}\n\n'
+
+
 @router.get("/{data_id}", response_model=ApiDataResponse)
 async def get_api_data_by_id(
     data_id: UUID,
-    repository: ApiDataRepository = Depends(get_repository),
+    repository: ApiDataRepository = Depends(get_read_repository),
+    write_buffer: WriteBehindBuffer | None = Depends(get_write_buffer),
 ):
     """Получение данных по ID"""
-    query = GetApiDataQuery(repository)
-    entity = await query.get_by_id(data_id)
+    # Запись могла быть только что получена и еще не сброшена в БД
+    entity = write_buffer.pending(data_id) if write_buffer else None
+    if entity is None:
+        entity = await GetApiDataQuery(repository).get_by_id(data_id)
     if not entity:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Данные не найдены")
     return ApiDataResponse.model_validate(entity)
@@ -59,14 +336,44 @@ async def get_api_data_by_id(
 @router.get("", response_model=ApiDataListResponse)
 async def get_all_api_data(
     pagination: PaginationParams = Depends(),
-    repository: ApiDataRepository = Depends(get_repository),
+    repository: ApiDataRepository = Depends(get_read_repository),
+    count: Annotated[CountStrategy | None, Query()] = None,
+    include_total: bool = True,
 ):
-    """Получение всех данных с пагинацией"""
+    """Получение всех данных с пагинацией по смещению или курсору.
+
+    count выбирает способ подсчета total (по умолчанию API_DATA_COUNT_STRATEGY),
+    include_total=false отключает подсчет.
+    """
+    after = None
+    if pagination.cursor is not None:
+        if pagination.offset:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="cursor и offset нельзя использовать вместе",
+            )
+        try:
+            after = decode_cursor(pagination.cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+    if not include_total:
+        count = CountStrategy.NONE
+    elif count is None:
+        count = CountStrategy(get_settings().API_DATA_COUNT_STRATEGY)
+
     query = GetApiDataQuery(repository)
-    items, total = await query.get_all(limit=pagination.limit, offset=pagination.offset)
+    page = await query.get_all(
+        limit=pagination.limit, offset=pagination.offset, after=after, count=count
+    )
+    # Неполная страница - последняя
+    next_cursor = None
+    if len(page.items) == pagination.limit:
+        next_cursor = encode_cursor(page.items[-1].fetched_at, page.items[-1].id)
     return ApiDataListResponse(
-        items=[ApiDataResponse.model_validate(item) for item in items],
-        total=total,
+        items=[ApiDataResponse.model_validate(item) for item in page.items],
+        total=page.total,
+        total_kind=page.total_kind,
         limit=pagination.limit,
         offset=pagination.offset,
+        next_cursor=next_cursor,
     )
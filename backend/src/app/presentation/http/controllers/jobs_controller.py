@@ -0,0 +1,36 @@
+"""
+Контроллер для фоновых заданий получения данных
+"""
+
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.application.queries.get_fetch_job import GetFetchJobQuery
+from src.app.infrastructure.persistence.database import get_db_session
+from src.app.infrastructure.persistence.repositories.fetch_job_repository import (
+    FetchJobRepository,
+)
+from src.app.presentation.http.schemas.fetch_job import FetchJobResponse
+
+router = APIRouter(prefix="/api/jobs", tags=["Jobs"])
+
+
+async def get_job_repository(
+    session: AsyncSession = Depends(get_db_session),
+) -> FetchJobRepository:
+    """Получение репозитория заданий"""
+    return FetchJobRepository(session)
+
+
+@router.get("/{job_id}", response_model=FetchJobResponse)
+async def get_job(
+    job_id: UUID,
+    repository: FetchJobRepository = Depends(get_job_repository),
+):
+    """Получение состояния задания и ID полученной записи"""
+    job = await GetFetchJobQuery(repository).get_by_id(job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Задание не найдено")
+    return FetchJobResponse.model_validate(job)
@@ -7,6 +7,8 @@ from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
+from src.app.application.common.exceptions import DeadlineExceededError
+
 
 def setup_exception_handlers(app: FastAPI) -> None:
     """Настройка обработчиков исключений для FastAPI приложения"""
@@ -17,6 +19,15 @@ def setup_exception_handlers(app: FastAPI) -> None:
         return JSONResponse(
             status_code=exc.status_code,
             content={"detail": exc.detail},
+            headers=exc.headers,
+        )
+
+    @app.exception_handler(DeadlineExceededError)
+    async def deadline_exceeded_handler(request: Request, exc: DeadlineExceededError):
+        """Обработчик истечения срока обработки запроса"""
+        return JSONResponse(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            content={"detail": str(exc)},
         )
 
     @app.exception_handler(RequestValidationError)
@@ -0,0 +1,150 @@
+"""
+Срок обработки HTTP запроса с отменой работы по его истечении или отключении клиента
+"""
+
+import asyncio
+import json
+import logging
+import math
+
+from prometheus_client import Counter
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.app.application.common.deadline import deadline_scope
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_HEADER = b"x-request-timeout"
+
+REQUESTS_ABORTED = Counter(
+    "http_requests_aborted_total",
+    "HTTP запросы, обработка которых прервана по сроку или отключению клиента",
+    ["reason"],
+)
+
+
+class DeadlineMiddleware:
+    """Установка срока запроса из заголовка X-Request-Timeout или настроек маршрута.
+
+    Срок доступен слоям приложения через контекст (deadline_scope) и ограничивает
+    таймауты внешнего API и БД. Если срок истек или клиент отключился, обработка
+    отменяется; при истечении срока до начала ответа клиент получает 504.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        default_timeout: float,
+        max_timeout: float | None = None,
+        route_timeouts: dict[tuple[str, str], float] | None = None,
+    ):
+        self.app = app
+        self.default_timeout = default_timeout
+        self.max_timeout = max_timeout
+        # Более длинные префиксы проверяются первыми
+        self.route_timeouts = sorted(
+            (route_timeouts or {}).items(), key=lambda item: len(item[0][1]), reverse=True
+        )
+
+    def timeout_for(self, scope: Scope) -> float | None:
+        """Срок в секундах; None - без ограничения"""
+        timeout = self.default_timeout
+        for (method, prefix), route_timeout in self.route_timeouts:
+            if scope["method"] == method and scope["path"].startswith(prefix):
+                timeout = route_timeout
+                break
+
+        for name, value in scope.get("headers", []):
+            if name == TIMEOUT_HEADER:
+                try:
+                    requested = float(value.decode())
+                except ValueError:
+                    break
+                if math.isfinite(requested) and requested > 0:
+                    timeout = requested
+                break
+
+        if timeout <= 0:
+            return None
+        if self.max_timeout:
+            timeout = min(timeout, self.max_timeout)
+        return timeout
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # receive читает только watcher: тело передается обработчику через очередь на одно
+        # сообщение (потоковая загрузка не копится в памяти), после тела ждем отключения
+        messages: asyncio.Queue[Message] = asyncio.Queue(maxsize=1)
+        disconnected = asyncio.Event()
+        body_received = False
+        response_started = False
+
+        async def queued_receive() -> Message:
+            nonlocal body_received
+            if body_received:
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            message = await messages.get()
+            if message["type"] == "http.request" and not message.get("more_body", False):
+                body_received = True
+            return message
+
+        async def tracking_send(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        async def watch_disconnect() -> None:
+            more_body = True
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    return
+                if more_body:
+                    more_body = message.get("more_body", False)
+                    await messages.put(message)
+
+        timeout = self.timeout_for(scope)
+        with deadline_scope(timeout):
+            handler = asyncio.create_task(self.app(scope, queued_receive, tracking_send))
+        watcher = asyncio.create_task(watch_disconnect())
+        try:
+            await asyncio.wait(
+                {handler, watcher}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            watcher.cancel()
+            if not handler.done():
+                handler.cancel()
+            results = await asyncio.gather(handler, watcher, return_exceptions=True)
+
+        if not handler.cancelled():
+            if isinstance(results[0], BaseException):
+                raise results[0]
+            return
+
+        reason = "disconnect" if disconnected.is_set() else "deadline"
+        REQUESTS_ABORTED.labels(reason).inc()
+        logger.warning(f"Обработка {scope['method']} {scope['path']} прервана: {reason}")
+        if reason == "deadline" and not response_started:
+            await _send_gateway_timeout(send)
+
+
+async def _send_gateway_timeout(send: Send) -> None:
+    body = json.dumps({"detail": "Истек срок обработки запроса"}, ensure_ascii=False).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 504,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
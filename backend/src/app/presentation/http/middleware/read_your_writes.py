@@ -0,0 +1,62 @@
+"""
+Чтение своих записей: закрепление чтения за основной БД после запроса с записью
+"""
+
+import math
+import time
+from http.cookies import SimpleCookie
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.app.infrastructure.persistence.read_replicas import primary_pinned
+
+PRIMARY_COOKIE = "db_primary_until"
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class ReadYourWritesMiddleware:
+    """Закрепление чтения за основной БД на window секунд после успешной записи.
+
+    Запрос с изменяющим методом читает из основной БД и при успешном ответе
+    получает cookie со временем окончания окна; пока окно не истекло, чтение
+    клиента тоже идет в основную БД, и реплика с отставанием не вернет старые данные.
+    """
+
+    def __init__(self, app: ASGIApp, window: float):
+        self.app = app
+        self.window = window
+
+    def pinned_until(self, scope: Scope) -> float:
+        """Время окончания окна из cookie запроса; 0 - окна нет"""
+        for name, value in scope.get("headers", []):
+            if name != b"cookie":
+                continue
+            morsel = SimpleCookie(value.decode("latin-1")).get(PRIMARY_COOKIE)
+            if morsel is None:
+                continue
+            try:
+                return float(morsel.value)
+            except ValueError:
+                return 0
+        return 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.window <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        writes = scope["method"] not in SAFE_METHODS
+
+        async def send_with_cookie(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + self.window
+                MutableHeaders(scope=message).append(
+                    "set-cookie",
+                    f"{PRIMARY_COOKIE}={until:.3f}; Max-Age={math.ceil(self.window)}; "
+                    "Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        with primary_pinned(writes or self.pinned_until(scope) > time.time()):
+            await self.app(scope, receive, send_with_cookie if writes else send)
@@ -0,0 +1,25 @@
+"""
+Pydantic схемы для HTTP представления административных операций
+"""
+
+from pydantic import BaseModel, ConfigDict
+
+
+class ImportRejectedRow(BaseModel):
+    """Схема отклоненной строки загрузки"""
+
+    model_config = ConfigDict(from_attributes=True)
+
+    line: int
+    error: str
+
+
+class ImportSummaryResponse(BaseModel):
+    """Схема итога массовой загрузки вопросов"""
+
+    received: int
+    imported: int
+    skipped: int
+    rejected: int
+    errors: list[ImportRejectedRow]
+    seconds: float
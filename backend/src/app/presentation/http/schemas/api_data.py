@@ -3,9 +3,12 @@ Pydantic схемы для HTTP представления данных API
 """
 
 from datetime import datetime
+from typing import Literal
 from uuid import UUID
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+
+FETCH_BATCH_MAX_ITEMS = 100
 
 
 class ApiDataResponse(BaseModel):
@@ -19,6 +22,7 @@ class ApiDataResponse(BaseModel):
     content: str
     external_id: str | None
     fetched_at: datetime
+    duplicate_of: UUID | None = None
     created_at: datetime
     updated_at: datetime | None
 
@@ -27,12 +31,46 @@ class ApiDataListResponse(BaseModel):
     """Схема ответа со списком данных API"""
 
     items: list[ApiDataResponse]
-    total: int
+    # None при include_total=false
+    total: int | None
+    total_kind: Literal["exact", "cached", "estimate", "none"] = "exact"
     limit: int
     offset: int
+    next_cursor: str | None = None
 
 
 class FetchApiDataRequest(BaseModel):
     """Схема запроса на получение данных из внешнего API"""
 
     number: int | None = None
+
+
+class FetchApiDataBatchRequest(BaseModel):
+    """Схема запроса на пакетное получение данных из внешнего API"""
+
+    numbers: list[int] = Field(default_factory=list, max_length=FETCH_BATCH_MAX_ITEMS)
+    random_count: int = Field(default=0, ge=0, le=FETCH_BATCH_MAX_ITEMS)
+
+    @model_validator(mode="after")
+    def check_size(self) -> "FetchApiDataBatchRequest":
+        total = len(self.numbers) + self.random_count
+        if not 1 <= total <= FETCH_BATCH_MAX_ITEMS:
+            raise ValueError(f"Пакет должен содержать от 1 до {FETCH_BATCH_MAX_ITEMS} элементов")
+        return self
+
+
+class FetchApiDataBatchItem(BaseModel):
+    """Результат получения одного элемента пакета"""
+
+    number: int | None
+    status: str
+    data: ApiDataResponse | None = None
+    error: str | None = None
+
+
+class FetchApiDataBatchResponse(BaseModel):
+    """Схема ответа на пакетное получение данных"""
+
+    items: list[FetchApiDataBatchItem]
+    succeeded: int
+    failed: int
@@ -0,0 +1,26 @@
+"""
+Pydantic схемы для HTTP представления фоновых заданий
+"""
+
+from datetime import datetime
+from uuid import UUID
+
+from pydantic import BaseModel, ConfigDict
+
+from src.app.domain.entities.fetch_job import FetchJobStatus
+
+
+class FetchJobResponse(BaseModel):
+    """Схема ответа с состоянием фонового задания"""
+
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    status: FetchJobStatus
+    number: int | None
+    result_id: UUID | None
+    error: str | None
+    attempts: int
+    created_at: datetime
+    started_at: datetime | None
+    finished_at: datetime | None
@@ -2,16 +2,31 @@
 Фабрика приложения для создания и настройки FastAPI приложения
 """
 
-from contextlib import asynccontextmanager
+from contextlib import AsyncExitStack, asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from prometheus_fastapi_instrumentator import Instrumentator
 
-from src.app.infrastructure.persistence.database import engine
+from src.app.infrastructure.adapters.http_client import create_http_client, warm_up_http_client
+from src.app.infrastructure.persistence.database import check_schema_revision, engine
+from src.app.presentation.http.controllers.admin_controller import router as admin_router
 from src.app.presentation.http.controllers.api_data_controller import router as api_data_router
+from src.app.presentation.http.controllers.jobs_controller import router as jobs_router
 from src.app.presentation.http.errors.handlers import setup_exception_handlers
+from src.app.presentation.http.middleware.deadline import DeadlineMiddleware
+from src.app.presentation.http.middleware.read_your_writes import ReadYourWritesMiddleware
 from src.app.setup.config.settings import get_settings
+from src.app.setup.ioc.providers import (
+    build_api_client,
+    build_harvester,
+    build_idempotency_store,
+    build_job_pool,
+    build_near_duplicate_detector,
+    build_replica_router,
+    build_scheduler,
+    build_write_buffer,
+)
 
 settings = get_settings()
 
@@ -30,11 +45,31 @@ if ENVIRONMENT not in SHOW_DOCS_ENVIRONMENT:
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Жизненный цикл приложения"""
-    async with engine.begin() as conn:
-        from src.app.infrastructure.persistence.database import Base
+    # Схему создают миграции (alembic upgrade head); при старте только сверяется версия
+    await check_schema_revision(settings.DB_SCHEMA_CHECK)
+
+    async with AsyncExitStack() as stack:
+        http_client = await stack.enter_async_context(create_http_client(settings))
+        if settings.UPSTREAM_MODE != "replay":
+            await warm_up_http_client(
+                http_client, settings.API_NINJAS_BASE_URL, settings.UPSTREAM_WARMUP_CONNECTIONS
+            )
+        app.state.read_replicas = build_replica_router(settings, stack)
+        app.state.near_duplicates = build_near_duplicate_detector(settings, stack)
+        # Создается раньше клиента и пула заданий, чтобы при остановке сброситься после них
+        app.state.api_data_buffer = build_write_buffer(settings, stack, app.state.near_duplicates)
+        app.state.idempotency_store = build_idempotency_store(settings, stack)
+        # Один планировщик квоты на пользовательские запросы и наполнение банка вопросов
+        scheduler = build_scheduler(settings, stack)
+        app.state.api_client = build_api_client(settings, http_client, stack, scheduler)
+        app.state.job_pool = build_job_pool(
+            settings, app.state.api_client, stack, app.state.near_duplicates
+        )
+        app.state.harvester = build_harvester(
+            settings, http_client, scheduler, stack, app.state.near_duplicates
+        )
+        yield
 
-        await conn.run_sync(Base.metadata.create_all)
-    yield
     await engine.dispose()
 
 
@@ -49,6 +84,18 @@ else:
         raise ValueError("CORS_ORIGINS must be set in production")
     allow_credentials = True
 
+# Добавляется первым, чтобы оказаться внутри CORS и метрик: ответ 504 проходит через них
+app.add_middleware(
+    DeadlineMiddleware,
+    default_timeout=settings.REQUEST_TIMEOUT,
+    max_timeout=settings.REQUEST_TIMEOUT_MAX,
+    route_timeouts=settings.request_route_timeouts,
+)
+
+# Снаружи срока запроса: задача обработчика наследует закрепление за основной БД
+if settings.replica_database_urls:
+    app.add_middleware(ReadYourWritesMiddleware, window=settings.DB_READ_YOUR_WRITES_WINDOW)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=cors_origins,
@@ -63,6 +110,8 @@ Instrumentator().instrument(app).expose(app)
 setup_exception_handlers(app)
 
 app.include_router(api_data_router)
+app.include_router(jobs_router)
+app.include_router(admin_router)
 
 
 @app.get("/health")
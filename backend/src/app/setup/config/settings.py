@@ -3,6 +3,7 @@
 """
 
 import os
+from datetime import timedelta
 from functools import lru_cache
 
 from dotenv import load_dotenv
@@ -33,12 +34,189 @@ class Settings:
             f"{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
         )
 
+    @property
+    def replica_database_urls(self) -> dict[str, str]:
+        """Строки подключения к репликам для чтения из DB_REPLICA_HOSTS вида 'host1:5432,host2'"""
+        urls = {}
+        for item in self.DB_REPLICA_HOSTS.split(","):
+            host, _, port = item.strip().partition(":")
+            if host:
+                urls[item.strip()] = (
+                    f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@"
+                    f"{host}:{port or self.DB_PORT}/{self.DB_NAME}"
+                )
+        return urls
+
+    @property
+    def request_route_timeouts(self) -> dict[tuple[str, str], float]:
+        """Сроки обработки по маршрутам из строки вида 'POST /api/data/fetch=8,GET /api=2'"""
+        timeouts = {}
+        for item in self.REQUEST_TIMEOUT_ROUTES.split(","):
+            route, _, timeout = item.strip().rpartition("=")
+            method, _, prefix = route.strip().partition(" ")
+            if method and prefix and timeout:
+                timeouts[(method.upper(), prefix.strip())] = float(timeout)
+        return timeouts
+
+    @property
+    def api_data_freshness(self) -> timedelta | None:
+        """Срок, в течение которого сохраненный вопрос отдается без запроса к API"""
+        if self.API_DATA_FRESHNESS <= 0:
+            return None
+        return timedelta(seconds=self.API_DATA_FRESHNESS)
+
+    @property
+    def harvester_ranges(self) -> list[tuple[int, int]]:
+        """Диапазоны чисел для наполнения банка вопросов из строки вида '1-1000,5000-5100'"""
+        ranges = []
+        for item in self.HARVESTER_RANGES.split(","):
+            start, _, end = item.strip().partition("-")
+            if start:
+                ranges.append((int(start), int(end or start)))
+        return ranges
+
+    @property
+    def trivia_providers(self) -> list[tuple[str, float]]:
+        """Провайдеры вопросов и их веса из строки вида 'apininjas:1,local:0.2'"""
+        providers = []
+        for item in self.TRIVIA_PROVIDERS.split(","):
+            name, _, weight = item.strip().partition(":")
+            if name:
+                providers.append((name.lower(), float(weight or 1)))
+        return providers
+
     DB_ECHO: bool = os.getenv("DB_ECHO", "false").lower() == "true"
+    DB_SCHEMA_CHECK: str = os.getenv("DB_SCHEMA_CHECK", "strict").lower()
+
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+    DB_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+    DB_REPLICA_HOSTS: str = os.getenv("DB_REPLICA_HOSTS", "")
+    DB_REPLICA_SELECTION: str = os.getenv("DB_REPLICA_SELECTION", "round_robin").lower()
+    DB_REPLICA_MAX_LAG: float = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))
+    DB_REPLICA_CHECK_INTERVAL: float = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "2"))
+    DB_READ_YOUR_WRITES_WINDOW: float = float(os.getenv("DB_READ_YOUR_WRITES_WINDOW", "5"))
 
     CORS_ORIGINS: str = os.getenv("CORS_ORIGINS", "*")
 
+    REQUEST_TIMEOUT: float = float(os.getenv("REQUEST_TIMEOUT", "10"))
+    REQUEST_TIMEOUT_MAX: float = float(os.getenv("REQUEST_TIMEOUT_MAX", "30"))
+    REQUEST_TIMEOUT_ROUTES: str = os.getenv(
+        "REQUEST_TIMEOUT_ROUTES",
+        "POST /api/data/fetch=8,POST /api/data/fetch/batch=30,POST /api/data/fetch/stream=0,"
+        "POST /api/admin/import=0",
+    )
+
+    API_DATA_COUNT_STRATEGY: str = os.getenv("API_DATA_COUNT_STRATEGY", "exact").lower()
+    API_DATA_FRESHNESS: float = float(os.getenv("API_DATA_FRESHNESS", "604800"))
+    API_DATA_WRITE_BEHIND: bool = os.getenv("API_DATA_WRITE_BEHIND", "false").lower() == "true"
+    API_DATA_WRITE_BEHIND_MAX_ROWS: int = int(os.getenv("API_DATA_WRITE_BEHIND_MAX_ROWS", "500"))
+    API_DATA_WRITE_BEHIND_INTERVAL_MS: int = int(
+        os.getenv("API_DATA_WRITE_BEHIND_INTERVAL_MS", "50")
+    )
+    API_DATA_WRITE_BEHIND_MAX_PENDING: int = int(
+        os.getenv("API_DATA_WRITE_BEHIND_MAX_PENDING", "10000")
+    )
+
+    NEAR_DUPLICATES: str = os.getenv("NEAR_DUPLICATES", "off").lower()
+    NEAR_DUPLICATES_THRESHOLD: float = float(os.getenv("NEAR_DUPLICATES_THRESHOLD", "0.8"))
+    NEAR_DUPLICATES_NUM_PERM: int = int(os.getenv("NEAR_DUPLICATES_NUM_PERM", "64"))
+    NEAR_DUPLICATES_BANDS: int = int(os.getenv("NEAR_DUPLICATES_BANDS", "16"))
+    NEAR_DUPLICATES_SHINGLE_SIZE: int = int(os.getenv("NEAR_DUPLICATES_SHINGLE_SIZE", "5"))
+
+    IDEMPOTENCY_TTL: float = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+    # Несколько предельных сроков запроса (REQUEST_TIMEOUT_MAX)
+    IDEMPOTENCY_LEASE: float = float(os.getenv("IDEMPOTENCY_LEASE", "120"))
+    IDEMPOTENCY_WAIT_TIMEOUT: float = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "10"))
+    IDEMPOTENCY_CACHE_SIZE: int = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+    IDEMPOTENCY_PURGE_INTERVAL: float = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", "3600"))
+
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+    BULK_IMPORT_BATCH_SIZE: int = int(os.getenv("BULK_IMPORT_BATCH_SIZE", "5000"))
+    BULK_IMPORT_MAX_ERRORS: int = int(os.getenv("BULK_IMPORT_MAX_ERRORS", "100"))
+
+    FETCH_BATCH_CONCURRENCY: int = int(os.getenv("FETCH_BATCH_CONCURRENCY", "8"))
+
+    FETCH_JOB_CONCURRENCY: int = int(os.getenv("FETCH_JOB_CONCURRENCY", "4"))
+    FETCH_JOB_QUEUE_SIZE: int = int(os.getenv("FETCH_JOB_QUEUE_SIZE", "1000"))
+    FETCH_JOB_STALE_AFTER: float = float(os.getenv("FETCH_JOB_STALE_AFTER", "300"))
+    FETCH_JOB_SWEEP_INTERVAL: float = float(os.getenv("FETCH_JOB_SWEEP_INTERVAL", "30"))
+
+    HARVESTER_ENABLED: bool = os.getenv("HARVESTER_ENABLED", "false").lower() == "true"
+    HARVESTER_RANGES: str = os.getenv("HARVESTER_RANGES", "1-1000")
+    HARVESTER_RANDOM_COUNT: int = int(os.getenv("HARVESTER_RANDOM_COUNT", "0"))
+    HARVESTER_BATCH_SIZE: int = int(os.getenv("HARVESTER_BATCH_SIZE", "10"))
+    HARVESTER_SPARE_TOKENS: float = float(os.getenv("HARVESTER_SPARE_TOKENS", "5"))
+    HARVESTER_DAILY_RESERVE: int = int(os.getenv("HARVESTER_DAILY_RESERVE", "100"))
+    HARVESTER_IDLE_INTERVAL: float = float(os.getenv("HARVESTER_IDLE_INTERVAL", "5"))
+    HARVESTER_MAX_BACKOFF: float = float(os.getenv("HARVESTER_MAX_BACKOFF", "300"))
+
     API_NINJAS_KEY: str = os.getenv("API_NINJAS", "")
     API_NINJAS_BASE_URL: str = os.getenv("API_NINJAS_BASE_URL", "https://api.api-ninjas.com/v1")
+    UPSTREAM_TIMEOUT: float = float(os.getenv("UPSTREAM_TIMEOUT", "5"))
+    UPSTREAM_MODE: str = os.getenv("UPSTREAM_MODE", "live").lower()
+    TRIVIA_PROVIDERS: str = os.getenv("TRIVIA_PROVIDERS", "apininjas:1")
+    TRIVIA_ROUTING_MODE: str = os.getenv("TRIVIA_ROUTING_MODE", "weighted").lower()
+    TRIVIA_FANOUT: int = int(os.getenv("TRIVIA_FANOUT", "2"))
+    UPSTREAM_CASSETTE_PATH: str = os.getenv("UPSTREAM_CASSETTE_PATH", "cassettes/upstream.cassette")
+
+    UPSTREAM_MAX_CONNECTIONS: int = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+    UPSTREAM_MAX_KEEPALIVE_CONNECTIONS: int = int(
+        os.getenv("UPSTREAM_MAX_KEEPALIVE_CONNECTIONS", "20")
+    )
+    UPSTREAM_KEEPALIVE_EXPIRY: float = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+    UPSTREAM_MAX_CONCURRENCY_PER_HOST: int = int(
+        os.getenv("UPSTREAM_MAX_CONCURRENCY_PER_HOST", "20")
+    )
+    UPSTREAM_HTTP2: bool = os.getenv("UPSTREAM_HTTP2", "false").lower() == "true"
+    UPSTREAM_WARMUP_CONNECTIONS: int = int(os.getenv("UPSTREAM_WARMUP_CONNECTIONS", "4"))
+
+    UPSTREAM_CACHE_MAX_SIZE: int = int(os.getenv("UPSTREAM_CACHE_MAX_SIZE", "10000"))
+    UPSTREAM_CACHE_TTL: float = float(os.getenv("UPSTREAM_CACHE_TTL", "3600"))
+    UPSTREAM_CACHE_STALE_TTL: float = float(os.getenv("UPSTREAM_CACHE_STALE_TTL", "86400"))
+
+    RANDOM_BUFFER_SIZE: int = int(os.getenv("RANDOM_BUFFER_SIZE", "50"))
+    RANDOM_BUFFER_LOW_WATERMARK: int = int(os.getenv("RANDOM_BUFFER_LOW_WATERMARK", "10"))
+    RANDOM_BUFFER_BATCH_SIZE: int = int(os.getenv("RANDOM_BUFFER_BATCH_SIZE", "1"))
+
+    UPSTREAM_BREAKER_FAILURE_THRESHOLD: int = int(
+        os.getenv("UPSTREAM_BREAKER_FAILURE_THRESHOLD", "5")
+    )
+    UPSTREAM_BREAKER_RECOVERY_TIMEOUT: float = float(
+        os.getenv("UPSTREAM_BREAKER_RECOVERY_TIMEOUT", "30")
+    )
+    UPSTREAM_BREAKER_HALF_OPEN_MAX_CALLS: int = int(
+        os.getenv("UPSTREAM_BREAKER_HALF_OPEN_MAX_CALLS", "1")
+    )
+    UPSTREAM_RETRY_MAX_ATTEMPTS: int = int(os.getenv("UPSTREAM_RETRY_MAX_ATTEMPTS", "2"))
+    UPSTREAM_RETRY_BASE_DELAY: float = float(os.getenv("UPSTREAM_RETRY_BASE_DELAY", "0.1"))
+    UPSTREAM_RETRY_MAX_DELAY: float = float(os.getenv("UPSTREAM_RETRY_MAX_DELAY", "2"))
+    UPSTREAM_RETRY_BUDGET_RATIO: float = float(os.getenv("UPSTREAM_RETRY_BUDGET_RATIO", "0.1"))
+    UPSTREAM_RETRY_BUDGET_MAX_TOKENS: float = float(
+        os.getenv("UPSTREAM_RETRY_BUDGET_MAX_TOKENS", "10")
+    )
+    UPSTREAM_HEDGE_ENABLED: bool = os.getenv("UPSTREAM_HEDGE_ENABLED", "false").lower() == "true"
+    UPSTREAM_HEDGE_PERCENTILE: float = float(os.getenv("UPSTREAM_HEDGE_PERCENTILE", "0.95"))
+    UPSTREAM_HEDGE_MIN_DELAY: float = float(os.getenv("UPSTREAM_HEDGE_MIN_DELAY", "0.05"))
+
+    UPSTREAM_RATE_LIMIT_RPS: float = float(os.getenv("UPSTREAM_RATE_LIMIT_RPS", "10"))
+    UPSTREAM_RATE_LIMIT_BURST: int = int(os.getenv("UPSTREAM_RATE_LIMIT_BURST", "10"))
+    UPSTREAM_DAILY_QUOTA: int = int(os.getenv("UPSTREAM_DAILY_QUOTA", "0"))
+    UPSTREAM_RATE_LIMIT_MAX_WAIT: float = float(os.getenv("UPSTREAM_RATE_LIMIT_MAX_WAIT", "2"))
+    UPSTREAM_RATE_LIMIT_BACKGROUND_MAX_WAIT: float = float(
+        os.getenv("UPSTREAM_RATE_LIMIT_BACKGROUND_MAX_WAIT", "60")
+    )
+    UPSTREAM_QUOTA_DISTRIBUTED: bool = (
+        os.getenv("UPSTREAM_QUOTA_DISTRIBUTED", "false").lower() == "true"
+    )
+    UPSTREAM_QUOTA_WINDOW_SECONDS: int = int(os.getenv("UPSTREAM_QUOTA_WINDOW_SECONDS", "10"))
+    UPSTREAM_QUOTA_LEASE_SIZE: int = int(os.getenv("UPSTREAM_QUOTA_LEASE_SIZE", "10"))
+    UPSTREAM_QUOTA_LOW_WATERMARK: int = int(os.getenv("UPSTREAM_QUOTA_LOW_WATERMARK", "2"))
+    UPSTREAM_QUOTA_REPLICAS: int = int(os.getenv("UPSTREAM_QUOTA_REPLICAS", "1"))
 
 
 @lru_cache
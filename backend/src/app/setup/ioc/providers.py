@@ -0,0 +1,344 @@
+"""
+Сборка долгоживущих зависимостей приложения
+"""
+
+import logging
+from contextlib import AsyncExitStack
+
+import httpx
+
+from src.app.application.common.ports import ApiClientProtocol
+from src.app.application.common.services.near_duplicates import DuplicateAction
+from src.app.infrastructure.adapters.cassette import (
+    CassetteReader,
+    CassetteWriter,
+    RecordingApiClient,
+    ReplayApiClient,
+)
+from src.app.infrastructure.adapters.provider_router import (
+    ProviderRouter,
+    RoutingMode,
+    TriviaProvider,
+)
+from src.app.infrastructure.adapters.public_api_client import PublicApiClient
+from src.app.infrastructure.adapters.random_fact_buffer import RandomFactBuffer
+from src.app.infrastructure.adapters.rate_limiter import (
+    DailyBudget,
+    Priority,
+    RateLimitedApiClient,
+    TokenBucketScheduler,
+)
+from src.app.infrastructure.adapters.resilience import (
+    CircuitBreaker,
+    ResilientApiClient,
+    RetryBudget,
+)
+from src.app.infrastructure.adapters.response_cache import CachedApiClient, TtlLruCache
+from src.app.infrastructure.adapters.single_flight import CoalescingApiClient
+from src.app.infrastructure.jobs.fetch_job_pool import FetchJobPool
+from src.app.infrastructure.jobs.question_harvester import HarvestPlan, QuestionHarvester
+from src.app.infrastructure.persistence.database import (
+    async_session_maker,
+    create_replica_engine,
+    create_session_maker,
+)
+from src.app.infrastructure.persistence.idempotency import IdempotencyStore
+from src.app.infrastructure.persistence.local_trivia_provider import DatabaseTriviaProvider
+from src.app.infrastructure.persistence.near_duplicates import NearDuplicateDetector
+from src.app.infrastructure.persistence.quota_coordinator import (
+    DistributedQuota,
+    PostgresQuotaStore,
+    QuotaWindow,
+)
+from src.app.infrastructure.persistence.read_replicas import (
+    Replica,
+    ReplicaRouter,
+    ReplicaSelection,
+)
+from src.app.infrastructure.persistence.write_behind import WriteBehindBuffer
+from src.app.setup.config.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+def build_api_client(
+    settings: Settings,
+    http_client: httpx.AsyncClient,
+    stack: AsyncExitStack,
+    scheduler: TokenBucketScheduler | None = None,
+) -> ApiClientProtocol:
+    """Создание клиента внешнего API поверх общего пула соединений"""
+    providers = [
+        TriviaProvider(
+            name, build_provider_client(name, settings, http_client, stack, scheduler), weight
+        )
+        for name, weight in settings.trivia_providers
+    ]
+    api_client: ApiClientProtocol = providers[0].client
+    if len(providers) > 1:
+        api_client = ProviderRouter(
+            providers,
+            mode=RoutingMode(settings.TRIVIA_ROUTING_MODE),
+            fanout=settings.TRIVIA_FANOUT,
+        )
+    api_client = CoalescingApiClient(api_client)
+
+    if settings.UPSTREAM_CACHE_MAX_SIZE > 0:
+        cache = TtlLruCache(
+            max_size=settings.UPSTREAM_CACHE_MAX_SIZE,
+            ttl=settings.UPSTREAM_CACHE_TTL,
+            stale_ttl=settings.UPSTREAM_CACHE_STALE_TTL,
+        )
+        api_client = CachedApiClient(api_client, cache)
+        stack.push_async_callback(api_client.aclose)
+
+    if settings.RANDOM_BUFFER_SIZE > 0:
+        api_client = RandomFactBuffer(
+            api_client,
+            high_watermark=settings.RANDOM_BUFFER_SIZE,
+            low_watermark=settings.RANDOM_BUFFER_LOW_WATERMARK,
+            batch_size=settings.RANDOM_BUFFER_BATCH_SIZE,
+        )
+        api_client.start()
+        stack.push_async_callback(api_client.aclose)
+
+    return api_client
+
+
+def build_provider_client(
+    name: str,
+    settings: Settings,
+    http_client: httpx.AsyncClient,
+    stack: AsyncExitStack,
+    scheduler: TokenBucketScheduler | None = None,
+) -> ApiClientProtocol:
+    """Создание клиента провайдера вопросов викторины по имени"""
+    if name == "local":
+        return DatabaseTriviaProvider(async_session_maker)
+    if name != "apininjas":
+        raise ValueError(f"Неизвестный провайдер вопросов викторины: {name}")
+    if settings.UPSTREAM_MODE == "replay":
+        reader = CassetteReader(settings.UPSTREAM_CASSETTE_PATH)
+        stack.callback(reader.close)
+        return ReplayApiClient(reader)
+    return build_upstream_client(settings, http_client, stack, scheduler)
+
+
+def build_upstream_client(
+    settings: Settings,
+    http_client: httpx.AsyncClient,
+    stack: AsyncExitStack,
+    scheduler: TokenBucketScheduler | None = None,
+) -> ApiClientProtocol:
+    """Создание клиента реального внешнего API с общим планировщиком квоты"""
+    api_client: ApiClientProtocol = PublicApiClient(
+        api_key=settings.API_NINJAS_KEY,
+        base_url=settings.API_NINJAS_BASE_URL,
+        http_client=http_client,
+        timeout=settings.UPSTREAM_TIMEOUT,
+    )
+    if settings.UPSTREAM_MODE == "record":
+        writer = CassetteWriter(settings.UPSTREAM_CASSETTE_PATH)
+        stack.callback(writer.close)
+        api_client = RecordingApiClient(api_client, writer)
+    if scheduler is not None:
+        api_client = RateLimitedApiClient(api_client, scheduler)
+    api_client = ResilientApiClient(
+        api_client,
+        breaker=CircuitBreaker(
+            failure_threshold=settings.UPSTREAM_BREAKER_FAILURE_THRESHOLD,
+            recovery_timeout=settings.UPSTREAM_BREAKER_RECOVERY_TIMEOUT,
+            half_open_max_calls=settings.UPSTREAM_BREAKER_HALF_OPEN_MAX_CALLS,
+        ),
+        retry_budget=RetryBudget(
+            ratio=settings.UPSTREAM_RETRY_BUDGET_RATIO,
+            max_tokens=settings.UPSTREAM_RETRY_BUDGET_MAX_TOKENS,
+        ),
+        max_retries=settings.UPSTREAM_RETRY_MAX_ATTEMPTS,
+        base_delay=settings.UPSTREAM_RETRY_BASE_DELAY,
+        max_delay=settings.UPSTREAM_RETRY_MAX_DELAY,
+        hedge_percentile=(
+            settings.UPSTREAM_HEDGE_PERCENTILE if settings.UPSTREAM_HEDGE_ENABLED else None
+        ),
+        hedge_min_delay=settings.UPSTREAM_HEDGE_MIN_DELAY,
+    )
+    return api_client
+
+
+def build_scheduler(settings: Settings, stack: AsyncExitStack) -> TokenBucketScheduler | None:
+    """Создание планировщика квоты запросов к внешнему API; None - без ограничения"""
+    if settings.UPSTREAM_RATE_LIMIT_RPS <= 0:
+        return None
+    daily_budget = None
+    shared_quota = None
+    if settings.UPSTREAM_QUOTA_DISTRIBUTED:
+        shared_quota = build_shared_quota(settings)
+        stack.push_async_callback(shared_quota.aclose)
+    elif settings.UPSTREAM_DAILY_QUOTA > 0:
+        daily_budget = DailyBudget(settings.UPSTREAM_DAILY_QUOTA)
+
+    return TokenBucketScheduler(
+        rate=settings.UPSTREAM_RATE_LIMIT_RPS,
+        burst=settings.UPSTREAM_RATE_LIMIT_BURST,
+        daily_budget=daily_budget,
+        max_wait={
+            Priority.INTERACTIVE: settings.UPSTREAM_RATE_LIMIT_MAX_WAIT,
+            Priority.BACKGROUND: settings.UPSTREAM_RATE_LIMIT_BACKGROUND_MAX_WAIT,
+        },
+        shared_quota=shared_quota,
+    )
+
+
+def build_shared_quota(settings: Settings) -> DistributedQuota:
+    """Создание квоты, общей для всех реплик, поверх счетчиков в Postgres"""
+    window_seconds = settings.UPSTREAM_QUOTA_WINDOW_SECONDS
+    windows = [
+        QuotaWindow(
+            bucket="rate",
+            seconds=window_seconds,
+            limit=int(settings.UPSTREAM_RATE_LIMIT_RPS * window_seconds),
+        )
+    ]
+    if settings.UPSTREAM_DAILY_QUOTA > 0:
+        windows.append(
+            QuotaWindow(bucket="daily", seconds=86400, limit=settings.UPSTREAM_DAILY_QUOTA)
+        )
+
+    return DistributedQuota(
+        PostgresQuotaStore(async_session_maker),
+        windows,
+        lease_size=settings.UPSTREAM_QUOTA_LEASE_SIZE,
+        low_watermark=settings.UPSTREAM_QUOTA_LOW_WATERMARK,
+        fallback_share=1 / max(settings.UPSTREAM_QUOTA_REPLICAS, 1),
+    )
+
+
+def build_job_pool(
+    settings: Settings,
+    api_client: ApiClientProtocol,
+    stack: AsyncExitStack,
+    near_duplicates: NearDuplicateDetector | None = None,
+) -> FetchJobPool:
+    """Создание и запуск пула обработчиков фоновых заданий"""
+    job_pool = FetchJobPool(
+        async_session_maker,
+        api_client,
+        concurrency=settings.FETCH_JOB_CONCURRENCY,
+        max_queue=settings.FETCH_JOB_QUEUE_SIZE,
+        stale_after=settings.FETCH_JOB_STALE_AFTER,
+        sweep_interval=settings.FETCH_JOB_SWEEP_INTERVAL,
+        freshness=settings.api_data_freshness,
+        near_duplicates=near_duplicates,
+    )
+    job_pool.start()
+    stack.push_async_callback(job_pool.aclose)
+    return job_pool
+
+
+def build_write_buffer(
+    settings: Settings,
+    stack: AsyncExitStack,
+    near_duplicates: NearDuplicateDetector | None = None,
+) -> WriteBehindBuffer | None:
+    """Создание буфера отложенной групповой записи api_data, если он включен"""
+    if not settings.API_DATA_WRITE_BEHIND:
+        return None
+    write_buffer = WriteBehindBuffer(
+        async_session_maker,
+        max_rows=settings.API_DATA_WRITE_BEHIND_MAX_ROWS,
+        flush_interval=settings.API_DATA_WRITE_BEHIND_INTERVAL_MS / 1000,
+        max_pending=settings.API_DATA_WRITE_BEHIND_MAX_PENDING,
+        near_duplicates=near_duplicates,
+    )
+    write_buffer.start()
+    stack.push_async_callback(write_buffer.aclose)
+    return write_buffer
+
+
+def build_harvester(
+    settings: Settings,
+    http_client: httpx.AsyncClient,
+    scheduler: TokenBucketScheduler | None,
+    stack: AsyncExitStack,
+    near_duplicates: NearDuplicateDetector | None = None,
+) -> QuestionHarvester | None:
+    """Создание и запуск фонового наполнения банка вопросов, если оно включено"""
+    if not settings.HARVESTER_ENABLED:
+        return None
+    if settings.UPSTREAM_MODE != "live":
+        logger.warning(f"Наполнение банка вопросов отключено в режиме {settings.UPSTREAM_MODE}")
+        return None
+
+    harvester = QuestionHarvester(
+        async_session_maker,
+        # Напрямую к внешнему API, минуя кэш и локального провайдера, но с общей квотой
+        build_upstream_client(settings, http_client, stack, scheduler),
+        HarvestPlan(tuple(settings.harvester_ranges), settings.HARVESTER_RANDOM_COUNT),
+        scheduler=scheduler,
+        batch_size=settings.HARVESTER_BATCH_SIZE,
+        spare_tokens=settings.HARVESTER_SPARE_TOKENS,
+        daily_reserve=settings.HARVESTER_DAILY_RESERVE,
+        idle_interval=settings.HARVESTER_IDLE_INTERVAL,
+        max_backoff=settings.HARVESTER_MAX_BACKOFF,
+        near_duplicates=near_duplicates,
+    )
+    harvester.start()
+    stack.push_async_callback(harvester.aclose)
+    return harvester
+
+
+def build_idempotency_store(settings: Settings, stack: AsyncExitStack) -> IdempotencyStore:
+    """Создание хранилища ключей идемпотентности с кэшем ответов в памяти"""
+    cache = None
+    if settings.IDEMPOTENCY_CACHE_SIZE > 0:
+        cache = TtlLruCache(max_size=settings.IDEMPOTENCY_CACHE_SIZE, ttl=settings.IDEMPOTENCY_TTL)
+    idempotency_store = IdempotencyStore(
+        async_session_maker,
+        ttl=settings.IDEMPOTENCY_TTL,
+        lease=settings.IDEMPOTENCY_LEASE,
+        wait_timeout=settings.IDEMPOTENCY_WAIT_TIMEOUT,
+        cache=cache,
+        purge_interval=settings.IDEMPOTENCY_PURGE_INTERVAL,
+    )
+    idempotency_store.start()
+    stack.push_async_callback(idempotency_store.aclose)
+    return idempotency_store
+
+
+def build_near_duplicate_detector(
+    settings: Settings, stack: AsyncExitStack
+) -> NearDuplicateDetector | None:
+    """Создание индекса почти дубликатов с загрузкой из БД в фоне, если он включен"""
+    if settings.NEAR_DUPLICATES == "off":
+        return None
+    detector = NearDuplicateDetector(
+        async_session_maker,
+        action=DuplicateAction(settings.NEAR_DUPLICATES),
+        threshold=settings.NEAR_DUPLICATES_THRESHOLD,
+        num_perm=settings.NEAR_DUPLICATES_NUM_PERM,
+        bands=settings.NEAR_DUPLICATES_BANDS,
+        shingle_size=settings.NEAR_DUPLICATES_SHINGLE_SIZE,
+    )
+    detector.start()
+    stack.push_async_callback(detector.aclose)
+    return detector
+
+
+def build_replica_router(settings: Settings, stack: AsyncExitStack) -> ReplicaRouter | None:
+    """Создание маршрутизатора чтения по репликам, если они заданы"""
+    replicas = []
+    for name, url in settings.replica_database_urls.items():
+        replica_engine = create_replica_engine(url, name)
+        replicas.append(Replica(name, replica_engine, create_session_maker(replica_engine)))
+    if not replicas:
+        return None
+    router = ReplicaRouter(
+        replicas,
+        async_session_maker,
+        selection=ReplicaSelection(settings.DB_REPLICA_SELECTION),
+        max_lag=settings.DB_REPLICA_MAX_LAG,
+        check_interval=settings.DB_REPLICA_CHECK_INTERVAL,
+    )
+    router.start()
+    stack.push_async_callback(router.aclose)
+    return router
@@ -0,0 +1,175 @@
+"""
+Локальная имитация API Ninjas для нагрузочного тестирования без реального ключа
+
+Запуск: python -m src.fake_upstream --port 8089 --latency lognormal:50:0.6 --error-rate 0.01
+Затем приложение направляется на нее: API_NINJAS_BASE_URL=http://localhost:8089/v1
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import time
+from dataclasses import dataclass
+
+import uvicorn
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import JSONResponse
+
+CATEGORIES = ("general", "science", "history", "geography", "music", "sportsleisure")
+
+
+@dataclass(frozen=True)
+class LatencyDistribution:
+    """Распределение задержки ответа в миллисекундах
+
+    constant:<мс>, uniform:<от>:<до>, lognormal:<медиана>:<sigma>
+    """
+
+    kind: str = "constant"
+    a: float = 0.0
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyDistribution":
+        kind, *params = spec.split(":")
+        values = [float(param) for param in params]
+        if kind == "constant" and len(values) == 1:
+            return cls(kind, values[0])
+        if kind in ("uniform", "lognormal") and len(values) == 2:
+            return cls(kind, values[0], values[1])
+        raise ValueError(f"Некорректное распределение задержки: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        """Задержка в секундах"""
+        if self.kind == "uniform":
+            millis = rng.uniform(self.a, self.b)
+        elif self.kind == "lognormal":
+            millis = rng.lognormvariate(math.log(max(self.a, 1e-3)), self.b)
+        else:
+            millis = self.a
+        return max(millis, 0.0) / 1000
+
+
+@dataclass(frozen=True)
+class FakeUpstreamConfig:
+    """Параметры имитации внешнего API"""
+
+    latency: LatencyDistribution = LatencyDistribution()
+    error_rate: float = 0.0
+    error_status: int = 503
+    rate_limit_period: float = 0.0
+    rate_limit_duration: float = 0.0
+    payload_bytes: int = 0
+    max_limit: int = 30
+    seed: int | None = None
+
+
+class FakeUpstream:
+    """Генератор ответов и внедряемых сбоев"""
+
+    def __init__(self, config: FakeUpstreamConfig, clock=time.monotonic):
+        self.config = config
+        self._rng = random.Random(config.seed)
+        self._clock = clock
+        self._started_at = clock()
+        self.requests = 0
+
+    def in_rate_limit_burst(self) -> bool:
+        """Каждые rate_limit_period секунд первые rate_limit_duration секунд отвечают 429"""
+        if self.config.rate_limit_period <= 0 or self.config.rate_limit_duration <= 0:
+            return False
+        elapsed = self._clock() - self._started_at
+        return elapsed % self.config.rate_limit_period < self.config.rate_limit_duration
+
+    async def respond(self, request: Request, body) -> JSONResponse:
+        """Ответ с задержкой, ошибками и ограничением частоты по конфигурации"""
+        self.requests += 1
+        await asyncio.sleep(self.config.latency.sample(self._rng))
+
+        if not request.headers.get("X-Api-Key"):
+            return JSONResponse({"error": "Missing API Key."}, status_code=400)
+        if self.in_rate_limit_burst():
+            return JSONResponse(
+                {"error": "Too many requests."}, status_code=429, headers={"Retry-After": "1"}
+            )
+        if self._rng.random() < self.config.error_rate:
+            return JSONResponse(
+                {"error": "Injected upstream failure."}, status_code=self.config.error_status
+            )
+        return JSONResponse(body)
+
+    def trivia(self, number: int | None = None) -> dict:
+        number = self._rng.randint(0, 10_000) if number is None else number
+        return {
+            "category": self._rng.choice(CATEGORIES),
+            "question": self._pad(f"What is special about the number {number}?"),
+            "answer": str(number),
+        }
+
+    def fact(self) -> dict:
+        return {"fact": self._pad(f"Fact #{self._rng.randint(0, 1_000_000)}.")}
+
+    def _pad(self, text: str) -> str:
+        """Дополнение текста до заданного размера полезной нагрузки"""
+        missing = self.config.payload_bytes - len(text)
+        return text + " " + "x" * (missing - 1) if missing > 1 else text
+
+
+def create_fake_upstream_app(config: FakeUpstreamConfig) -> FastAPI:
+    """Создание приложения, отвечающего в форматах /v1/trivia и /v1/facts API Ninjas"""
+    upstream = FakeUpstream(config)
+    app = FastAPI(title="Fake API Ninjas", openapi_url=None)
+    app.state.upstream = upstream
+
+    @app.get("/v1/trivia")
+    async def trivia(request: Request, number: int | None = None) -> JSONResponse:
+        return await upstream.respond(request, [upstream.trivia(number)])
+
+    @app.get("/v1/facts")
+    async def facts(request: Request, limit: int = Query(1, ge=1)) -> JSONResponse:
+        count = min(limit, config.max_limit)
+        return await upstream.respond(request, [upstream.fact() for _ in range(count)])
+
+    return app
+
+
+def parse_args(argv: list[str] | None = None) -> tuple[FakeUpstreamConfig, argparse.Namespace]:
+    parser = argparse.ArgumentParser(description="Локальная имитация API Ninjas")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument(
+        "--latency",
+        type=LatencyDistribution.parse,
+        default=LatencyDistribution(),
+        help="constant:<мс> | uniform:<от>:<до> | lognormal:<медиана>:<sigma>",
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов с ошибкой")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument(
+        "--rate-limit-period", type=float, default=0.0, help="период всплесков 429, с"
+    )
+    parser.add_argument(
+        "--rate-limit-duration", type=float, default=0.0, help="длительность всплеска 429, с"
+    )
+    parser.add_argument("--payload-bytes", type=int, default=0, help="размер текста вопроса")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    config = FakeUpstreamConfig(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        rate_limit_period=args.rate_limit_period,
+        rate_limit_duration=args.rate_limit_duration,
+        payload_bytes=args.payload_bytes,
+        seed=args.seed,
+    )
+    return config, args
+
+
+if __name__ == "__main__":
+    config, args = parse_args()
+    uvicorn.run(
+        create_fake_upstream_app(config), host=args.host, port=args.port, log_level="warning"
+    )
@@ -0,0 +1,84 @@
+"""
+Массовая загрузка вопросов в api_data из файла NDJSON или CSV
+
+Запуск: python -m src.import_questions questions.ndjson --on-conflict skip
+        zcat dump.csv.gz | python -m src.import_questions - --format csv --source opentdb
+"""
+
+import argparse
+import asyncio
+import sys
+from collections.abc import AsyncIterator
+from typing import BinaryIO
+
+from src.app.infrastructure.persistence.bulk_import import (
+    ApiDataImporter,
+    ConflictPolicy,
+    ImportFormat,
+    ImportReport,
+)
+from src.app.infrastructure.persistence.database import async_session_maker, engine
+from src.app.setup.config.settings import get_settings
+
+CHUNK_SIZE = 1024 * 1024
+
+
+async def read_chunks(file: BinaryIO, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Чтение файла кусками в отдельном потоке"""
+    while chunk := await asyncio.to_thread(file.read, chunk_size):
+        yield chunk
+
+
+def print_progress(report: ImportReport) -> None:
+    print(
+        f"\rполучено {report.received}, загружено {report.imported}, "
+        f"пропущено {report.skipped}, отклонено {report.rejected} "
+        f"({report.received / max(report.elapsed, 1e-9):.0f} строк/с)",
+        end="",
+        file=sys.stderr,
+    )
+
+
+async def run(args: argparse.Namespace) -> ImportReport:
+    importer = ApiDataImporter(
+        async_session_maker,
+        batch_size=args.batch_size,
+        on_conflict=args.on_conflict,
+        max_errors=args.max_errors,
+        default_source=args.source,
+    )
+    file = sys.stdin.buffer if args.file == "-" else open(args.file, "rb")  # noqa: SIM115
+    try:
+        return await importer.run(read_chunks(file), args.format, on_progress=print_progress)
+    finally:
+        if file is not sys.stdin.buffer:
+            file.close()
+        await engine.dispose()
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Массовая загрузка вопросов в api_data")
+    parser.add_argument("file", help="путь к файлу или - для stdin")
+    parser.add_argument("--format", type=ImportFormat, default=None, help="ndjson | csv")
+    parser.add_argument(
+        "--on-conflict",
+        type=ConflictPolicy,
+        default=ConflictPolicy.SKIP,
+        help="skip | update для уже сохраненных (source, external_id)",
+    )
+    parser.add_argument("--source", default=None, help="источник для строк без source")
+    parser.add_argument("--batch-size", type=int, default=settings.BULK_IMPORT_BATCH_SIZE)
+    parser.add_argument("--max-errors", type=int, default=settings.BULK_IMPORT_MAX_ERRORS)
+    args = parser.parse_args(argv)
+    if args.format is None:
+        args.format = ImportFormat.CSV if args.file.endswith(".csv") else ImportFormat.NDJSON
+    return args
+
+
+if __name__ == "__main__":
+    report = asyncio.run(run(parse_args()))
+    print(file=sys.stderr)
+    for row in report.errors:
+        print(f"строка {row.line}: {row.error}", file=sys.stderr)
+    sys.exit(1 if report.rejected else 0)
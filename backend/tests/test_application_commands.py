@@ -2,13 +2,17 @@
 Тесты для команд приложения
 """
 
-from datetime import UTC, datetime
+import asyncio
+from datetime import UTC, datetime, timedelta
 from unittest.mock import AsyncMock
 from uuid import uuid4
 
 import pytest
 
 from src.app.application.commands.fetch_api_data import FetchApiDataCommand
+from src.app.application.commands.fetch_api_data_batch import FetchApiDataBatchCommand
+from src.app.application.common.exceptions import NearDuplicateError
+from src.app.application.common.services.near_duplicates import DuplicateAction
 from src.app.domain.entities.api_data import ApiDataEntity
 
 
@@ -91,3 +95,352 @@ class TestFetchApiDataCommand:
 
         assert command.api_client is not None
         assert command.repository == mock_repository
+
+    @staticmethod
+    def stored(age: timedelta) -> ApiDataEntity:
+        return ApiDataEntity(
+            source="apininjas",
+            title="Вопрос",
+            content="Старый текст",
+            external_id="42",
+            fetched_at=datetime.now(UTC) - age,
+        )
+
+    @pytest.mark.asyncio
+    async def test_execute_serves_fresh_row_without_upstream(self):
+        """Тест ответа из БД, если сохраненная запись свежее окна"""
+        stored = self.stored(timedelta(hours=1))
+        mock_repository = AsyncMock()
+        mock_repository.get_latest_by_external_id.return_value = stored
+        mock_api_client = AsyncMock()
+
+        command = FetchApiDataCommand(mock_repository, mock_api_client, freshness=timedelta(days=1))
+        result = await command.execute(42)
+
+        assert result is stored
+        mock_repository.get_latest_by_external_id.assert_awaited_once_with("42", "apininjas")
+        mock_api_client.get_number_fact.assert_not_called()
+        mock_repository.create.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_execute_looks_up_rows_of_own_source(self):
+        """Тест поиска свежей записи только среди строк источника команды"""
+        mock_repository = AsyncMock()
+        mock_repository.get_latest_by_external_id.return_value = None
+        mock_repository.create.side_effect = lambda entity: entity
+        mock_api_client = AsyncMock()
+        mock_api_client.get_number_fact.return_value = {
+            "source": "local-mirror",
+            "title": "Вопрос",
+            "content": "Текст",
+            "external_id": "42",
+        }
+
+        command = FetchApiDataCommand(
+            mock_repository, mock_api_client, freshness=timedelta(days=1), source="local-mirror"
+        )
+        await command.execute(42)
+
+        mock_repository.get_latest_by_external_id.assert_awaited_once_with("42", "local-mirror")
+        mock_api_client.get_number_fact.assert_awaited_once_with(42)
+
+    @pytest.mark.asyncio
+    async def test_execute_refreshes_stale_row_in_place(self):
+        """Тест обновления устаревшей записи с сохранением ее id"""
+        stored = self.stored(timedelta(days=2))
+        mock_repository = AsyncMock()
+        mock_repository.get_latest_by_external_id.return_value = stored
+        mock_repository.create.side_effect = lambda entity: entity
+        mock_api_client = AsyncMock()
+        mock_api_client.get_number_fact.return_value = {
+            "source": "apininjas",
+            "title": "Вопрос",
+            "content": "Новый текст",
+            "external_id": "42",
+        }
+
+        command = FetchApiDataCommand(mock_repository, mock_api_client, freshness=timedelta(days=1))
+        result = await command.execute(42)
+
+        assert result.id == stored.id
+        assert result.content == "Новый текст"
+        mock_api_client.get_number_fact.assert_awaited_once_with(42)
+
+
+class FakeDetector:
+    """Индекс почти дубликатов, считающий дубликатами вопросы с тем же текстом"""
+
+    def __init__(self, action: DuplicateAction):
+        self.action = action
+        self.seen: dict[str, object] = {}
+
+    def check(self, entity):
+        return self.seen.get(entity.content)
+
+    def add(self, entities):
+        for entity in entities:
+            self.seen.setdefault(entity.content, entity.id)
+
+
+class TestNearDuplicates:
+    """Тесты обработки почти дубликатов командами получения данных"""
+
+    @staticmethod
+    def original(external_id="7"):
+        return ApiDataEntity(
+            source="apininjas",
+            title="Вопрос",
+            content="Текст",
+            external_id=external_id,
+            fetched_at=datetime.now(UTC),
+        )
+
+    def make_command(self, action, original):
+        detector = FakeDetector(action)
+        detector.seen[original.content] = original.id
+        repository = AsyncMock()
+        repository.get_by_id.return_value = original
+        repository.create.side_effect = lambda entity: entity
+        api_client = AsyncMock()
+        api_client.get_number_fact.return_value = {
+            "source": "apininjas",
+            "title": "Вопрос",
+            "content": "Текст",
+            "external_id": "42",
+        }
+        command = FetchApiDataCommand(repository, api_client, near_duplicates=detector)
+        return command, repository
+
+    @pytest.mark.asyncio
+    async def test_flag_stores_with_reference(self):
+        """Тест сохранения почти дубликата с указанием оригинала"""
+        original = self.original()
+        command, repository = self.make_command(DuplicateAction.FLAG, original)
+
+        result = await command.execute(42)
+
+        assert result.duplicate_of == original.id
+        repository.get_by_id.assert_awaited_once_with(original.id)
+        repository.create.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_merge_returns_original(self):
+        """Тест возврата сохраненного оригинала без новой записи"""
+        original = self.original()
+        command, repository = self.make_command(DuplicateAction.MERGE, original)
+
+        assert await command.execute(42) is original
+        repository.create.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_reject_raises(self):
+        """Тест отказа в сохранении почти дубликата"""
+        original = self.original()
+        command, repository = self.make_command(DuplicateAction.REJECT, original)
+
+        with pytest.raises(NearDuplicateError) as exc_info:
+            await command.execute(42)
+
+        assert exc_info.value.original_id == original.id
+        repository.create.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_same_question_is_not_duplicate(self):
+        """Тест: повторное получение того же вопроса не считается дубликатом"""
+        original = self.original(external_id="42")
+        command, repository = self.make_command(DuplicateAction.REJECT, original)
+
+        result = await command.execute(42)
+
+        assert result.duplicate_of is None
+        repository.create.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_local_answer_is_not_stored_again(self):
+        """Тест: ответ провайдера local - сохраненная строка, она не дублируется и не отклоняется"""
+        original = self.original(external_id="42")
+        repository = AsyncMock()
+        api_client = AsyncMock()
+        api_client.get_number_fact.return_value = original.model_dump()
+        api_client.get_random_fact.return_value = original.model_dump()
+        detector = FakeDetector(DuplicateAction.REJECT)
+        detector.seen[original.content] = original.id
+
+        result = await FetchApiDataCommand(
+            repository, api_client, near_duplicates=detector
+        ).execute(42)
+        results = await FetchApiDataBatchCommand(
+            repository, api_client, near_duplicates=detector
+        ).execute([42], random_count=1)
+
+        assert result == original
+        assert [item.entity for item in results] == [original, original]
+        assert all(item.stored for item in results)
+        repository.create.assert_not_called()
+        repository.create_many.assert_not_called()
+        repository.get_by_id.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_batch_merges_and_rejects_per_item(self):
+        """Тест: слитые элементы не сохраняются повторно, отклоненные - ошибки элементов"""
+        original = self.original()
+        repository = AsyncMock()
+        repository.get_by_id.return_value = original
+        api_client = AsyncMock()
+        api_client.get_number_fact.side_effect = lambda number: {
+            "source": "apininjas",
+            "title": "Вопрос",
+            "content": "Текст" if number == 1 else f"Другой текст {number}",
+            "external_id": str(number),
+        }
+
+        for action in (DuplicateAction.MERGE, DuplicateAction.REJECT):
+            detector = FakeDetector(action)
+            detector.seen["Текст"] = original.id
+            command = FetchApiDataBatchCommand(repository, api_client, near_duplicates=detector)
+            results = await command.execute([1, 2])
+
+            stored = repository.create_many.call_args.args[0]
+            assert [entity.external_id for entity in stored] == ["2"]
+            if action == DuplicateAction.MERGE:
+                assert results[0].entity is original
+                assert results[0].stored
+            else:
+                assert not results[0].ok
+
+
+class TestFetchApiDataBatchCommand:
+    """Тесты для команды FetchApiDataBatchCommand"""
+
+    @staticmethod
+    def fact(number=None):
+        return {
+            "source": "apininjas",
+            "title": f"Вопрос {number}",
+            "content": "Текст",
+            "external_id": None if number is None else str(number),
+        }
+
+    @pytest.mark.asyncio
+    async def test_execute_reports_partial_failures(self):
+        """Тест сохранения успешных элементов одним вызовом и ошибок по элементам"""
+        mock_repository = AsyncMock()
+        mock_api_client = AsyncMock()
+
+        async def number_fact(number):
+            if number == 13:
+                raise ConnectionError("upstream down")
+            return self.fact(number)
+
+        mock_api_client.get_number_fact.side_effect = number_fact
+        mock_api_client.get_random_fact.return_value = self.fact()
+
+        command = FetchApiDataBatchCommand(mock_repository, mock_api_client)
+        results = await command.execute([1, 13, 2], random_count=2)
+
+        assert [result.number for result in results] == [1, 13, 2, None, None]
+        assert [result.ok for result in results] == [True, False, True, True, True]
+        assert results[1].error == "upstream down"
+        mock_repository.create_many.assert_awaited_once()
+        assert len(mock_repository.create_many.call_args.args[0]) == 4
+
+    @pytest.mark.asyncio
+    async def test_execute_limits_concurrency(self):
+        """Тест ограничения количества одновременных запросов к внешнему API"""
+        in_flight = 0
+        peak = 0
+
+        async def number_fact(number):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return self.fact(number)
+
+        mock_api_client = AsyncMock()
+        mock_api_client.get_number_fact.side_effect = number_fact
+
+        command = FetchApiDataBatchCommand(AsyncMock(), mock_api_client, concurrency=3)
+        await command.execute(list(range(10)))
+
+        assert peak == 3
+
+    @pytest.mark.asyncio
+    async def test_execute_skips_insert_when_everything_failed(self):
+        """Тест отсутствия запроса к БД, если ни один элемент не получен"""
+        mock_repository = AsyncMock()
+        mock_api_client = AsyncMock()
+        mock_api_client.get_random_fact.side_effect = TimeoutError()
+
+        command = FetchApiDataBatchCommand(mock_repository, mock_api_client)
+        results = await command.execute([], random_count=2)
+
+        assert [result.error for result in results] == ["TimeoutError", "TimeoutError"]
+        mock_repository.create_many.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_stream_yields_items_as_they_complete(self):
+        """Тест выдачи элементов по мере получения с сохранением каждой порции"""
+        mock_repository = AsyncMock()
+        mock_api_client = AsyncMock()
+
+        async def number_fact(number):
+            await asyncio.sleep(number / 100)
+            return self.fact(number)
+
+        mock_api_client.get_number_fact.side_effect = number_fact
+
+        command = FetchApiDataBatchCommand(mock_repository, mock_api_client)
+        numbers = [result.number async for result in command.stream([3, 1, 2])]
+
+        assert numbers == [1, 2, 3]
+        assert mock_repository.create_many.await_count == 3
+
+    @pytest.mark.asyncio
+    async def test_stream_waits_for_consumer(self):
+        """Тест запуска новых запросов только после чтения готовых элементов"""
+        started = []
+
+        async def number_fact(number):
+            started.append(number)
+            return self.fact(number)
+
+        mock_api_client = AsyncMock()
+        mock_api_client.get_number_fact.side_effect = number_fact
+
+        command = FetchApiDataBatchCommand(AsyncMock(), mock_api_client, concurrency=2)
+        stream = command.stream(list(range(10)))
+        await anext(stream)
+        await asyncio.sleep(0.01)
+
+        assert len(started) <= 3
+        await stream.aclose()
+
+    @pytest.mark.asyncio
+    async def test_stream_close_cancels_in_flight_requests(self):
+        """Тест отмены незавершенных запросов при закрытии потока клиентом"""
+        cancelled = 0
+
+        async def number_fact(number):
+            nonlocal cancelled
+            if number == 0:
+                return self.fact(number)
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled += 1
+                raise
+
+        mock_api_client = AsyncMock()
+        mock_api_client.get_number_fact.side_effect = number_fact
+
+        command = FetchApiDataBatchCommand(AsyncMock(), mock_api_client, concurrency=3)
+        stream = command.stream([0, 1, 2, 3])
+        first = await anext(stream)
+        await stream.aclose()
+
+        assert first.number == 0
+        # Число 3 так и не было запрошено: поток закрыт до освобождения места
+        assert cancelled == 2
+        assert mock_api_client.get_number_fact.await_count == 3
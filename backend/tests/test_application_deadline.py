@@ -0,0 +1,64 @@
+"""
+Тесты для срока обработки запроса
+"""
+
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.app.application.common.deadline import (
+    bounded_timeout,
+    check_deadline,
+    deadline_scope,
+    no_deadline,
+    time_remaining,
+)
+from src.app.application.common.exceptions import DeadlineExceededError
+from src.app.infrastructure.persistence.database import _apply_statement_timeout
+
+
+class TestDeadline:
+    """Тесты для срока обработки запроса"""
+
+    def test_without_deadline(self):
+        """Тест работы без заданного срока"""
+        assert time_remaining() is None
+        assert bounded_timeout(5) == 5
+        check_deadline()
+
+    def test_bounded_timeout(self):
+        """Тест ограничения таймаута оставшимся временем"""
+        with deadline_scope(1):
+            assert bounded_timeout(5) == pytest.approx(1, abs=0.05)
+            assert bounded_timeout(0.5) == 0.5
+        assert time_remaining() is None
+
+    def test_nested_scope_cannot_extend_deadline(self):
+        """Тест невозможности продлить срок во вложенной области"""
+        with deadline_scope(1):
+            with deadline_scope(10):
+                assert time_remaining() <= 1
+            with no_deadline():
+                assert time_remaining() is None
+
+    @pytest.mark.asyncio
+    async def test_expired_deadline(self):
+        """Тест отказа после истечения срока"""
+        with deadline_scope(0.01):
+            await asyncio.sleep(0.02)
+            with pytest.raises(DeadlineExceededError):
+                bounded_timeout(5)
+
+    def test_statement_timeout_follows_deadline(self):
+        """Тест установки statement_timeout транзакции по оставшемуся сроку"""
+        connection = MagicMock()
+
+        _apply_statement_timeout(None, None, connection)
+        connection.exec_driver_sql.assert_not_called()
+
+        with deadline_scope(2):
+            _apply_statement_timeout(None, None, connection)
+        sql = connection.exec_driver_sql.call_args.args[0]
+        assert "set_config('statement_timeout'" in sql
+        assert int(sql.split("'")[3]) in range(1900, 2001)
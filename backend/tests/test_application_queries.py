@@ -8,7 +8,7 @@ from uuid import uuid4
 
 import pytest
 
-from src.app.application.queries.get_api_data import GetApiDataQuery
+from src.app.application.queries.get_api_data import CountStrategy, GetApiDataQuery
 from src.app.domain.entities.api_data import ApiDataEntity
 
 
@@ -67,16 +67,17 @@ class TestGetApiDataQuery:
             for i in range(3)
         ]
 
-        mock_repository.get_all.return_value = entities
-        mock_repository.count.return_value = 10
+        mock_repository.get_all_with_total.return_value = (entities, 10)
 
         query = GetApiDataQuery(mock_repository)
-        items, total = await query.get_all(limit=3, offset=0)
+        page = await query.get_all(limit=3, offset=0)
 
-        mock_repository.get_all.assert_called_once_with(limit=3, offset=0)
-        mock_repository.count.assert_called_once()
-        assert len(items) == 3
-        assert total == 10
+        mock_repository.get_all_with_total.assert_called_once_with(limit=3, offset=0, after=None)
+        # Точное количество приходит тем же запросом, что и страница
+        mock_repository.count.assert_not_called()
+        assert len(page.items) == 3
+        assert page.total == 10
+        assert page.total_kind == CountStrategy.EXACT
 
     @pytest.mark.asyncio
     async def test_get_all_default_pagination(self):
@@ -84,15 +85,36 @@ class TestGetApiDataQuery:
         mock_repository = AsyncMock()
         entities = []
 
-        mock_repository.get_all.return_value = entities
-        mock_repository.count.return_value = 0
+        mock_repository.get_all_with_total.return_value = (entities, 0)
 
         query = GetApiDataQuery(mock_repository)
-        items, total = await query.get_all()
+        page = await query.get_all()
 
-        mock_repository.get_all.assert_called_once_with(limit=10, offset=0)
-        assert len(items) == 0
-        assert total == 0
+        mock_repository.get_all_with_total.assert_called_once_with(limit=10, offset=0, after=None)
+        assert len(page.items) == 0
+        assert page.total == 0
+
+    @pytest.mark.asyncio
+    async def test_get_all_count_strategies(self):
+        """Тест счетчика, оценки с переходом на счетчик и страницы без количества"""
+        mock_repository = AsyncMock()
+        mock_repository.get_all.return_value = []
+        mock_repository.count_cached.return_value = 42
+        mock_repository.count_estimate.side_effect = [40, None]
+        query = GetApiDataQuery(mock_repository)
+
+        cached = await query.get_all(count=CountStrategy.CACHED)
+        estimate = await query.get_all(count=CountStrategy.ESTIMATE)
+        not_analyzed = await query.get_all(count=CountStrategy.ESTIMATE)
+        without_total = await query.get_all(count=CountStrategy.NONE)
+
+        assert (cached.total, cached.total_kind) == (42, CountStrategy.CACHED)
+        assert (estimate.total, estimate.total_kind) == (40, CountStrategy.ESTIMATE)
+        assert (not_analyzed.total, not_analyzed.total_kind) == (42, CountStrategy.CACHED)
+        assert (without_total.total, without_total.total_kind) == (None, CountStrategy.NONE)
+        assert mock_repository.count_cached.await_count == 2
+        mock_repository.get_all_with_total.assert_not_called()
+        mock_repository.count.assert_not_called()
 
     @pytest.mark.asyncio
     async def test_get_by_source(self):
@@ -113,6 +135,8 @@ class TestGetApiDataQuery:
         query = GetApiDataQuery(mock_repository)
         result = await query.get_by_source("test_source", limit=10, offset=0)
 
-        mock_repository.get_by_source.assert_called_once_with("test_source", limit=10, offset=0)
+        mock_repository.get_by_source.assert_called_once_with(
+            "test_source", limit=10, offset=0, after=None
+        )
         assert len(result) == 1
         assert result[0].source == "test_source"
@@ -39,6 +39,16 @@ class TestSettings:
         assert settings.DB_PORT in db_url
         assert settings.DB_NAME in db_url
 
+    def test_replica_database_urls(self):
+        """Тест строк подключения к репликам с портом основной БД по умолчанию"""
+        settings = Settings()
+        settings.DB_REPLICA_HOSTS = "replica-1:6432, replica-2,"
+        urls = settings.replica_database_urls
+
+        assert list(urls) == ["replica-1:6432", "replica-2"]
+        assert urls["replica-1:6432"].endswith(f"@replica-1:6432/{settings.DB_NAME}")
+        assert urls["replica-2"].endswith(f"@replica-2:{settings.DB_PORT}/{settings.DB_NAME}")
+
     def test_get_settings_cached(self):
         """Тест кэширования настроек"""
         settings1 = get_settings()
@@ -0,0 +1,84 @@
+"""
+Тесты для локальной имитации API Ninjas
+"""
+
+import random
+
+import httpx
+import pytest
+
+from src.app.infrastructure.adapters.public_api_client import PublicApiClient, UpstreamHTTPError
+from src.fake_upstream import (
+    FakeUpstream,
+    FakeUpstreamConfig,
+    LatencyDistribution,
+    create_fake_upstream_app,
+    parse_args,
+)
+
+
+def make_client(config: FakeUpstreamConfig) -> PublicApiClient:
+    transport = httpx.ASGITransport(app=create_fake_upstream_app(config))
+    return PublicApiClient(
+        api_key="test",
+        base_url="http://fake/v1",
+        http_client=httpx.AsyncClient(transport=transport),
+    )
+
+
+class TestFakeUpstream:
+    """Тесты для имитации внешнего API"""
+
+    @pytest.mark.asyncio
+    async def test_responses_are_parsed_by_public_api_client(self):
+        """Тест совместимости ответов с разбором PublicApiClient"""
+        client = make_client(FakeUpstreamConfig(seed=1, payload_bytes=200))
+
+        fact = await client.get_number_fact(42)
+        facts = await client.get_random_facts(5)
+
+        assert fact["external_id"] == "42"
+        assert "Ответ: 42" in fact["content"]
+        assert len(fact["content"]) > 200
+        assert len(facts) == 5
+        assert all(item["content"].startswith("Fact #") for item in facts)
+
+    @pytest.mark.asyncio
+    async def test_injected_errors(self):
+        """Тест внедрения ошибок сервера"""
+        client = make_client(FakeUpstreamConfig(error_rate=1.0, error_status=502))
+
+        with pytest.raises(UpstreamHTTPError) as exc_info:
+            await client.get_random_fact()
+        assert exc_info.value.status_code == 502
+
+    def test_rate_limit_bursts(self):
+        """Тест периодических всплесков ответов 429"""
+        now = [0.0]
+        upstream = FakeUpstream(
+            FakeUpstreamConfig(rate_limit_period=10, rate_limit_duration=2), clock=lambda: now[0]
+        )
+
+        assert upstream.in_rate_limit_burst() is True
+        now[0] = 5
+        assert upstream.in_rate_limit_burst() is False
+        now[0] = 11
+        assert upstream.in_rate_limit_burst() is True
+
+    def test_latency_distributions(self):
+        """Тест разбора и выборки распределений задержки"""
+        rng = random.Random(0)
+
+        assert LatencyDistribution.parse("constant:20").sample(rng) == 0.02
+        assert 0.01 <= LatencyDistribution.parse("uniform:10:30").sample(rng) <= 0.03
+        assert LatencyDistribution.parse("lognormal:50:0.5").sample(rng) > 0
+        with pytest.raises(ValueError):
+            LatencyDistribution.parse("gamma:1")
+
+    def test_parse_args(self):
+        """Тест разбора параметров командной строки"""
+        config, args = parse_args(["--latency", "uniform:5:10", "--error-rate", "0.1"])
+
+        assert config.latency == LatencyDistribution("uniform", 5, 10)
+        assert config.error_rate == 0.1
+        assert args.port == 8089
@@ -2,12 +2,65 @@
 Тесты для инфраструктурных адаптеров
 """
 
-from unittest.mock import MagicMock, patch
+import asyncio
+import random
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import uuid4
 
 import httpx
+import numpy as np
 import pytest
 
-from src.app.infrastructure.adapters.public_api_client import PublicApiClient
+from src.app.application.common.deadline import deadline_scope, time_remaining
+from src.app.application.common.exceptions import (
+    DeadlineExceededError,
+    UpstreamQuotaExceededError,
+    UpstreamUnavailableError,
+)
+from src.app.infrastructure.adapters.cassette import (
+    CassetteReader,
+    CassetteWriter,
+    Endpoint,
+    RecordingApiClient,
+    ReplayApiClient,
+)
+from src.app.infrastructure.adapters.http_client import (
+    HostConcurrencyLimitTransport,
+    create_http_client,
+    warm_up_http_client,
+)
+from src.app.infrastructure.adapters.minhash_lsh import LshIndex, MinHasher
+from src.app.infrastructure.adapters.provider_router import (
+    ProviderRouter,
+    RoutingMode,
+    TriviaProvider,
+)
+from src.app.infrastructure.adapters.public_api_client import PublicApiClient, UpstreamHTTPError
+from src.app.infrastructure.adapters.random_fact_buffer import RandomFactBuffer
+from src.app.infrastructure.adapters.rate_limiter import (
+    DailyBudget,
+    Priority,
+    TokenBucketScheduler,
+    current_priority,
+    upstream_priority,
+)
+from src.app.infrastructure.adapters.resilience import (
+    CircuitBreaker,
+    CircuitState,
+    LatencyTracker,
+    ResilientApiClient,
+    RetryBudget,
+)
+from src.app.infrastructure.adapters.response_cache import CachedApiClient, TtlLruCache
+from src.app.infrastructure.adapters.single_flight import CoalescingApiClient, SingleFlight
+from src.app.infrastructure.persistence.quota_coordinator import (
+    DistributedQuota,
+    PostgresQuotaStore,
+    QuotaWindow,
+)
+from src.app.setup.config.settings import Settings
 
 
 class TestPublicApiClient:
@@ -82,3 +135,884 @@ class TestPublicApiClient:
 
             with pytest.raises(ValueError, match="API вернул ошибку"):
                 await client.get_number_fact(42)
+
+    @pytest.mark.asyncio
+    async def test_uses_injected_http_client(self):
+        """Тест использования общего HTTP-клиента вместо создания нового"""
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return httpx.Response(200, json=[{"question": "Q?", "answer": "A"}])
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http_client:
+            client = PublicApiClient(
+                api_key="key", base_url="http://upstream/v1", http_client=http_client
+            )
+            await client.get_number_fact(5)
+            await client.get_random_fact()
+
+        assert client.http_client is http_client
+        assert [r.url.path for r in requests] == ["/v1/trivia", "/v1/facts"]
+        assert requests[0].headers["X-Api-Key"] == "key"
+
+
+class TestHttpClient:
+    """Тесты для общего пула HTTP-соединений"""
+
+    @pytest.mark.asyncio
+    async def test_host_concurrency_limit(self):
+        """Тест ограничения числа одновременных запросов к одному хосту"""
+        active = 0
+        peak = 0
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return httpx.Response(200, json={})
+
+        transport = HostConcurrencyLimitTransport(httpx.MockTransport(handler), max_per_host=2)
+        async with httpx.AsyncClient(transport=transport) as client:
+            await asyncio.gather(*(client.get("http://upstream/v1/facts") for _ in range(6)))
+
+        assert peak == 2
+
+    @pytest.mark.asyncio
+    async def test_warm_up_tolerates_errors(self):
+        """Тест прогрева соединений при недоступном хосте"""
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise httpx.ConnectError("refused", request=request)
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            await warm_up_http_client(client, "http://upstream/v1", connections=3)
+
+    def test_create_http_client_limits(self):
+        """Тест создания клиента с транспортом, ограничивающим хосты"""
+        client = create_http_client(Settings())
+
+        assert isinstance(client._transport, HostConcurrencyLimitTransport)
+
+
+class TestResponseCache:
+    """Тесты для кэша ответов внешнего API"""
+
+    def test_lru_eviction(self):
+        """Тест вытеснения наименее используемой записи"""
+        cache = TtlLruCache(max_size=2, ttl=60)
+        cache.set(1, "one")
+        cache.set(2, "two")
+        cache.get(1)
+        cache.set(3, "three")
+
+        assert cache.get(2) is None
+        assert cache.get(1).value == "one"
+        assert cache.get(3).value == "three"
+
+    def test_ttl_and_stale_window(self):
+        """Тест перехода записи в устаревшие и удаления после окна"""
+        now = [0.0]
+        cache = TtlLruCache(max_size=10, ttl=10, stale_ttl=5, clock=lambda: now[0])
+        cache.set(1, "one")
+
+        assert cache.get(1).stale is False
+        now[0] = 12
+        assert cache.get(1).stale is True
+        now[0] = 16
+        assert cache.get(1) is None
+
+    @pytest.mark.asyncio
+    async def test_cached_client_serves_stale_and_refreshes(self):
+        """Тест отдачи устаревшего значения с фоновым обновлением"""
+        now = [0.0]
+        inner = AsyncMock()
+        inner.get_number_fact.side_effect = [{"content": "old"}, {"content": "new"}]
+        client = CachedApiClient(
+            inner, TtlLruCache(max_size=10, ttl=10, stale_ttl=60, clock=lambda: now[0])
+        )
+
+        assert (await client.get_number_fact(7))["content"] == "old"
+        assert (await client.get_number_fact(7))["content"] == "old"
+        assert inner.get_number_fact.call_count == 1
+
+        now[0] = 20
+        assert (await client.get_number_fact(7))["content"] == "old"
+        await asyncio.sleep(0)
+        await client.aclose()
+
+        assert inner.get_number_fact.call_count == 2
+        assert (await client.get_number_fact(7))["content"] == "new"
+
+
+class TestSingleFlight:
+    """Тесты для объединения одновременных запросов"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_request(self):
+        """Тест выполнения одного запроса для одновременных вызовов"""
+        release = asyncio.Event()
+        inner = AsyncMock()
+
+        async def slow_fact(number):
+            await release.wait()
+            return {"content": f"fact {number}"}
+
+        inner.get_number_fact.side_effect = slow_fact
+        client = CoalescingApiClient(inner)
+
+        waiters = [asyncio.create_task(client.get_number_fact(5)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters)
+
+        assert inner.get_number_fact.call_count == 1
+        assert all(result == {"content": "fact 5"} for result in results)
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_cancel_shared_call(self):
+        """Тест отмены одного ожидающего без отмены общего запроса"""
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def call():
+            await release.wait()
+            return "done"
+
+        first = asyncio.create_task(flight.do("key", call))
+        second = asyncio.create_task(flight.do("key", call))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await second == "done"
+        assert first.cancelled()
+
+    @pytest.mark.asyncio
+    async def test_errors_reach_all_waiters_and_are_not_cached(self):
+        """Тест доставки ошибки всем ожидающим без сохранения"""
+        flight = SingleFlight()
+        calls = 0
+
+        async def failing():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0)
+            raise ConnectionError("upstream down")
+
+        results = await asyncio.gather(
+            flight.do("key", failing), flight.do("key", failing), return_exceptions=True
+        )
+
+        assert all(isinstance(result, ConnectionError) for result in results)
+        assert calls == 1
+        assert len(flight) == 0
+        with pytest.raises(ConnectionError):
+            await flight.do("key", failing)
+        assert calls == 2
+
+    @pytest.mark.asyncio
+    async def test_shared_call_ignores_first_caller_deadline_and_priority(self):
+        """Тест общего вызова без срока первого вызывающего и с приоритетом интерактивного"""
+        flight = SingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def call():
+            calls.append((time_remaining(), current_priority()))
+            await release.wait()
+            return "done"
+
+        async def background():
+            with upstream_priority(Priority.BACKGROUND), deadline_scope(0.01):
+                return await flight.do("key", call)
+
+        first = asyncio.create_task(background())
+        await asyncio.sleep(0)
+        second = asyncio.create_task(flight.do("key", call))
+        await asyncio.sleep(0)
+        third = asyncio.create_task(flight.do("key", call))
+        await asyncio.sleep(0.05)
+        release.set()
+
+        with pytest.raises(DeadlineExceededError):
+            await first
+        assert (await second, await third) == ("done", "done")
+        # Интерактивный вызов не встает за фоновым, но к нему присоединяются следующие
+        assert calls == [(None, Priority.BACKGROUND), (None, Priority.INTERACTIVE)]
+
+
+class TestRandomFactBuffer:
+    """Тесты для буфера случайных вопросов"""
+
+    @pytest.mark.asyncio
+    async def test_refills_to_high_watermark_in_batches(self):
+        """Тест пополнения буфера пакетами до верхней границы"""
+        inner = AsyncMock()
+        inner.get_random_facts.side_effect = lambda count: [{"content": "q"}] * count
+        buffer = RandomFactBuffer(inner, high_watermark=5, low_watermark=2, batch_size=2)
+
+        buffer.start()
+        for _ in range(10):
+            await asyncio.sleep(0)
+
+        assert len(buffer) == 5
+        assert [c.args[0] for c in inner.get_random_facts.call_args_list] == [2, 2, 1]
+
+        for _ in range(4):
+            assert await buffer.get_random_fact() == {"content": "q"}
+        inner.get_random_fact.assert_not_called()
+        for _ in range(10):
+            await asyncio.sleep(0)
+        await buffer.aclose()
+
+        assert len(buffer) == 5
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_upstream_when_empty(self):
+        """Тест прямого запроса при пустом буфере"""
+        inner = AsyncMock()
+        inner.get_random_fact.return_value = {"content": "direct"}
+        buffer = RandomFactBuffer(inner, high_watermark=5, low_watermark=2)
+
+        assert await buffer.get_random_fact() == {"content": "direct"}
+        inner.get_random_fact.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_get_random_facts_batch_request(self):
+        """Тест получения нескольких случайных вопросов одним запросом"""
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return httpx.Response(
+                200, json=[{"question": f"Q{i}?", "answer": "A"} for i in range(3)]
+            )
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http_client:
+            client = PublicApiClient(
+                api_key="key", base_url="http://upstream/v1", http_client=http_client
+            )
+            facts = await client.get_random_facts(3)
+
+        assert requests[0].url.params["limit"] == "3"
+        assert [fact["content"] for fact in facts] == [f"Q{i}? Ответ: A" for i in range(3)]
+
+
+class TestResilience:
+    """Тесты для circuit breaker, бюджета повторов и hedged-запросов"""
+
+    def test_breaker_opens_and_recovers(self):
+        """Тест размыкания после серии ошибок и восстановления после паузы"""
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=10, clock=lambda: now[0])
+
+        breaker.record_failure()
+        breaker.allow()
+        breaker.record_failure()
+        assert breaker.state is CircuitState.OPEN
+        with pytest.raises(UpstreamUnavailableError):
+            breaker.allow()
+
+        now[0] = 11
+        breaker.allow()
+        assert breaker.state is CircuitState.HALF_OPEN
+        with pytest.raises(UpstreamUnavailableError):
+            breaker.allow()
+        breaker.record_success()
+        assert breaker.state is CircuitState.CLOSED
+
+    def test_retry_budget_limits_retries(self):
+        """Тест ограничения повторов бюджетом"""
+        budget = RetryBudget(ratio=0.5, max_tokens=1)
+
+        assert budget.try_withdraw() is True
+        assert budget.try_withdraw() is False
+        budget.record_request()
+        budget.record_request()
+        assert budget.try_withdraw() is True
+
+    @pytest.mark.asyncio
+    async def test_retries_transient_errors(self):
+        """Тест повтора сетевой ошибки"""
+        inner = AsyncMock()
+        inner.get_number_fact.side_effect = [ConnectionError("reset"), {"content": "ok"}]
+        client = ResilientApiClient(
+            inner,
+            breaker=CircuitBreaker(failure_threshold=5, recovery_timeout=10),
+            retry_budget=RetryBudget(ratio=0.1, max_tokens=10),
+            base_delay=0,
+        )
+
+        assert await client.get_number_fact(1) == {"content": "ok"}
+        assert inner.get_number_fact.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_does_not_retry_client_errors(self):
+        """Тест отказа от повтора при ошибке 4xx"""
+        inner = AsyncMock()
+        inner.get_number_fact.side_effect = UpstreamHTTPError("bad request", status_code=400)
+        client = ResilientApiClient(
+            inner,
+            breaker=CircuitBreaker(failure_threshold=1, recovery_timeout=10),
+            retry_budget=RetryBudget(ratio=0.1, max_tokens=10),
+        )
+
+        with pytest.raises(UpstreamHTTPError):
+            await client.get_number_fact(1)
+        assert inner.get_number_fact.call_count == 1
+        assert client.breaker.state is CircuitState.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_client_error_keeps_failure_count(self):
+        """Тест сохранения счетчика сбоев закрытой цепи после ответа 4xx"""
+        inner = AsyncMock()
+        inner.get_number_fact.side_effect = UpstreamHTTPError("not found", status_code=404)
+        client = ResilientApiClient(
+            inner,
+            breaker=CircuitBreaker(failure_threshold=2, recovery_timeout=10),
+            retry_budget=RetryBudget(ratio=0.1, max_tokens=10),
+        )
+
+        client.breaker.record_failure()
+        with pytest.raises(UpstreamHTTPError):
+            await client.get_number_fact(1)
+        client.breaker.record_failure()
+
+        assert client.breaker.state is CircuitState.OPEN
+
+    @pytest.mark.asyncio
+    async def test_open_breaker_fails_fast(self):
+        """Тест быстрого отказа при разомкнутой цепи"""
+        inner = AsyncMock()
+        inner.get_number_fact.side_effect = TimeoutError("slow")
+        client = ResilientApiClient(
+            inner,
+            breaker=CircuitBreaker(failure_threshold=1, recovery_timeout=10),
+            retry_budget=RetryBudget(ratio=0.1, max_tokens=10),
+            base_delay=0,
+        )
+
+        with pytest.raises(TimeoutError):
+            await client.get_number_fact(1)
+        with pytest.raises(UpstreamUnavailableError):
+            await client.get_number_fact(1)
+        assert inner.get_number_fact.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_half_open_probe_slot_released(self):
+        """Тест освобождения пробного запроса после ответа 4xx и отмены"""
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=10, clock=lambda: now[0])
+        breaker.record_failure()
+        now[0] = 11
+        inner = AsyncMock()
+        client = ResilientApiClient(
+            inner, breaker=breaker, retry_budget=RetryBudget(ratio=0.1, max_tokens=10)
+        )
+
+        inner.get_number_fact.side_effect = UpstreamHTTPError("not found", status_code=404)
+        with pytest.raises(UpstreamHTTPError):
+            await client.get_number_fact(1)
+        assert breaker.state is CircuitState.CLOSED
+
+        breaker.record_failure()
+        now[0] = 22
+
+        async def hang(number):
+            await asyncio.sleep(10)
+
+        inner.get_number_fact.side_effect = hang
+        probe = asyncio.create_task(client.get_number_fact(1))
+        await asyncio.sleep(0)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        assert breaker.state is CircuitState.HALF_OPEN
+
+        inner.get_number_fact.side_effect = None
+        inner.get_number_fact.return_value = {"content": "ok"}
+        assert await client.get_number_fact(1) == {"content": "ok"}
+        assert breaker.state is CircuitState.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_hedged_request_wins_over_slow_primary(self):
+        """Тест ответа hedged-запроса при медленном основном запросе"""
+        calls = 0
+
+        async def fact(number):
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                await asyncio.sleep(10)
+            return {"content": f"attempt {calls}"}
+
+        inner = AsyncMock()
+        inner.get_number_fact.side_effect = fact
+        latency = LatencyTracker(min_samples=1)
+        latency.observe(0.01)
+        client = ResilientApiClient(
+            inner,
+            breaker=CircuitBreaker(failure_threshold=5, recovery_timeout=10),
+            retry_budget=RetryBudget(ratio=0.1, max_tokens=10),
+            hedge_percentile=0.95,
+            hedge_min_delay=0.01,
+            latency=latency,
+        )
+
+        result = await asyncio.wait_for(client.get_number_fact(1), timeout=1)
+
+        assert result == {"content": "attempt 2"}
+
+    @pytest.mark.asyncio
+    async def test_cancelled_hedge_is_skipped(self):
+        """Тест ответа основного запроса, когда hedged-запрос отменен"""
+        calls = 0
+
+        async def fact(number):
+            nonlocal calls
+            calls += 1
+            if calls == 2:
+                raise asyncio.CancelledError()
+            await asyncio.sleep(0.05)
+            return {"content": "primary"}
+
+        inner = AsyncMock()
+        inner.get_number_fact.side_effect = fact
+        latency = LatencyTracker(min_samples=1)
+        latency.observe(0.01)
+        client = ResilientApiClient(
+            inner,
+            breaker=CircuitBreaker(failure_threshold=5, recovery_timeout=10),
+            retry_budget=RetryBudget(ratio=0.1, max_tokens=10),
+            hedge_percentile=0.95,
+            hedge_min_delay=0.01,
+            latency=latency,
+        )
+
+        result = await asyncio.wait_for(client.get_number_fact(1), timeout=1)
+
+        assert result == {"content": "primary"}
+        assert calls == 2
+
+
+class TestRateLimiter:
+    """Тесты для планировщика квоты внешнего API"""
+
+    @pytest.mark.asyncio
+    async def test_interactive_requests_served_before_background(self):
+        """Тест обслуживания интерактивных запросов раньше фоновых"""
+        scheduler = TokenBucketScheduler(rate=50, burst=1)
+        await scheduler.acquire()
+        order = []
+
+        async def acquire(name, priority):
+            await scheduler.acquire(priority)
+            order.append(name)
+
+        background = asyncio.create_task(acquire("background", Priority.BACKGROUND))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(acquire("interactive", Priority.INTERACTIVE))
+        await asyncio.gather(background, interactive)
+
+        assert order == ["interactive", "background"]
+
+    @pytest.mark.asyncio
+    async def test_rejects_early_when_wait_exceeds_deadline(self):
+        """Тест раннего отказа, если токен не успеет освободиться"""
+        scheduler = TokenBucketScheduler(rate=1, burst=1, max_wait={Priority.INTERACTIVE: 0.5})
+        await scheduler.acquire()
+
+        with pytest.raises(UpstreamQuotaExceededError) as exc_info:
+            await scheduler.acquire()
+        assert exc_info.value.retry_after == pytest.approx(1, abs=0.1)
+
+    @pytest.mark.asyncio
+    async def test_daily_budget_exhausted(self):
+        """Тест отказа после исчерпания дневной квоты"""
+        scheduler = TokenBucketScheduler(rate=100, burst=10, daily_budget=DailyBudget(2))
+        await scheduler.acquire()
+        await scheduler.acquire()
+
+        with pytest.raises(UpstreamQuotaExceededError):
+            await scheduler.acquire()
+
+    def test_daily_budget_resets_at_midnight(self):
+        """Тест сброса дневной квоты в полночь UTC"""
+        now = [datetime(2024, 1, 1, 23, 59, tzinfo=UTC)]
+        budget = DailyBudget(1, now=lambda: now[0])
+
+        assert budget.try_consume() is True
+        assert budget.try_consume() is False
+        assert budget.seconds_until_reset() == 60
+        now[0] = datetime(2024, 1, 2, 0, 0, 1, tzinfo=UTC)
+        assert budget.try_consume() is True
+
+    @pytest.mark.asyncio
+    async def test_background_priority_from_context(self):
+        """Тест приоритета, заданного контекстом фоновой задачи"""
+        assert current_priority() is Priority.INTERACTIVE
+        with upstream_priority(Priority.BACKGROUND):
+            assert current_priority() is Priority.BACKGROUND
+        assert current_priority() is Priority.INTERACTIVE
+
+
+class FakeQuotaStore:
+    """Общий счетчик квоты в памяти"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.used: dict[tuple[str, datetime], int] = {}
+        self.calls = 0
+        self.purged: list[tuple[str, datetime]] = []
+
+    async def grant(self, window, window_start, amount):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("database is down")
+        used = self.used.get((window.bucket, window_start), 0)
+        granted = max(min(amount, window.limit - used), 0)
+        self.used[(window.bucket, window_start)] = used + granted
+        return granted, used + granted
+
+    async def purge(self, bucket, older_than):
+        self.purged.append((bucket, older_than))
+        for key in [key for key in self.used if key[0] == bucket and key[1] < older_than]:
+            del self.used[key]
+
+
+class TestDistributedQuota:
+    """Тесты для квоты, общей для нескольких реплик"""
+
+    @pytest.mark.asyncio
+    async def test_replicas_never_exceed_shared_limit(self):
+        """Тест соблюдения общего лимита окна двумя репликами"""
+        now = datetime(2024, 1, 1, 12, 0, 5, tzinfo=UTC)
+        store = FakeQuotaStore()
+        window = QuotaWindow(bucket="rate", seconds=10, limit=15)
+        replicas = [
+            DistributedQuota(store, [window], lease_size=4, now=lambda: now) for _ in range(2)
+        ]
+
+        taken = 0
+        for _ in range(20):
+            for quota in replicas:
+                if quota.try_take():
+                    taken += 1
+                else:
+                    await quota.replenish()
+
+        assert taken == 15
+        assert store.used[("rate", window.start(now))] == 15
+
+    @pytest.mark.asyncio
+    async def test_lease_is_refilled_ahead_of_time(self):
+        """Тест заблаговременного запроса нового пакета"""
+        now = datetime(2024, 1, 1, 12, 0, 5, tzinfo=UTC)
+        store = FakeQuotaStore()
+        quota = DistributedQuota(
+            store, [QuotaWindow("rate", 10, 100)], lease_size=5, low_watermark=2, now=lambda: now
+        )
+        await quota.replenish()
+
+        for _ in range(3):
+            assert quota.try_take() is True
+        await asyncio.sleep(0)
+
+        assert store.calls == 2
+        assert quota.try_take() is True
+
+    @pytest.mark.asyncio
+    async def test_rolled_over_windows_are_purged(self):
+        """Тест удаления счетчиков прошедших окон не чаще purge_interval для каждой квоты"""
+        now = datetime(2024, 1, 1, 12, 0, 5, tzinfo=UTC)
+        store = FakeQuotaStore()
+        rate = QuotaWindow("rate", 10, 100)
+        daily = QuotaWindow("daily", 86400, 1000)
+        quota = DistributedQuota(
+            store, [rate, daily], lease_size=5, purge_interval=30, now=lambda: now
+        )
+
+        for _ in range(7):
+            await quota.replenish()
+            now += timedelta(seconds=10)
+        await quota.replenish()
+
+        # Смены окна в 12:00:15, 12:00:25 ... 12:01:15: удаления в 12:00:15, 12:00:45, 12:01:15
+        assert store.purged == [
+            ("rate", datetime(2024, 1, 1, 12, 0, 10, tzinfo=UTC)),
+            ("rate", datetime(2024, 1, 1, 12, 0, 40, tzinfo=UTC)),
+            ("rate", datetime(2024, 1, 1, 12, 1, 10, tzinfo=UTC)),
+        ]
+        assert sorted(key[0] for key in store.used) == ["daily", "rate"]
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_local_share_when_store_fails(self):
+        """Тест деградации до доли реплики при недоступности БД"""
+        now = datetime(2024, 1, 1, 12, 0, 5, tzinfo=UTC)
+        quota = DistributedQuota(
+            FakeQuotaStore(fail=True),
+            [QuotaWindow("rate", 10, 10)],
+            lease_size=5,
+            fallback_share=0.5,
+            now=lambda: now,
+        )
+
+        await quota.replenish()
+        assert sum(quota.try_take() for _ in range(10)) == 5
+        assert await quota.replenish() == 5
+
+    @pytest.mark.asyncio
+    async def test_scheduler_waits_for_shared_quota(self):
+        """Тест ожидания планировщиком токенов общей квоты"""
+        store = FakeQuotaStore()
+        quota = DistributedQuota(store, [QuotaWindow("rate", 10, 100)], lease_size=2)
+        scheduler = TokenBucketScheduler(rate=100, burst=10, shared_quota=quota)
+
+        await asyncio.wait_for(asyncio.gather(*(scheduler.acquire() for _ in range(5))), timeout=1)
+
+        assert sum(store.used.values()) >= 5
+
+    @pytest.mark.asyncio
+    async def test_given_back_token_returns_to_lease(self):
+        """Тест возврата неизрасходованного токена в пакет текущего окна"""
+        now = datetime(2024, 1, 1, 12, 0, 5, tzinfo=UTC)
+        store = FakeQuotaStore()
+        quota = DistributedQuota(
+            store, [QuotaWindow("rate", 10, 100)], lease_size=1, now=lambda: now
+        )
+        await quota.replenish()
+
+        assert quota.try_take() is True
+        quota.give_back()
+        assert quota.try_take() is True
+        assert store.calls == 1
+
+        # Токен завершившегося окна не переходит в следующее
+        now += timedelta(seconds=10)
+        quota.give_back()
+        assert quota.try_take() is False
+
+    @pytest.mark.asyncio
+    async def test_cancelled_grant_returns_shared_token(self):
+        """Тест возврата в общую квоту токена, выданного отмененному ожидающему"""
+        quota = MagicMock()
+        quota.try_take.return_value = True
+        scheduler = TokenBucketScheduler(rate=100, burst=1, shared_quota=quota)
+        scheduler._tokens = 0
+        waiter = asyncio.create_task(scheduler.acquire())
+
+        # Токен выдан диспетчером, но ожидающий отменен раньше, чем получил его
+        while not quota.try_take.called:
+            await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        quota.give_back.assert_called_once_with()
+
+    def test_postgres_store_uses_single_upsert(self):
+        """Тест выдачи пакета одним атомарным запросом"""
+        from sqlalchemy.dialects import postgresql
+
+        session = AsyncMock()
+        row = SimpleNamespace(last_grant=3, used=10)
+        session.execute.return_value = MagicMock(one=MagicMock(return_value=row))
+        session_maker = MagicMock()
+        session_maker.return_value.__aenter__.return_value = session
+        store = PostgresQuotaStore(session_maker)
+        window = QuotaWindow("rate", 10, 10)
+
+        granted, used = asyncio.run(store.grant(window, datetime(2024, 1, 1, tzinfo=UTC), 5))
+
+        statement = session.execute.call_args.args[0]
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        assert (granted, used) == (3, 10)
+        assert "ON CONFLICT (bucket, window_start) DO UPDATE" in sql
+        assert "RETURNING" in sql
+
+
+class TestCassette:
+    """Тесты для записи и воспроизведения ответов внешнего API"""
+
+    @pytest.mark.asyncio
+    async def test_record_and_replay(self, tmp_path):
+        """Тест воспроизведения записанных ответов без обращения к сети"""
+        inner = AsyncMock()
+        inner.get_number_fact.side_effect = lambda number: {"content": f"fact {number}"}
+        inner.get_random_facts.return_value = [{"content": "a"}, {"content": "b"}]
+        path = tmp_path / "upstream.cassette"
+        writer = CassetteWriter(path)
+        recorder = RecordingApiClient(inner, writer)
+        for number in (42, 7, 100):
+            await recorder.get_number_fact(number)
+        await recorder.get_random_facts(2)
+        writer.close()
+
+        reader = CassetteReader(path)
+        replay = ReplayApiClient(reader)
+
+        assert len(reader) == 5
+        assert await replay.get_number_fact(7) == {"content": "fact 7"}
+        assert await replay.get_number_fact(100) == {"content": "fact 100"}
+        assert await replay.get_random_facts(3) == [
+            {"content": "a"},
+            {"content": "b"},
+            {"content": "a"},
+        ]
+        with pytest.raises(UpstreamUnavailableError):
+            await replay.get_number_fact(8)
+        reader.close()
+
+    def test_index_lookup_over_many_entries(self, tmp_path):
+        """Тест двоичного поиска по индексу кассеты"""
+        path = tmp_path / "large.cassette"
+        writer = CassetteWriter(path)
+        for number in range(10_000, 0, -1):
+            writer.append(Endpoint.TRIVIA, number, {"n": number})
+        writer.append(Endpoint.TRIVIA, 5, {"n": "rewritten"})
+        writer.close()
+
+        reader = CassetteReader(path)
+
+        assert reader.get(Endpoint.TRIVIA, 1) == {"n": 1}
+        assert reader.get(Endpoint.TRIVIA, 5) == {"n": "rewritten"}
+        assert reader.get(Endpoint.TRIVIA, 10_000) == {"n": 10_000}
+        assert reader.get(Endpoint.TRIVIA, 0) is None
+        assert reader.get(Endpoint.FACTS, 1) is None
+        assert reader.facts_count == 0
+        reader.close()
+
+    def test_rejects_foreign_file(self, tmp_path):
+        """Тест отказа при открытии файла другого формата"""
+        path = tmp_path / "broken.cassette"
+        path.write_bytes(b"not a cassette" * 10)
+
+        with pytest.raises(ValueError):
+            CassetteReader(path)
+
+
+class TestProviderRouter:
+    """Тесты для маршрутизации между провайдерами вопросов"""
+
+    @staticmethod
+    def provider(name, delay=0.0, error=None, weight=1.0):
+        async def fact(number):
+            await asyncio.sleep(delay)
+            if error is not None:
+                raise error
+            return {"source": name, "content": f"{name} {number}"}
+
+        client = AsyncMock()
+        client.get_number_fact.side_effect = fact
+        return TriviaProvider(name, client, weight)
+
+    @pytest.mark.asyncio
+    async def test_fastest_wins_and_slower_calls_are_cancelled(self):
+        """Тест победы самого быстрого провайдера с отменой остальных"""
+        fast = self.provider("fast", delay=0.01)
+        slow = self.provider("slow", delay=10)
+        router = ProviderRouter([slow, fast], mode=RoutingMode.FASTEST, fanout=2)
+
+        result = await asyncio.wait_for(router.get_number_fact(1), timeout=1)
+
+        assert result["source"] == "fast"
+        assert slow.stats.latency > fast.stats.latency
+
+    @pytest.mark.asyncio
+    async def test_fastest_skips_failed_provider(self):
+        """Тест ответа от более медленного провайдера, если быстрый ошибся"""
+        broken = self.provider("broken", error=ConnectionError("down"))
+        healthy = self.provider("healthy", delay=0.01)
+        router = ProviderRouter([broken, healthy], mode=RoutingMode.FASTEST)
+
+        result = await router.get_number_fact(1)
+
+        assert result["source"] == "healthy"
+        assert broken.stats.error_rate > 0
+
+    @pytest.mark.asyncio
+    async def test_weighted_fails_over_to_next_provider(self):
+        """Тест перехода к следующему провайдеру при ошибке"""
+        local = self.provider("local", error=LookupError("miss"), weight=100)
+        remote = self.provider("remote", weight=0.001)
+        router = ProviderRouter([local, remote], rng=random.Random(0))
+
+        result = await router.get_number_fact(5)
+
+        assert result["source"] == "remote"
+        assert local.stats.error_rate == 0
+
+    def test_routing_prefers_low_latency_providers(self):
+        """Тест снижения рейтинга медленного провайдера"""
+        fast = self.provider("fast")
+        slow = self.provider("slow")
+        for _ in range(20):
+            fast.stats.observe_success(0.01)
+            slow.stats.observe_success(1.0)
+        router = ProviderRouter([slow, fast])
+
+        assert [provider.name for provider in router.ranked()] == ["fast", "slow"]
+
+    def test_requires_positive_weight(self):
+        """Тест отказа без провайдеров с положительным весом"""
+        with pytest.raises(ValueError):
+            ProviderRouter([self.provider("off", weight=0)])
+
+
+class TestMinHashLsh:
+    """Тесты MinHash сигнатур и LSH индекса"""
+
+    QUESTION = "Which river flows through the capital city of France, Paris?"
+    REWORDED = "Which river flows through Paris, the capital city of France?"
+
+    def test_signature_similarity_tracks_wording(self):
+        """Тест: перефразированный вопрос ближе к исходному, чем посторонний"""
+        hasher = MinHasher(num_perm=128)
+        original = hasher.signature(self.QUESTION)
+        reworded = hasher.signature(self.REWORDED.upper())
+        unrelated = hasher.signature("Who painted the Mona Lisa?")
+
+        assert (original == hasher.signature(self.QUESTION)).all()
+        assert (original == reworded).mean() > 0.5
+        assert (original == unrelated).mean() < 0.1
+        assert (hasher.signatures([self.QUESTION, "x"])[0] == original).all()
+
+    def test_query_finds_near_duplicate_in_tail_and_after_merge(self):
+        """Тест поиска почти дубликата до и после слияния хвоста индекса"""
+        hasher = MinHasher()
+        index = LshIndex()
+        rng = np.random.default_rng(0)
+        index.add_many([uuid4() for _ in range(500)], rng.integers(0, 2**32, (500, 64)))
+        original_id = uuid4()
+        index.add(original_id, hasher.signature(self.QUESTION))
+        near = hasher.signature(self.QUESTION.replace("Paris?", "Paris ?!"))
+
+        assert index.query(near, 0.8)[0] == original_id
+        index.merge()
+        assert index.tail_size == 0
+        match_id, similarity = index.query(near, 0.8)
+        assert match_id == original_id
+        assert similarity >= 0.8
+        assert index.query(near, 0.8, exclude=original_id) is None
+        assert index.query(hasher.signature("Who painted the Mona Lisa?"), 0.5) is None
+        assert len(index) == 501
+
+    def test_merge_keeps_index_searchable(self):
+        """Тест: поиск и добавление между началом и окончанием слияния"""
+        index = LshIndex()
+        rng = np.random.default_rng(1)
+        signatures = rng.integers(0, 2**32, (3, 64), dtype=np.uint32)
+        ids = [uuid4() for _ in range(3)]
+        index.add_many(ids[:2], signatures[:2])
+
+        pending = index.begin_merge()
+        index.add(ids[2], signatures[2])
+        assert index.query(signatures[0], 0.9)[0] == ids[0]
+        index.finish_merge(LshIndex.build_merged(*pending))
+
+        assert [index.query(signature, 0.9)[0] for signature in signatures] == ids
+        assert index.tail_size == 1
@@ -0,0 +1,344 @@
+"""
+Тесты для пула фоновых заданий и наполнения банка вопросов
+"""
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import uuid4
+
+import pytest
+
+from src.app.application.common.exceptions import JobQueueFullError
+from src.app.domain.entities.fetch_job import FetchJobStatus
+from src.app.infrastructure.adapters.rate_limiter import TokenBucketScheduler
+from src.app.infrastructure.jobs.fetch_job_pool import FetchJobPool
+from src.app.infrastructure.jobs.question_harvester import HarvestPlan, QuestionHarvester
+from src.app.infrastructure.persistence.repositories.harvest_checkpoint_repository import (
+    HarvestCheckpoint,
+)
+
+POOL_MODULE = "src.app.infrastructure.jobs.fetch_job_pool"
+HARVESTER_MODULE = "src.app.infrastructure.jobs.question_harvester"
+
+
+class FakeJobStore:
+    """Таблица fetch_jobs в памяти, общая для всех экземпляров репозитория"""
+
+    def __init__(self):
+        self.jobs = {}
+
+    def repository(self, session):
+        store = self
+
+        class Repository:
+            async def create(self, job):
+                store.jobs[job.id] = job
+                return job
+
+            async def claim(self, job_id):
+                job = store.jobs.get(job_id)
+                if job is None or job.status != FetchJobStatus.QUEUED:
+                    return None
+                job.status = FetchJobStatus.RUNNING
+                return job
+
+            async def finish(self, job_id, result_id=None, error=None):
+                job = store.jobs[job_id]
+                job.status = FetchJobStatus.FAILED if error else FetchJobStatus.SUCCEEDED
+                job.result_id = result_id
+                job.error = error
+
+            async def release(self, job_ids):
+                for job_id in job_ids:
+                    store.jobs[job_id].status = FetchJobStatus.QUEUED
+
+            async def requeue_stale(self, started_before):
+                pass
+
+            async def get_queued_ids(self, limit):
+                queued = [job.id for job in store.jobs.values() if job.status == "queued"]
+                return queued[:limit]
+
+        return Repository()
+
+
+def make_pool(api_client, **kwargs):
+    session_maker = MagicMock()
+    session_maker.return_value.__aenter__.return_value = AsyncMock()
+    return FetchJobPool(session_maker, api_client, **kwargs)
+
+
+def fact(number=None):
+    return {"source": "apininjas", "title": "Вопрос", "content": "Текст", "external_id": None}
+
+
+class TestFetchJobPool:
+    """Тесты для пула обработчиков фоновых заданий"""
+
+    @pytest.fixture
+    def store(self):
+        store = FakeJobStore()
+        api_data_repository = AsyncMock()
+        api_data_repository.create.side_effect = lambda entity: entity
+        with (
+            patch(f"{POOL_MODULE}.FetchJobRepository", side_effect=store.repository),
+            patch(f"{POOL_MODULE}.ApiDataRepository", return_value=api_data_repository),
+        ):
+            yield store
+
+    @pytest.mark.asyncio
+    async def test_submitted_job_is_processed(self, store):
+        """Тест выполнения задания и сохранения ID полученной записи"""
+        api_client = AsyncMock()
+        api_client.get_number_fact.side_effect = fact
+        pool = make_pool(api_client, sweep_interval=60)
+        pool.start()
+
+        job = await pool.submit(42)
+        await asyncio.wait_for(pool._queue.join(), timeout=1)
+        await pool.aclose()
+
+        assert store.jobs[job.id].status == FetchJobStatus.SUCCEEDED
+        assert store.jobs[job.id].result_id is not None
+        api_client.get_number_fact.assert_awaited_once_with(42)
+
+    @pytest.mark.asyncio
+    async def test_failed_job_records_error(self, store):
+        """Тест сохранения ошибки задания"""
+        api_client = AsyncMock()
+        api_client.get_random_fact.side_effect = ConnectionError("upstream down")
+        pool = make_pool(api_client, sweep_interval=60)
+        pool.start()
+
+        job = await pool.submit(None)
+        await asyncio.wait_for(pool._queue.join(), timeout=1)
+        await pool.aclose()
+
+        assert store.jobs[job.id].status == FetchJobStatus.FAILED
+        assert store.jobs[job.id].error == "upstream down"
+
+    @pytest.mark.asyncio
+    async def test_rejects_when_queue_is_full(self, store):
+        """Тест отказа при заполненной очереди"""
+        pool = make_pool(AsyncMock(), max_queue=2)
+
+        await pool.submit(1)
+        await pool.submit(2)
+        with pytest.raises(JobQueueFullError):
+            await pool.submit(3)
+        assert len(store.jobs) == 2
+
+    @pytest.mark.asyncio
+    async def test_interrupted_jobs_are_released_on_shutdown(self, store):
+        """Тест возврата прерванного задания в очередь при остановке"""
+        started = asyncio.Event()
+
+        async def slow_fact(number):
+            started.set()
+            await asyncio.sleep(10)
+
+        api_client = AsyncMock()
+        api_client.get_number_fact.side_effect = slow_fact
+        pool = make_pool(api_client, sweep_interval=60)
+        pool.start()
+
+        job = await pool.submit(7)
+        await asyncio.wait_for(started.wait(), timeout=1)
+        await pool.aclose()
+
+        assert store.jobs[job.id].status == FetchJobStatus.QUEUED
+
+    @pytest.mark.asyncio
+    async def test_sweep_restores_jobs_from_database(self, store):
+        """Тест загрузки ожидающих заданий из БД после перезапуска"""
+        from src.app.domain.entities.fetch_job import FetchJobEntity
+
+        job = FetchJobEntity(id=uuid4(), number=5)
+        store.jobs[job.id] = job
+        api_client = AsyncMock()
+        api_client.get_number_fact.side_effect = fact
+        pool = make_pool(api_client, sweep_interval=60)
+        pool.start()
+
+        for _ in range(100):
+            if store.jobs[job.id].status == FetchJobStatus.SUCCEEDED:
+                break
+            await asyncio.sleep(0.01)
+        await pool.aclose()
+
+        assert store.jobs[job.id].status == FetchJobStatus.SUCCEEDED
+
+
+class TestQuestionHarvester:
+    """Тесты для фонового наполнения банка вопросов"""
+
+    @pytest.fixture
+    def db(self):
+        """Фикстура с сохраненными вопросами и контрольной точкой в памяти"""
+        db = SimpleNamespace(stored=[], checkpoint=None, existing=set())
+
+        api_data_repository = AsyncMock()
+        api_data_repository.create_many.side_effect = lambda entities: db.stored.extend(entities)
+        api_data_repository.get_existing_external_ids.side_effect = lambda source, ids: {
+            external_id for external_id in ids if external_id in db.existing
+        }
+
+        checkpoint_repository = AsyncMock()
+        checkpoint_repository.get.side_effect = lambda name: db.checkpoint
+
+        async def save(checkpoint):
+            db.checkpoint = HarvestCheckpoint(**vars(checkpoint))
+
+        checkpoint_repository.save.side_effect = save
+        with (
+            patch(f"{HARVESTER_MODULE}.ApiDataRepository", return_value=api_data_repository),
+            patch(
+                f"{HARVESTER_MODULE}.HarvestCheckpointRepository",
+                return_value=checkpoint_repository,
+            ),
+        ):
+            yield db
+
+    @staticmethod
+    def make_harvester(api_client, plan, **kwargs):
+        session_maker = MagicMock()
+        session_maker.return_value.__aenter__.return_value = AsyncMock()
+        return QuestionHarvester(session_maker, api_client, plan, **kwargs)
+
+    @staticmethod
+    def number_fact(number):
+        return {
+            "source": "apininjas",
+            "title": "Вопрос",
+            "content": "Текст",
+            "external_id": str(number),
+        }
+
+    def test_plan_numbers_span_ranges(self):
+        """Тест сквозной нумерации чисел по нескольким диапазонам"""
+        plan = HarvestPlan(ranges=((1, 3), (10, 12)))
+
+        assert plan.numbers_count == 6
+        assert plan.numbers(2, 3) == [3, 10, 11]
+        assert plan.numbers(5, 10) == [12]
+
+    @pytest.mark.asyncio
+    async def test_harvest_skips_existing_and_finishes(self, db):
+        """Тест пропуска сохраненных чисел, получения случайных и завершения плана"""
+        db.existing = {"2"}
+        api_client = AsyncMock()
+        api_client.get_number_fact.side_effect = self.number_fact
+        api_client.get_random_facts.side_effect = lambda count: [fact()] * count
+        harvester = self.make_harvester(
+            api_client, HarvestPlan(ranges=((1, 3),), random_count=2), batch_size=2
+        )
+
+        while await harvester.run_batch():
+            pass
+
+        assert [call.args[0] for call in api_client.get_number_fact.await_args_list] == [1, 3]
+        assert len(db.stored) == 4
+        assert db.checkpoint.position == 3
+        assert db.checkpoint.random_pulled == 2
+        assert db.checkpoint.finished_at is not None
+        assert harvester.progress() == 1
+
+    @pytest.mark.asyncio
+    async def test_harvest_resumes_from_checkpoint(self, db):
+        """Тест продолжения с сохраненной позиции после ошибки"""
+        plan = HarvestPlan(ranges=((1, 4),))
+        api_client = AsyncMock()
+        api_client.get_number_fact.side_effect = [
+            self.number_fact(1),
+            ConnectionError("upstream down"),
+        ]
+        with pytest.raises(ConnectionError):
+            await self.make_harvester(api_client, plan, batch_size=4).run_batch()
+
+        assert db.checkpoint.position == 1
+        assert len(db.stored) == 1
+
+        api_client.get_number_fact.side_effect = self.number_fact
+        await self.make_harvester(api_client, plan, batch_size=4).run_batch()
+
+        assert [call.args[0] for call in api_client.get_number_fact.await_args_list][2:] == [
+            2,
+            3,
+            4,
+        ]
+        assert db.checkpoint.position == 4
+
+    @pytest.mark.asyncio
+    async def test_changed_plan_starts_over(self, db):
+        """Тест сброса прогресса при изменении плана"""
+        db.checkpoint = HarvestCheckpoint(name="default", plan="1-100;random=0", position=50)
+        harvester = self.make_harvester(AsyncMock(), HarvestPlan(ranges=((1, 10),)))
+
+        checkpoint = await harvester.load_checkpoint()
+
+        assert checkpoint.position == 0
+
+    def test_quota_wait_keeps_spare_tokens_and_daily_reserve(self):
+        """Тест ожидания, пока в ведре нет свободных токенов или исчерпан резерв"""
+        from datetime import UTC, datetime
+
+        from src.app.infrastructure.adapters.rate_limiter import DailyBudget
+
+        now = [0.0]
+        scheduler = TokenBucketScheduler(rate=2, burst=4, clock=lambda: now[0])
+        harvester = self.make_harvester(
+            AsyncMock(), HarvestPlan(), scheduler=scheduler, spare_tokens=3
+        )
+        assert harvester.quota_wait() == 0
+
+        scheduler._tokens = 1
+        assert harvester.quota_wait() == 1
+
+        noon = datetime(2024, 1, 15, 12, tzinfo=UTC)
+        scheduler.daily_budget = DailyBudget(limit=10, now=lambda: noon)
+        scheduler.daily_budget.try_consume(8)
+        harvester.daily_reserve = 2
+        assert harvester.quota_wait() == 12 * 3600
+
+    @pytest.mark.asyncio
+    async def test_quota_wait_uses_distributed_quota(self):
+        """Тест резерва и свободных токенов по квоте, общей для реплик"""
+        from datetime import UTC, datetime
+
+        from src.app.infrastructure.persistence.quota_coordinator import (
+            DistributedQuota,
+            QuotaWindow,
+        )
+
+        class Store:
+            def __init__(self):
+                self.used = {}
+
+            async def grant(self, window, window_start, amount):
+                used = self.used.get(window.bucket, 0)
+                granted = max(min(amount, window.limit - used), 0)
+                self.used[window.bucket] = used + granted
+                return granted, used + granted
+
+        noon = datetime(2024, 1, 15, 12, tzinfo=UTC)
+        store = Store()
+        # Остальные реплики уже израсходовали почти всю общую квоту
+        store.used = {"rate": 19, "daily": 97}
+        quota = DistributedQuota(
+            store,
+            [QuotaWindow("rate", 10, 20), QuotaWindow("daily", 86400, 100)],
+            lease_size=2,
+            now=lambda: noon,
+        )
+        await quota.replenish()
+        scheduler = TokenBucketScheduler(rate=2, burst=4, shared_quota=quota, clock=lambda: 0.0)
+        harvester = self.make_harvester(
+            AsyncMock(), HarvestPlan(), scheduler=scheduler, spare_tokens=3
+        )
+
+        # Локальное ведро полно, но в общем окне осталась одна своя заявка
+        assert harvester.quota_wait() == 1
+
+        harvester.daily_reserve = 3
+        assert harvester.quota_wait() == 12 * 3600
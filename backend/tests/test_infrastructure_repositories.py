@@ -2,15 +2,48 @@
 Тесты для репозиториев
 """
 
-from datetime import UTC, datetime
-from unittest.mock import AsyncMock, MagicMock
+import asyncio
+import json
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
 from uuid import uuid4
 
 import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy.exc import IntegrityError
 
+from src.app.application.common.exceptions import (
+    IdempotencyKeyInProgressError,
+    IdempotencyKeyMismatchError,
+)
 from src.app.domain.entities.api_data import ApiDataEntity
+from src.app.infrastructure.adapters.response_cache import TtlLruCache
+from src.app.infrastructure.persistence.bulk_import import (
+    STAGING_TABLE,
+    ApiDataImporter,
+    ImportFormat,
+    RejectedRow,
+    iter_records,
+    validate_batch,
+)
+from src.app.infrastructure.persistence.idempotency import IdempotencyStore
+from src.app.infrastructure.persistence.local_trivia_provider import DatabaseTriviaProvider
 from src.app.infrastructure.persistence.models.api_data import ApiDataModel
+from src.app.infrastructure.persistence.near_duplicates import NearDuplicateDetector
+from src.app.infrastructure.persistence.pool_metrics import InstrumentedQueuePool
+from src.app.infrastructure.persistence.read_replicas import (
+    Replica,
+    ReplicaRouter,
+    ReplicaSelection,
+    primary_pinned,
+)
 from src.app.infrastructure.persistence.repositories.api_data_repository import ApiDataRepository
+from src.app.infrastructure.persistence.repositories.idempotency_key_repository import (
+    IdempotencyRecord,
+    StoredResponse,
+)
+from src.app.infrastructure.persistence.write_behind import WriteBehindBuffer
 
 
 class TestApiDataRepository:
@@ -44,22 +77,120 @@ class TestApiDataRepository:
             fetched_at=fetched_at,
         )
 
-        mock_model = MagicMock(spec=ApiDataModel)
-        mock_model.id = entity_id
-        mock_session.add.return_value = None
-        mock_session.refresh = AsyncMock()
-
-        def refresh_side_effect(model):
-            model.id = entity_id
-
-        mock_session.refresh.side_effect = refresh_side_effect
+        mock_session.execute.return_value = [
+            MagicMock(
+                id=entity_id,
+                source="test_source",
+                external_id="123",
+                created_at=fetched_at,
+                updated_at=None,
+            )
+        ]
 
         result = await repository.create(entity)
 
-        mock_session.add.assert_called_once()
+        mock_session.execute.assert_awaited_once()
         mock_session.commit.assert_called_once()
         assert result.id == entity_id
 
+    @pytest.mark.asyncio
+    async def test_create_upserts_on_source_and_external_id(self, repository, mock_session):
+        """Тест обновления существующей записи вместо вставки дубликата"""
+        from sqlalchemy.dialects import postgresql
+
+        existing_id = uuid4()
+        updated_at = datetime.now(UTC)
+        entities = [
+            ApiDataEntity(
+                source="apininjas",
+                title=f"Вопрос {i}",
+                content="Текст",
+                external_id="42",
+                fetched_at=datetime.now(UTC),
+            )
+            for i in range(2)
+        ]
+        mock_session.execute.return_value = [
+            MagicMock(
+                id=existing_id,
+                source="apininjas",
+                external_id="42",
+                created_at=updated_at,
+                updated_at=updated_at,
+            )
+        ]
+
+        result = await repository.create_many(entities)
+
+        statement = mock_session.execute.call_args.args[0]
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        assert "ON CONFLICT (external_id, source) DO UPDATE" in sql
+        assert sql.count("%(title_m") == 1  # дубликат ключа схлопнут до одной строки
+        assert [entity.id for entity in result] == [existing_id, existing_id]
+        assert result[0].updated_at == updated_at
+
+    @pytest.mark.asyncio
+    async def test_create_many_indexes_stored_ids(self, mock_session):
+        """Тест добавления в индекс почти дубликатов после фиксации и с id сохраненной строки"""
+        existing_id = uuid4()
+        entity = ApiDataEntity(
+            source="apininjas",
+            title="Вопрос",
+            content="Текст",
+            external_id="42",
+            fetched_at=datetime.now(UTC),
+        )
+        near_duplicates = MagicMock()
+        near_duplicates.add.side_effect = lambda entities: (
+            mock_session.commit.assert_awaited_once(),
+            [entity.id for entity in entities],
+        )
+        mock_session.execute.return_value = [
+            MagicMock(
+                id=existing_id,
+                source="apininjas",
+                external_id="42",
+                created_at=datetime.now(UTC),
+                updated_at=None,
+            )
+        ]
+
+        await ApiDataRepository(mock_session, near_duplicates).create_many([entity])
+
+        near_duplicates.add.assert_called_once()
+        assert [item.id for item in near_duplicates.add.call_args.args[0]] == [existing_id]
+
+        # Неудачная запись в индекс не попадает
+        near_duplicates.reset_mock()
+        mock_session.execute.side_effect = ConnectionError("database is down")
+        with pytest.raises(ConnectionError):
+            await ApiDataRepository(mock_session, near_duplicates).create_many([entity])
+        near_duplicates.add.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_get_latest_by_external_id(self, repository, mock_session):
+        """Тест поиска записи по внешнему идентификатору и источнику"""
+        mock_model = ApiDataModel(
+            id=uuid4(),
+            source="apininjas",
+            title="Вопрос",
+            content="Текст",
+            external_id="42",
+            fetched_at=datetime.now(UTC),
+            created_at=datetime.now(UTC),
+        )
+        mock_session.execute.return_value = MagicMock(
+            scalar_one_or_none=MagicMock(return_value=mock_model)
+        )
+
+        result = await repository.get_latest_by_external_id("42", "apininjas")
+
+        assert result.id == mock_model.id
+        assert result.external_id == "42"
+        where = str(mock_session.execute.await_args.args[0].whereclause)
+        assert "api_data.external_id" in where
+        assert "api_data.source" in where
+
     @pytest.mark.asyncio
     async def test_get_by_id_found(self, repository, mock_session):
         """Тест получения записи по ID"""
@@ -73,6 +204,7 @@ class TestApiDataRepository:
         mock_model.fetched_at = datetime.now(UTC)
         mock_model.created_at = datetime.now(UTC)
         mock_model.updated_at = None
+        mock_model.duplicate_of = None
 
         mock_result = MagicMock()
         mock_result.scalar_one_or_none.return_value = mock_model
@@ -115,6 +247,7 @@ class TestApiDataRepository:
                 fetched_at=datetime.now(UTC),
                 created_at=datetime.now(UTC),
                 updated_at=None,
+                duplicate_of=None,
             )
             for i in range(3)
         ]
@@ -130,6 +263,60 @@ class TestApiDataRepository:
         assert len(result) == 3
         assert all(isinstance(item, ApiDataEntity) for item in result)
 
+    @pytest.mark.asyncio
+    async def test_get_all_after_cursor(self, repository, mock_session):
+        """Тест keyset выборки после (fetched_at, id) без OFFSET"""
+        from sqlalchemy.dialects import postgresql
+
+        mock_result = MagicMock()
+        mock_result.scalars.return_value.all.return_value = []
+        mock_session.execute = AsyncMock(return_value=mock_result)
+
+        await repository.get_all(limit=5, after=(datetime.now(UTC), uuid4()))
+
+        sql = str(mock_session.execute.call_args.args[0].compile(dialect=postgresql.dialect()))
+        assert "(api_data.fetched_at, api_data.id) < (" in sql
+        assert "ORDER BY api_data.fetched_at DESC, api_data.id DESC" in sql
+
+    @pytest.mark.asyncio
+    async def test_get_all_with_total(self, repository, mock_session):
+        """Тест страницы с точным количеством из оконной функции того же запроса"""
+        from sqlalchemy.dialects import postgresql
+
+        model = MagicMock(
+            spec=ApiDataModel,
+            id=uuid4(),
+            source="test_source",
+            title="Title",
+            content="Content",
+            external_id=None,
+            fetched_at=datetime.now(UTC),
+            created_at=datetime.now(UTC),
+            updated_at=None,
+            duplicate_of=None,
+        )
+        mock_result = MagicMock()
+        mock_result.all.return_value = [MagicMock(__getitem__=lambda _, i: model, total=57)]
+        mock_session.execute = AsyncMock(return_value=mock_result)
+
+        items, total = await repository.get_all_with_total(limit=1)
+
+        sql = str(mock_session.execute.call_args.args[0].compile(dialect=postgresql.dialect()))
+        assert "count(*) OVER () AS total" in sql
+        assert mock_session.execute.await_count == 1
+        assert [item.id for item in items] == [model.id]
+        assert total == 57
+
+    @pytest.mark.asyncio
+    async def test_count_estimate_not_analyzed(self, repository, mock_session):
+        """Тест отсутствия оценки для таблицы, которую еще не анализировали"""
+        mock_result = MagicMock()
+        mock_result.scalar_one_or_none.side_effect = [-1.0, 1234.0]
+        mock_session.execute = AsyncMock(return_value=mock_result)
+
+        assert await repository.count_estimate() is None
+        assert await repository.count_estimate() == 1234
+
     @pytest.mark.asyncio
     async def test_count(self, repository, mock_session):
         """Тест подсчета количества записей"""
@@ -142,3 +329,944 @@ class TestApiDataRepository:
         result = await repository.count()
 
         assert result == 10
+
+    @pytest.mark.asyncio
+    async def test_create_many_single_insert(self, repository, mock_session):
+        """Тест пакетного создания записей одним INSERT ... RETURNING"""
+        from sqlalchemy.dialects import postgresql
+
+        entities = [
+            ApiDataEntity(source="test", title=f"T{i}", content="C", fetched_at=datetime.now(UTC))
+            for i in range(3)
+        ]
+        created_at = datetime.now(UTC)
+        mock_session.execute.return_value = [
+            MagicMock(
+                id=entity.id,
+                source="test",
+                external_id=None,
+                created_at=created_at,
+                updated_at=None,
+            )
+            for entity in reversed(entities)
+        ]
+
+        result = await repository.create_many(entities)
+
+        mock_session.execute.assert_awaited_once()
+        mock_session.commit.assert_awaited_once()
+        sql = str(mock_session.execute.call_args.args[0].compile(dialect=postgresql.dialect()))
+        assert sql.count("VALUES") == 1
+        assert "RETURNING" in sql
+        assert [entity.created_at for entity in result] == [created_at] * 3
+
+    @pytest.mark.asyncio
+    async def test_create_many_empty(self, repository, mock_session):
+        """Тест пустого пакета без обращения к БД"""
+        assert await repository.create_many([]) == []
+        mock_session.execute.assert_not_called()
+
+
+class TestDatabaseTriviaProvider:
+    """Тесты для провайдера вопросов из базы данных"""
+
+    @staticmethod
+    def make_provider(*results):
+        session = AsyncMock()
+        session.execute.side_effect = [
+            MagicMock(
+                scalar_one_or_none=MagicMock(return_value=rows[0] if rows else None),
+                scalars=MagicMock(return_value=iter(rows)),
+            )
+            for rows in results
+        ]
+        session_maker = MagicMock()
+        session_maker.return_value.__aenter__.return_value = session
+        return DatabaseTriviaProvider(session_maker)
+
+    @staticmethod
+    def make_model(external_id="42"):
+        return ApiDataModel(
+            id=uuid4(),
+            source="apininjas",
+            title="Вопрос",
+            content="Текст",
+            external_id=external_id,
+            fetched_at=datetime(2024, 1, 15, tzinfo=UTC),
+            created_at=datetime(2024, 1, 15, tzinfo=UTC),
+        )
+
+    @pytest.mark.asyncio
+    async def test_get_number_fact(self):
+        """Тест получения сохраненной строки с ее id и исходным source"""
+        model = self.make_model()
+        provider = self.make_provider([model])
+
+        result = await provider.get_number_fact(42)
+        # Строка другого источника не выдается за вопрос внешнего API
+        statement = provider.session_maker.return_value.__aenter__.return_value.execute.await_args
+        assert "api_data.source" in str(statement.args[0].whereclause)
+
+        assert result == {
+            "id": model.id,
+            "source": "apininjas",
+            "title": "Вопрос",
+            "content": "Текст",
+            "external_id": "42",
+            "fetched_at": datetime(2024, 1, 15, tzinfo=UTC),
+            "duplicate_of": None,
+            "created_at": datetime(2024, 1, 15, tzinfo=UTC),
+            "updated_at": None,
+        }
+        assert ApiDataEntity.model_validate(result).id == model.id
+
+    @pytest.mark.asyncio
+    async def test_get_number_fact_miss(self):
+        """Тест промаха, не считающегося ошибкой провайдера"""
+        provider = self.make_provider([])
+
+        with pytest.raises(LookupError):
+            await provider.get_number_fact(42)
+
+    @pytest.mark.asyncio
+    async def test_random_facts_wrap_around(self):
+        """Тест дочитывания случайных вопросов с начала таблицы"""
+        provider = self.make_provider([self.make_model("1")], [self.make_model("2")])
+
+        result = await provider.get_random_facts(2)
+
+        assert [item["external_id"] for item in result] == ["1", "2"]
+
+
+class TestWriteBehindBuffer:
+    """Тесты для буфера отложенной групповой записи"""
+
+    @pytest.fixture
+    def inserted(self):
+        """Фикстура, перехватывающая групповые INSERT буфера"""
+        batches = []
+        repository = MagicMock()
+        repository.create_many = AsyncMock(side_effect=lambda entities: batches.append(entities))
+        repository.get_ids_by_keys = AsyncMock(return_value={})
+        with patch(
+            "src.app.infrastructure.persistence.write_behind.ApiDataRepository",
+            return_value=repository,
+        ):
+            yield batches
+
+    @staticmethod
+    def make_buffer(**kwargs):
+        session_maker = MagicMock()
+        session_maker.return_value.__aenter__.return_value = AsyncMock()
+        return WriteBehindBuffer(session_maker, **kwargs)
+
+    @staticmethod
+    def make_entity():
+        return ApiDataEntity(
+            source="apininjas", title="Вопрос", content="Текст", fetched_at=datetime.now(UTC)
+        )
+
+    @pytest.mark.asyncio
+    async def test_create_returns_immediately(self, inserted):
+        """Тест выдачи записи с id до сброса и доступности ее через pending"""
+        buffer = self.make_buffer(flush_interval=60)
+        entity = self.make_entity()
+
+        result = await buffer.create(entity)
+
+        assert result.id == entity.id
+        assert buffer.pending(entity.id) is entity
+        assert inserted == []
+
+    @pytest.mark.asyncio
+    async def test_flush_by_size(self, inserted):
+        """Тест сброса одним INSERT при накоплении max_rows записей"""
+        buffer = self.make_buffer(max_rows=3, flush_interval=60)
+        buffer.start()
+        for _ in range(3):
+            await buffer.create(self.make_entity())
+        await asyncio.sleep(0.01)
+
+        assert [len(batch) for batch in inserted] == [3]
+        await buffer.aclose()
+
+    @pytest.mark.asyncio
+    async def test_flush_by_interval(self, inserted):
+        """Тест сброса неполной пачки по истечении интервала"""
+        buffer = self.make_buffer(max_rows=100, flush_interval=0.01)
+        buffer.start()
+        entity = self.make_entity()
+        await buffer.create(entity)
+        await asyncio.sleep(0.05)
+
+        assert inserted == [[entity]]
+        assert buffer.pending(entity.id) is None
+        await buffer.aclose()
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_keeps_rows(self, inserted):
+        """Тест сохранения записей в буфере при ошибке БД"""
+        buffer = self.make_buffer(flush_interval=60)
+        entity = self.make_entity()
+        await buffer.create(entity)
+
+        with patch(
+            "src.app.infrastructure.persistence.write_behind.ApiDataRepository",
+            side_effect=ConnectionError("db down"),
+        ):
+            with pytest.raises(ConnectionError):
+                await buffer.flush()
+
+        assert buffer.pending(entity.id) is entity
+        assert await buffer.flush() == 1
+
+    @pytest.mark.asyncio
+    async def test_keyed_rows_keep_stored_id(self):
+        """Тест выдачи id уже сохраненной строки и схлопывания записей с одним ключом"""
+        stored_id = uuid4()
+        repository = MagicMock()
+        repository.get_ids_by_keys = AsyncMock(return_value={("apininjas", "1"): stored_id})
+        repository.create_many = AsyncMock()
+        buffer = self.make_buffer(flush_interval=60)
+        first, second, third = (self.make_entity() for _ in range(3))
+        first.external_id, second.external_id, third.external_id = "1", "2", "2"
+
+        with patch(
+            "src.app.infrastructure.persistence.write_behind.ApiDataRepository",
+            return_value=repository,
+        ):
+            await buffer.create_many([first, second])
+            await buffer.create(third)
+            await buffer.flush()
+
+        assert first.id == stored_id
+        assert third.id == second.id
+        assert repository.get_ids_by_keys.await_args_list[0].args == (
+            [("apininjas", "1"), ("apininjas", "2")],
+        )
+        # Запись, ожидающая сброса, находится без обращения к БД
+        assert repository.get_ids_by_keys.await_count == 1
+        assert repository.create_many.await_args.args == ([first, third],)
+        assert buffer.pending(second.id) is None
+
+        # Ключ, сохраненный буфером, тоже находится без обращения к БД
+        repeat = self.make_entity()
+        repeat.external_id = "1"
+        await buffer.create(repeat)
+        assert repeat.id == stored_id
+        assert repository.get_ids_by_keys.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_rejected_row_does_not_block_buffer(self):
+        """Тест записи отклоненной пачки по одной строке и отбрасывания отклоненной строки"""
+        saved = []
+        poison = self.make_entity()
+
+        async def create_many(entities):
+            if poison in entities:
+                raise IntegrityError("INSERT INTO api_data", {}, ValueError("bad row"))
+            saved.extend(entities)
+
+        repository = MagicMock()
+        repository.create_many = AsyncMock(side_effect=create_many)
+        buffer = self.make_buffer(max_rows=10, flush_interval=60)
+        first, second = self.make_entity(), self.make_entity()
+        dropped = REGISTRY.get_sample_value("api_data_write_behind_dropped_total") or 0
+
+        with patch(
+            "src.app.infrastructure.persistence.write_behind.ApiDataRepository",
+            return_value=repository,
+        ):
+            await buffer.create_many([first, poison, second])
+            assert await buffer.flush() == 2
+
+        assert saved == [first, second]
+        assert buffer.pending(poison.id) is None
+        assert REGISTRY.get_sample_value("api_data_write_behind_dropped_total") == dropped + 1
+
+    @pytest.mark.asyncio
+    async def test_latest_pending_row_of_same_source(self):
+        """Тест поиска несброшенной записи по внешнему идентификатору и источнику"""
+        repository = MagicMock()
+        repository.get_ids_by_keys = AsyncMock(return_value={})
+        repository.get_latest_by_external_id = AsyncMock(return_value=None)
+        buffer = self.make_buffer(flush_interval=60)
+        entity = self.make_entity()
+        entity.source, entity.external_id = "other", "42"
+
+        with patch(
+            "src.app.infrastructure.persistence.write_behind.ApiDataRepository",
+            return_value=repository,
+        ):
+            await buffer.create(entity)
+            assert await buffer.get_latest_by_external_id("42", "other") is entity
+            assert await buffer.get_latest_by_external_id("42", "apininjas") is None
+
+        repository.get_latest_by_external_id.assert_awaited_once_with("42", "apininjas")
+
+    @pytest.mark.asyncio
+    async def test_close_flushes_everything(self, inserted):
+        """Тест сохранения всех накопленных записей при остановке"""
+        buffer = self.make_buffer(max_rows=2, flush_interval=60)
+        buffer.start()
+        await buffer.create_many([self.make_entity()])
+        await buffer.aclose()
+
+        assert [len(batch) for batch in inserted] == [1]
+        with pytest.raises(RuntimeError):
+            await buffer.create(self.make_entity())
+
+
+class TestNearDuplicateDetector:
+    """Тесты для индекса почти дубликатов"""
+
+    @staticmethod
+    def make_entity(content):
+        return ApiDataEntity(
+            source="apininjas", title="Вопрос", content=content, fetched_at=datetime.now(UTC)
+        )
+
+    @pytest.mark.asyncio
+    async def test_load_and_check(self):
+        """Тест загрузки сохраненных вопросов и проверки новых"""
+        stored_id = uuid4()
+
+        async def iter_originals(batch_size):
+            yield [(stored_id, "In which year did the Berlin Wall fall?")]
+            yield [(uuid4(), "What is the chemical symbol for gold?")]
+
+        repository = MagicMock()
+        repository.iter_originals = iter_originals
+        session_maker = MagicMock()
+        session_maker.return_value.__aenter__.return_value = AsyncMock()
+        detector = NearDuplicateDetector(session_maker, merge_size=2)
+
+        with patch(
+            "src.app.infrastructure.persistence.near_duplicates.ApiDataRepository",
+            return_value=repository,
+        ):
+            assert await detector.load() == 2
+
+        assert detector.loaded
+        assert detector.check(self.make_entity("In which year did the Berlin wall fall ?")) == (
+            stored_id
+        )
+        first = self.make_entity("Who wrote War and Peace?")
+        assert detector.check(first) is None
+        # Проверка не меняет индекс: вопрос добавляет записавший его после сохранения
+        assert detector.check(self.make_entity("Who wrote 'War and Peace'?")) is None
+        flagged = self.make_entity("Who wrote War and Peace ?")
+        flagged.duplicate_of = stored_id
+        detector.add([first, flagged])
+        assert detector.check(self.make_entity("Who wrote 'War and Peace'?")) == first.id
+        # Повторная проверка той же записи не находит ее саму
+        assert detector.check(first) is None
+        await detector.aclose()
+        assert len(detector.index) == 3
+
+
+class TestBulkImport:
+    """Тесты для массовой загрузки вопросов"""
+
+    @staticmethod
+    async def chunks(data: bytes, size: int):
+        for start in range(0, len(data), size):
+            yield data[start : start + size]
+
+    async def records(self, data: bytes, import_format: ImportFormat, size: int = 7):
+        return [item async for item in iter_records(self.chunks(data, size), import_format)]
+
+    @pytest.mark.asyncio
+    async def test_ndjson_split_across_chunks(self):
+        """Тест разбора NDJSON, нарезанного на куски посреди строк и символов UTF-8"""
+        data = (
+            '{"source": "dump", "title": "Вопрос", "content": "Ответ", "external_id": 1}\n'
+            "\n"
+            "not json\n"
+            "[1, 2]\n"
+            '{"source": "dump", "title": "Последний", "content": "Без перевода строки"}'
+        ).encode()
+
+        records = await self.records(data, ImportFormat.NDJSON, size=5)
+
+        assert [line for line, _ in records] == [1, 3, 4, 5]
+        assert records[0][1]["title"] == "Вопрос"
+        assert isinstance(records[1][1], RejectedRow)
+        assert records[2][1] == RejectedRow(4, "Ожидался JSON объект")
+        assert records[3][1]["content"] == "Без перевода строки"
+
+    @pytest.mark.asyncio
+    async def test_csv_quoted_newline(self):
+        """Тест CSV с заголовком, переводом строки и кавычками внутри поля"""
+        data = (
+            "source,title,content,external_id\r\n"
+            'dump,Вопрос,"Первая строка\nвторая, с ""кавычками""",7\r\n'
+            "dump,Короткий,Ответ,\r\n"
+            "dump,Лишнее\r\n"
+        ).encode()
+
+        records = await self.records(data, ImportFormat.CSV, size=4)
+
+        assert [line for line, _ in records] == [2, 4, 5]
+        assert records[0][1]["content"] == 'Первая строка\nвторая, с "кавычками"'
+        assert "external_id" not in records[1][1]
+        assert isinstance(records[2][1], RejectedRow)
+
+    def test_validate_batch(self):
+        """Тест отклонения строк без полей, с пустым текстом и длиннее колонок"""
+        records = [
+            (1, {"source": "dump", "title": "Вопрос", "content": "Ответ", "external_id": 5}),
+            (2, {"title": "Без источника", "content": "Ответ"}),
+            (3, {"source": "dump", "title": "Вопрос", "content": "  "}),
+            (4, {"source": "dump", "title": "x" * 501, "content": "Ответ"}),
+            (5, RejectedRow(5, "Некорректный JSON")),
+        ]
+
+        batch = validate_batch(records)
+
+        assert len(batch.rows) == 1
+        assert batch.rows[0][1:3] == ("dump", "Вопрос")
+        assert batch.rows[0][4] == "5"
+        assert [row.line for row in batch.rejected] == [2, 3, 4, 5]
+        assert batch.rejected[1].error == "content: пустое значение"
+        assert len(validate_batch(records[1:2], default_source="dump").rows) == 1
+
+    @pytest.mark.asyncio
+    async def test_import_reports_progress(self):
+        """Тест загрузки пачками с подсчетом пропущенных и ограничением списка ошибок"""
+        session_maker = MagicMock()
+        session_maker.return_value.__aenter__.return_value = AsyncMock()
+        importer = ApiDataImporter(session_maker, batch_size=2, max_errors=1)
+        copied = []
+
+        async def copy(session, rows):
+            copied.append(len(rows))
+            # Одна строка каждой пачки уже сохранена
+            return len(rows) - 1
+
+        lines = [
+            json.dumps({"source": "dump", "title": "Вопрос", "content": f"Ответ {number}"})
+            for number in range(5)
+        ]
+        data = "\n".join(lines + ["{}", "{}"]).encode()
+        progress = []
+
+        with patch.object(importer, "_copy", side_effect=copy):
+            report = await importer.run(
+                self.chunks(data, 64),
+                ImportFormat.NDJSON,
+                on_progress=lambda report: progress.append(report.received),
+            )
+
+        assert copied == [2, 2, 1]
+        assert (report.received, report.imported, report.skipped, report.rejected) == (7, 2, 3, 2)
+        assert [row.line for row in report.errors] == [6]
+        assert progress == [2, 4, 6, 7]
+
+    @pytest.mark.asyncio
+    async def test_copy_batches_on_different_connections(self):
+        """Тест загрузки нескольких пачек, когда каждая транзакция идет на новом соединении"""
+        session = FakePooledSession()
+        session_maker = MagicMock()
+        session_maker.return_value.__aenter__.return_value = session
+        importer = ApiDataImporter(session_maker, batch_size=2)
+        data = "\n".join(
+            json.dumps({"source": "dump", "title": "Вопрос", "content": f"Ответ {number}"})
+            for number in range(5)
+        ).encode()
+
+        report = await importer.run(self.chunks(data, 64), ImportFormat.NDJSON)
+
+        assert report.imported == 5
+        assert len(session.connections) == 3
+        assert [row[3] for row in session.inserted] == [f"Ответ {number}" for number in range(5)]
+
+    @pytest.mark.asyncio
+    async def test_imported_rows_feed_near_duplicate_index(self):
+        """Тест добавления загруженных строк в индекс почти дубликатов"""
+        session = FakePooledSession()
+        session_maker = MagicMock()
+        session_maker.return_value.__aenter__.return_value = session
+        detector = NearDuplicateDetector(MagicMock())
+        importer = ApiDataImporter(session_maker, batch_size=2, near_duplicates=detector)
+        data = "\n".join(
+            json.dumps({"source": "dump", "title": "Вопрос", "content": content})
+            for content in ("Who wrote War and Peace?", "What is the capital of France?")
+        ).encode()
+
+        report = await importer.run(self.chunks(data, 64), ImportFormat.NDJSON)
+
+        assert report.imported == 2
+        entity = ApiDataEntity(
+            source="apininjas",
+            title="Вопрос",
+            content="Who wrote 'War and Peace'?",
+            fetched_at=datetime.now(UTC),
+        )
+        assert detector.check(entity) == session.inserted[0][0]
+        await detector.aclose()
+
+
+class FakePooledSession:
+    """Сессия, получающая из пула новое соединение на каждую транзакцию, как AsyncSession"""
+
+    def __init__(self):
+        self.connections = []
+        self.inserted = []
+
+    @property
+    def current(self):
+        if not self.connections or self.connections[-1]["closed"]:
+            self.connections.append({"tables": {}, "drop": set(), "closed": False})
+        return self.connections[-1]
+
+    async def execute(self, statement):
+        sql = str(statement)
+        tables = self.current["tables"]
+        if sql.startswith("CREATE TEMP TABLE"):
+            tables[STAGING_TABLE] = []
+            if "ON COMMIT DROP" in sql:
+                self.current["drop"].add(STAGING_TABLE)
+            return MagicMock()
+        assert sql.startswith("INSERT INTO api_data")
+        if STAGING_TABLE not in tables:
+            raise RuntimeError(f'relation "{STAGING_TABLE}" does not exist')
+        rows = tables[STAGING_TABLE]
+        self.inserted.extend(rows)
+        stored = [SimpleNamespace(id=row[0], content=row[3], duplicate_of=None) for row in rows]
+        return MagicMock(rowcount=len(rows), all=MagicMock(return_value=stored))
+
+    async def connection(self):
+        tables = self.current["tables"]
+
+        async def copy_records_to_table(table, records, columns):
+            if table not in tables:
+                raise RuntimeError(f'relation "{table}" does not exist')
+            tables[table].extend(records)
+
+        raw = MagicMock()
+        raw.driver_connection.copy_records_to_table = copy_records_to_table
+        connection = MagicMock()
+        connection.get_raw_connection = AsyncMock(return_value=raw)
+        return connection
+
+    async def commit(self):
+        for table in self.current["drop"]:
+            self.current["tables"].pop(table, None)
+        self.current["closed"] = True
+
+    async def rollback(self):
+        self.current["closed"] = True
+
+
+class TestSchemaMigrations:
+    """Тесты для миграций и проверки версии схемы при запуске"""
+
+    @staticmethod
+    def alembic_config(output=None):
+        from alembic.config import Config
+
+        # Без файла конфигурации env.py не перенастраивает логирование
+        config = Config(output_buffer=output)
+        config.set_main_option("script_location", "alembic")
+        return config
+
+    def test_schema_revision_is_head(self):
+        """Тест соответствия SCHEMA_REVISION последней миграции"""
+        from alembic.script import ScriptDirectory
+
+        from src.app.infrastructure.persistence.database import SCHEMA_REVISION
+
+        assert ScriptDirectory.from_config(self.alembic_config()).get_heads() == [SCHEMA_REVISION]
+
+    def test_migrations_create_model_indexes(self):
+        """Тест создания всех индексов моделей миграциями, индексов api_data - CONCURRENTLY"""
+        import io
+
+        from alembic import command
+        from src.app.infrastructure.persistence.database import Base
+
+        output = io.StringIO()
+        command.upgrade(self.alembic_config(output), "head", sql=True)
+        sql = output.getvalue()
+
+        for table in Base.metadata.sorted_tables:
+            assert f"CREATE TABLE {table.name} " in sql
+            for index in table.indexes:
+                assert f" {index.name} ON {table.name} " in sql
+        assert "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_api_data_fetched_at_id" in sql
+        # Ограничение создано в 0001_initial, 0004 его не пересоздает
+        assert "USING INDEX" not in sql
+
+    def test_unique_key_migration_for_create_all_database(self):
+        """Тест добавления duplicate_of и уникального ключа в БД из create_all без блокировки"""
+        import io
+
+        from alembic import command
+
+        output = io.StringIO()
+        command.upgrade(self.alembic_config(output), "0003_api_data_counter:head", sql=True)
+        sql = output.getvalue()
+
+        assert "ADD COLUMN IF NOT EXISTS duplicate_of UUID" in sql
+        assert sql.index("DELETE FROM api_data") < sql.index("CREATE UNIQUE INDEX CONCURRENTLY")
+        assert (
+            "CREATE UNIQUE INDEX CONCURRENTLY uq_api_data_external_id_source "
+            "ON api_data (external_id, source)" in sql
+        )
+        assert (
+            "ADD CONSTRAINT uq_api_data_external_id_source "
+            "UNIQUE USING INDEX uq_api_data_external_id_source" in sql
+        )
+
+    @staticmethod
+    def patch_engine(revision):
+        connection = AsyncMock()
+        results = [MagicMock(), MagicMock()]
+        results[0].scalar.return_value = "alembic_version" if revision else None
+        results[1].scalar.return_value = revision
+        connection.execute.side_effect = results
+        engine = MagicMock()
+        engine.connect.return_value.__aenter__.return_value = connection
+        return patch("src.app.infrastructure.persistence.database.engine", engine)
+
+    @pytest.mark.asyncio
+    async def test_check_schema_revision(self):
+        """Тест остановки запуска при устаревшей схеме в режиме strict"""
+        from src.app.infrastructure.persistence.database import (
+            SCHEMA_REVISION,
+            check_schema_revision,
+        )
+
+        with self.patch_engine(SCHEMA_REVISION):
+            await check_schema_revision("strict")
+        with self.patch_engine("0001_initial"), pytest.raises(RuntimeError, match="0001_initial"):
+            await check_schema_revision("strict")
+        with self.patch_engine(None):
+            await check_schema_revision("warn")
+        with self.patch_engine(None) as engine:
+            await check_schema_revision("off")
+        engine.connect.assert_not_called()
+
+
+class TestReplicaRouter:
+    """Тесты для маршрутизации чтения по репликам"""
+
+    @staticmethod
+    def replica(name, lag=0.0, error=None):
+        connection = AsyncMock()
+        connection.execute.return_value = MagicMock()
+        connection.execute.return_value.scalar.return_value = lag
+        if error is not None:
+            connection.execute.side_effect = error
+        engine = MagicMock()
+        engine.connect.return_value.__aenter__.return_value = connection
+        engine.dispose = AsyncMock()
+        return Replica(name, engine, MagicMock(name=f"{name}_sessions"))
+
+    @pytest.mark.asyncio
+    async def test_round_robin_and_primary_fallback(self):
+        """Тест чередования реплик и чтения из основной БД до проверки и при закреплении"""
+        primary = MagicMock(name="primary_sessions")
+        replicas = [self.replica("r1"), self.replica("r2")]
+        router = ReplicaRouter(replicas, primary)
+
+        assert router.session_maker() is primary
+        await router.check_all()
+        picked = [router.session_maker() for _ in range(4)]
+        assert picked == [replicas[0].session_maker, replicas[1].session_maker] * 2
+        with primary_pinned():
+            assert router.session_maker() is primary
+
+    @pytest.mark.asyncio
+    async def test_least_latency(self):
+        """Тест выбора реплики с наименьшим временем ответа"""
+        replicas = [self.replica("slow"), self.replica("fast")]
+        router = ReplicaRouter(replicas, MagicMock(), selection=ReplicaSelection.LEAST_LATENCY)
+        await router.check_all()
+        replicas[0].latency, replicas[1].latency = 0.05, 0.01
+
+        assert router.session_maker() is replicas[1].session_maker
+
+    @pytest.mark.asyncio
+    async def test_lagging_replica_leaves_rotation(self):
+        """Тест вывода отстающей или недоступной реплики и возврата после догоняния"""
+        lagging = self.replica("lagging", lag=10.0)
+        broken = self.replica("broken", error=OSError("connection refused"))
+        primary = MagicMock()
+        router = ReplicaRouter([lagging, broken], primary, max_lag=5.0)
+
+        await router.check_all()
+        assert (lagging.in_rotation, lagging.lag, broken.in_rotation) == (False, 10.0, False)
+        assert router.session_maker() is primary
+
+        connection = lagging.engine.connect.return_value.__aenter__.return_value
+        connection.execute.return_value.scalar.return_value = 4.0
+        await router.check(lagging)
+        assert lagging.in_rotation is False
+        connection.execute.return_value.scalar.return_value = 1.0
+        await router.check(lagging)
+        assert lagging.in_rotation is True
+        assert router.session_maker() is lagging.session_maker
+
+        await router.aclose()
+        lagging.engine.dispose.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_replica_without_wal_stream_leaves_rotation(self):
+        """Тест вывода реплики, потерявшей поток WAL, хотя весь полученный WAL воспроизведен"""
+        from sqlalchemy.dialects import postgresql
+
+        from src.app.infrastructure.persistence.read_replicas import _LAG_QUERY
+
+        replica = self.replica("detached")
+        primary = MagicMock()
+        router = ReplicaRouter([replica], primary)
+        await router.check(replica)
+        assert replica.in_rotation is True
+
+        connection = replica.engine.connect.return_value.__aenter__.return_value
+        connection.execute.return_value.scalar.return_value = None
+        await router.check(replica)
+
+        assert (replica.in_rotation, replica.lag) == (False, None)
+        assert router.session_maker() is primary
+        sql = str(_LAG_QUERY.compile(dialect=postgresql.dialect()))
+        assert "pg_stat_wal_receiver WHERE status = 'streaming'" in sql
+
+
+class TestConnectionPool:
+    """Тесты для пула соединений с метриками"""
+
+    def test_engine_uses_pool_settings(self):
+        """Тест параметров пула и кэша подготовленных выражений из настроек"""
+        from src.app.infrastructure.persistence.database import create_db_engine
+
+        with patch.multiple(
+            "src.app.infrastructure.persistence.database.settings",
+            DB_POOL_SIZE=3,
+            DB_MAX_OVERFLOW=2,
+            DB_STATEMENT_CACHE_SIZE=0,
+        ):
+            engine = create_db_engine("postgresql+asyncpg://u:p@db:5432/app", "test_settings")
+
+        assert isinstance(engine.pool, InstrumentedQueuePool)
+        assert (engine.pool.size(), engine.pool._max_overflow) == (3, 2)
+        assert engine.url.query["prepared_statement_cache_size"] == "0"
+        assert (
+            REGISTRY.get_sample_value("db_pool_connections_in_use", {"pool": "test_settings"}) == 0
+        )
+
+    @pytest.mark.asyncio
+    async def test_checkout_wait_and_timeout_metrics(self):
+        """Тест учета ожидания соединения и таймаута при исчерпании пула"""
+        from sqlalchemy import exc as sa_exc
+        from sqlalchemy.util import greenlet_spawn
+
+        pool = InstrumentedQueuePool(
+            MagicMock, pool_size=1, max_overflow=0, timeout=0.05, logging_name="test_wait"
+        )
+
+        def checkout_twice():
+            first = pool.connect()
+            with pytest.raises(sa_exc.TimeoutError):
+                pool.connect()
+            first.close()
+
+        await greenlet_spawn(checkout_twice)
+
+        labels = {"pool": "test_wait"}
+        assert REGISTRY.get_sample_value("db_pool_checkout_wait_seconds_count", labels) == 2
+        assert REGISTRY.get_sample_value("db_pool_checkout_wait_seconds_sum", labels) >= 0.05
+        assert REGISTRY.get_sample_value("db_pool_checkout_timeouts_total", labels) == 1
+        assert (pool.checkedout(), pool.checkedin()) == (0, 1)
+
+
+class FakeIdempotencyKeys:
+    """Таблица idempotency_keys в памяти, общая для всех экземпляров репозитория"""
+
+    def __init__(self):
+        self.records = {}
+        self.fail_complete = False
+
+    def repository(self, session):
+        keys = self
+
+        class Repository:
+            async def reserve(self, key, request_hash, expires_at):
+                record = keys.records.get(key)
+                if record is not None and record.expires_at > datetime.now(UTC):
+                    return IdempotencyRecord(**{**vars(record), "owned": False})
+                keys.records[key] = IdempotencyRecord(key, request_hash, expires_at)
+                return IdempotencyRecord(key, request_hash, expires_at, owned=True)
+
+            async def get(self, key):
+                return keys.records.get(key)
+
+            async def complete(self, key, response, expires_at):
+                if keys.fail_complete:
+                    raise ConnectionError("database is down")
+                keys.records[key].response = response
+                keys.records[key].expires_at = expires_at
+
+            async def release(self, key):
+                if keys.records[key].response is None:
+                    del keys.records[key]
+
+        return Repository()
+
+
+class TestIdempotencyStore:
+    """Тесты для хранилища ключей идемпотентности"""
+
+    @pytest.fixture
+    def keys(self):
+        keys = FakeIdempotencyKeys()
+        with patch(
+            "src.app.infrastructure.persistence.idempotency.IdempotencyKeyRepository",
+            side_effect=keys.repository,
+        ):
+            yield keys
+
+    @staticmethod
+    def make_store(**kwargs):
+        session_maker = MagicMock()
+        session_maker.return_value.__aenter__.return_value = AsyncMock()
+        return IdempotencyStore(session_maker, **kwargs)
+
+    @pytest.mark.asyncio
+    async def test_repeat_replays_stored_response(self, keys):
+        """Тест повторной отдачи сохраненного ответа без выполнения запроса"""
+        handler = AsyncMock(return_value=StoredResponse(201, {"id": "1"}))
+        store = self.make_store()
+
+        first = await store.execute("key", "hash", handler)
+        second = await store.execute("key", "hash", handler)
+
+        assert first == (StoredResponse(201, {"id": "1"}), False)
+        assert second == (StoredResponse(201, {"id": "1"}), True)
+        handler.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_duplicates_wait_for_first(self, keys):
+        """Тест ожидания одновременными повторами результата первого запроса"""
+        calls = 0
+
+        async def handler():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.02)
+            return StoredResponse(201, {"id": "1"})
+
+        store = self.make_store(cache=TtlLruCache(max_size=10, ttl=60))
+        results = await asyncio.gather(*(store.execute("key", "hash", handler) for _ in range(5)))
+
+        assert calls == 1
+        assert sorted(replayed for _, replayed in results) == [False, True, True, True, True]
+
+    @pytest.mark.asyncio
+    async def test_waits_for_other_replica(self, keys):
+        """Тест опроса ключа, захваченного другой репликой"""
+        keys.records["key"] = IdempotencyRecord(
+            "key", "hash", datetime.now(UTC) + timedelta(seconds=60)
+        )
+        store = self.make_store(poll_interval=0.01)
+
+        async def complete_elsewhere():
+            await asyncio.sleep(0.03)
+            keys.records["key"].response = StoredResponse(202, {"id": "job"})
+
+        asyncio.create_task(complete_elsewhere())
+        response, replayed = await store.execute("key", "hash", AsyncMock())
+
+        assert response.status_code == 202
+        assert replayed
+
+    @pytest.mark.asyncio
+    async def test_in_progress_times_out(self, keys):
+        """Тест отказа, если первый запрос не завершился за время ожидания"""
+        keys.records["key"] = IdempotencyRecord(
+            "key", "hash", datetime.now(UTC) + timedelta(seconds=60)
+        )
+        store = self.make_store(wait_timeout=0.05, poll_interval=0.01)
+
+        with pytest.raises(IdempotencyKeyInProgressError):
+            await store.execute("key", "hash", AsyncMock())
+
+    @pytest.mark.asyncio
+    async def test_failed_request_releases_key(self, keys):
+        """Тест повторного выполнения после ошибки первого запроса"""
+        store = self.make_store()
+        with pytest.raises(ConnectionError):
+            await store.execute("key", "hash", AsyncMock(side_effect=ConnectionError()))
+
+        handler = AsyncMock(return_value=StoredResponse(201, {"id": "1"}))
+        _, replayed = await store.execute("key", "hash", handler)
+
+        assert not replayed
+        handler.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_unfinished_key_is_leased_briefly(self, keys):
+        """Тест короткой аренды ключа на время выполнения и полного ttl после ответа"""
+        store = self.make_store(ttl=3600, lease=60)
+        leased = []
+
+        async def handler():
+            leased.append(keys.records["key"].expires_at - datetime.now(UTC))
+            return StoredResponse(201, {"id": "1"})
+
+        await store.execute("key", "hash", handler)
+
+        assert timedelta(seconds=55) < leased[0] <= timedelta(seconds=60)
+        assert keys.records["key"].expires_at - datetime.now(UTC) > timedelta(seconds=3500)
+
+        # Реплика упала, не освободив ключ: по истечении аренды повтор выполняется заново
+        keys.records["crashed"] = IdempotencyRecord(
+            "crashed", "hash", datetime.now(UTC) - timedelta(seconds=1)
+        )
+        handler = AsyncMock(return_value=StoredResponse(201, {"id": "2"}))
+        _, replayed = await store.execute("crashed", "hash", handler)
+
+        assert not replayed
+        handler.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_unsaved_response_releases_key(self, keys):
+        """Тест освобождения ключа, если ответ не удалось сохранить"""
+        keys.fail_complete = True
+        store = self.make_store()
+
+        response, replayed = await store.execute(
+            "key", "hash", AsyncMock(return_value=StoredResponse(201, {"id": "1"}))
+        )
+
+        assert (response.status_code, replayed) == (201, False)
+        assert "key" not in keys.records
+
+    @pytest.mark.asyncio
+    async def test_cached_response_expires_with_record(self, keys):
+        """Тест: ответ в памяти не переживает запись ключа в БД"""
+        keys.records["key"] = IdempotencyRecord(
+            "key",
+            "hash",
+            datetime.now(UTC) + timedelta(seconds=0.05),
+            response=StoredResponse(201, {"id": "1"}),
+        )
+        cache = TtlLruCache(max_size=10, ttl=3600)
+        store = self.make_store(cache=cache)
+
+        _, replayed = await store.execute("key", "hash", AsyncMock())
+        assert replayed and cache.get("key") is not None
+
+        await asyncio.sleep(0.1)
+        assert cache.get("key") is None
+
+    @pytest.mark.asyncio
+    async def test_key_reused_for_other_request(self, keys):
+        """Тест отказа при повторе ключа с другим телом запроса"""
+        store = self.make_store()
+        await store.execute("key", "hash", AsyncMock(return_value=StoredResponse(201, {})))
+
+        with pytest.raises(IdempotencyKeyMismatchError):
+            await store.execute("key", "other", AsyncMock())
@@ -9,14 +9,21 @@ from uuid import uuid4
 import pytest
 from fastapi import status
 
+from src.app.application.queries.get_api_data import ApiDataPage, CountStrategy
 from src.app.domain.entities.api_data import ApiDataEntity
 from src.app.infrastructure.persistence.repositories.api_data_repository import ApiDataRepository
 from src.app.presentation.http.controllers.api_data_controller import (
     fetch_api_data,
+    fetch_api_data_batch,
+    fetch_api_data_stream,
     get_all_api_data,
     get_api_data_by_id,
 )
-from src.app.presentation.http.schemas.api_data import FetchApiDataRequest
+from src.app.presentation.http.schemas.api_data import (
+    FetchApiDataBatchRequest,
+    FetchApiDataRequest,
+)
+from src.app.setup.config.settings import get_settings
 
 
 class TestApiDataController:
@@ -48,9 +55,19 @@ class TestApiDataController:
         with patch(
             "src.app.presentation.http.controllers.api_data_controller.FetchApiDataCommand",
             return_value=command_mock,
-        ):
+        ) as command_cls:
             request = FetchApiDataRequest(number=42)
-            result = await fetch_api_data(request, mock_repository)
+            api_client = AsyncMock()
+            result = await fetch_api_data(
+                request, mock_repository, api_client, near_duplicates=None
+            )
+
+            command_cls.assert_called_once_with(
+                mock_repository,
+                api_client,
+                freshness=get_settings().api_data_freshness,
+                near_duplicates=None,
+            )
 
             assert result.id == entity_id
             assert result.source == "numbersapi"
@@ -73,7 +90,7 @@ class TestApiDataController:
             request = FetchApiDataRequest(number=42)
 
             with pytest.raises(HTTPException) as exc_info:
-                await fetch_api_data(request, mock_repository)
+                await fetch_api_data(request, mock_repository, AsyncMock())
 
             assert exc_info.value.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
 
@@ -96,11 +113,25 @@ class TestApiDataController:
             "src.app.presentation.http.controllers.api_data_controller.GetApiDataQuery",
             return_value=query_mock,
         ):
-            result = await get_api_data_by_id(entity_id, mock_repository)
+            result = await get_api_data_by_id(entity_id, mock_repository, None)
 
             assert result.id == entity_id
             assert result.source == "test_source"
 
+    @pytest.mark.asyncio
+    async def test_get_api_data_by_id_from_write_buffer(self, mock_repository):
+        """Тест получения записи, еще не сброшенной из буфера отложенной записи"""
+        entity = ApiDataEntity(
+            source="apininjas", title="Вопрос", content="Текст", fetched_at=datetime.now(UTC)
+        )
+        write_buffer = MagicMock()
+        write_buffer.pending.return_value = entity
+
+        result = await get_api_data_by_id(entity.id, mock_repository, write_buffer)
+
+        assert result.id == entity.id
+        mock_repository.get_by_id.assert_not_awaited()
+
     @pytest.mark.asyncio
     async def test_get_api_data_by_id_not_found(self, mock_repository):
         """Тест получения несуществующих данных по ID"""
@@ -116,7 +147,7 @@ class TestApiDataController:
             return_value=query_mock,
         ):
             with pytest.raises(HTTPException) as exc_info:
-                await get_api_data_by_id(entity_id, mock_repository)
+                await get_api_data_by_id(entity_id, mock_repository, None)
 
             assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
 
@@ -137,7 +168,7 @@ class TestApiDataController:
         ]
 
         query_mock = MagicMock()
-        query_mock.get_all = AsyncMock(return_value=(entities, 10))
+        query_mock.get_all = AsyncMock(return_value=ApiDataPage(entities, 10, CountStrategy.EXACT))
 
         with patch(
             "src.app.presentation.http.controllers.api_data_controller.GetApiDataQuery",
@@ -150,3 +181,370 @@ class TestApiDataController:
             assert result.total == 10
             assert result.limit == 2
             assert result.offset == 0
+            assert result.total_kind == "exact"
+
+    @pytest.mark.asyncio
+    async def test_get_all_api_data_count_strategy(self, mock_repository):
+        """Тест выбора способа подсчета по настройке, параметру count и include_total"""
+        from src.app.presentation.http.common.pagination import PaginationParams
+
+        query_mock = MagicMock()
+        query_mock.get_all = AsyncMock(return_value=ApiDataPage([], None, CountStrategy.NONE))
+
+        with patch(
+            "src.app.presentation.http.controllers.api_data_controller.GetApiDataQuery",
+            return_value=query_mock,
+        ):
+            await get_all_api_data(PaginationParams(), mock_repository)
+            await get_all_api_data(
+                PaginationParams(), mock_repository, count=CountStrategy.ESTIMATE
+            )
+            result = await get_all_api_data(
+                PaginationParams(),
+                mock_repository,
+                count=CountStrategy.ESTIMATE,
+                include_total=False,
+            )
+
+        assert [call.kwargs["count"] for call in query_mock.get_all.call_args_list] == [
+            get_settings().API_DATA_COUNT_STRATEGY,
+            CountStrategy.ESTIMATE,
+            CountStrategy.NONE,
+        ]
+        assert result.total is None
+        assert result.total_kind == "none"
+
+    @pytest.mark.asyncio
+    async def test_get_all_api_data_cursor(self, mock_repository):
+        """Тест выдачи курсора полной страницы и перехода по нему"""
+        from fastapi import HTTPException
+
+        from src.app.presentation.http.common.pagination import PaginationParams
+
+        entities = [
+            ApiDataEntity(source="s", title="T", content="C", fetched_at=datetime.now(UTC))
+            for _ in range(2)
+        ]
+        query_mock = MagicMock()
+        query_mock.get_all = AsyncMock(return_value=ApiDataPage(entities, 10, CountStrategy.EXACT))
+
+        with patch(
+            "src.app.presentation.http.controllers.api_data_controller.GetApiDataQuery",
+            return_value=query_mock,
+        ):
+            first = await get_all_api_data(PaginationParams(limit=2), mock_repository)
+            await get_all_api_data(
+                PaginationParams(limit=2, cursor=first.next_cursor), mock_repository
+            )
+            last = await get_all_api_data(PaginationParams(limit=3), mock_repository)
+
+            with pytest.raises(HTTPException) as exc_info:
+                await get_all_api_data(PaginationParams(cursor="bm9wZQ"), mock_repository)
+            assert exc_info.value.status_code == status.HTTP_400_BAD_REQUEST
+            with pytest.raises(HTTPException):
+                await get_all_api_data(
+                    PaginationParams(offset=2, cursor=first.next_cursor), mock_repository
+                )
+
+        assert query_mock.get_all.call_args_list[1].kwargs["after"] == (
+            entities[-1].fetched_at,
+            entities[-1].id,
+        )
+        assert last.next_cursor is None
+
+    @pytest.mark.asyncio
+    async def test_fetch_api_data_upstream_unavailable(self, mock_repository):
+        """Тест ответа 503 при разомкнутом circuit breaker"""
+        from fastapi import HTTPException
+
+        from src.app.application.common.exceptions import UpstreamUnavailableError
+
+        command_mock = MagicMock()
+        command_mock.execute = AsyncMock(
+            side_effect=UpstreamUnavailableError("circuit open", retry_after=4.2)
+        )
+
+        with patch(
+            "src.app.presentation.http.controllers.api_data_controller.FetchApiDataCommand",
+            return_value=command_mock,
+        ):
+            with pytest.raises(HTTPException) as exc_info:
+                await fetch_api_data(FetchApiDataRequest(number=42), mock_repository, AsyncMock())
+
+            assert exc_info.value.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+            assert exc_info.value.headers == {"Retry-After": "5"}
+
+    @pytest.mark.asyncio
+    async def test_fetch_api_data_near_duplicate_rejected(self, mock_repository):
+        """Тест ответа 409 со ссылкой на оригинал при отклонении почти дубликата"""
+        from fastapi import HTTPException
+
+        from src.app.application.common.exceptions import NearDuplicateError
+
+        original_id = uuid4()
+        command_mock = MagicMock()
+        command_mock.execute = AsyncMock(
+            side_effect=NearDuplicateError("duplicate", original_id=original_id)
+        )
+
+        with patch(
+            "src.app.presentation.http.controllers.api_data_controller.FetchApiDataCommand",
+            return_value=command_mock,
+        ):
+            with pytest.raises(HTTPException) as exc_info:
+                await fetch_api_data(FetchApiDataRequest(number=42), mock_repository, AsyncMock())
+
+        assert exc_info.value.status_code == status.HTTP_409_CONFLICT
+        assert exc_info.value.headers == {"Location": f"/api/data/{original_id}"}
+
+    @pytest.mark.asyncio
+    async def test_fetch_api_data_batch_partial_failure(self, mock_repository):
+        """Тест ответа 207 с ошибками по элементам пакета"""
+        from fastapi import Response
+
+        from src.app.application.commands.fetch_api_data_batch import BatchItemResult
+
+        entity = ApiDataEntity(
+            source="apininjas", title="Вопрос", content="Текст", fetched_at=datetime.now(UTC)
+        )
+        command_mock = MagicMock()
+        command_mock.execute = AsyncMock(
+            return_value=[
+                BatchItemResult(number=1, entity=entity),
+                BatchItemResult(number=2, error="upstream down"),
+            ]
+        )
+
+        with patch(
+            "src.app.presentation.http.controllers.api_data_controller.FetchApiDataBatchCommand",
+            return_value=command_mock,
+        ):
+            response = Response()
+            result = await fetch_api_data_batch(
+                FetchApiDataBatchRequest(numbers=[1, 2]), response, mock_repository, AsyncMock()
+            )
+
+        assert response.status_code == status.HTTP_207_MULTI_STATUS
+        assert result.succeeded == 1
+        assert result.failed == 1
+        assert result.items[0].data.id == entity.id
+        assert result.items[1].error == "upstream down"
+
+    def test_fetch_api_data_batch_request_validation(self):
+        """Тест ограничения размера пакета"""
+        from pydantic import ValidationError
+
+        assert FetchApiDataBatchRequest(random_count=5).random_count == 5
+        with pytest.raises(ValidationError):
+            FetchApiDataBatchRequest()
+        with pytest.raises(ValidationError):
+            FetchApiDataBatchRequest(numbers=list(range(60)), random_count=60)
+
+    @staticmethod
+    async def stream_body(response) -> str:
+        return "".join([chunk async for chunk in response.body_iterator])
+
+    @pytest.fixture
+    def stream_command(self):
+        """Фикстура команды, выдающей один успешный и один неудачный элемент"""
+        from src.app.application.commands.fetch_api_data_batch import BatchItemResult
+
+        entity = ApiDataEntity(
+            source="apininjas", title="Вопрос", content="Текст", fetched_at=datetime.now(UTC)
+        )
+
+        async def stream(numbers, random_count):
+            yield BatchItemResult(number=1, entity=entity)
+            yield BatchItemResult(number=2, error="upstream down")
+
+        command_mock = MagicMock()
+        command_mock.stream = stream
+        with patch(
+            "src.app.presentation.http.controllers.api_data_controller.FetchApiDataBatchCommand",
+            return_value=command_mock,
+        ):
+            yield command_mock
+
+    @pytest.mark.asyncio
+    async def test_fetch_api_data_stream_ndjson(self, mock_repository, stream_command):
+        """Тест потоковой выдачи элементов построчно в NDJSON"""
+        import json
+
+        response = await fetch_api_data_stream(
+            FetchApiDataBatchRequest(numbers=[1, 2]), mock_repository, AsyncMock()
+        )
+        lines = (await self.stream_body(response)).splitlines()
+
+        assert response.media_type == "application/x-ndjson"
+        assert response.headers["X-Accel-Buffering"] == "no"
+        assert [json.loads(line)["status"] for line in lines] == ["ok", "error"]
+
+    @pytest.mark.asyncio
+    async def test_fetch_api_data_stream_sse(self, mock_repository, stream_command):
+        """Тест выбора SSE по заголовку Accept и итогового события end"""
+        response = await fetch_api_data_stream(
+            FetchApiDataBatchRequest(numbers=[1, 2]),
+            mock_repository,
+            AsyncMock(),
+            accept="text/event-stream",
+        )
+        events = (await self.stream_body(response)).split("\n\n")
+
+        assert response.media_type == "text/event-stream"
+        assert events[0].startswith("event: item\ndata: ")
+        assert events[2] == 'event: end\ndata: {"succeeded": 1, "failed": 1}'
+
+    @pytest.mark.asyncio
+    async def test_fetch_api_data_idempotent_replay(self, mock_repository):
+        """Тест повторной отдачи ответа по ключу идемпотентности с пометкой"""
+        from src.app.infrastructure.persistence.repositories.idempotency_key_repository import (
+            StoredResponse,
+        )
+
+        idempotency_store = MagicMock()
+        idempotency_store.execute = AsyncMock(return_value=(StoredResponse(201, {"id": "1"}), True))
+
+        response = await fetch_api_data(
+            FetchApiDataRequest(number=42),
+            mock_repository,
+            AsyncMock(),
+            idempotency_key="key-1",
+            idempotency_store=idempotency_store,
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.headers["Idempotent-Replayed"] == "true"
+        assert idempotency_store.execute.call_args.args[0] == "key-1"
+
+    @pytest.mark.asyncio
+    async def test_fetch_api_data_idempotency_conflicts(self, mock_repository):
+        """Тест ответов 409 и 422 для выполняющегося и переиспользованного ключа"""
+        from fastapi import HTTPException
+
+        from src.app.application.common.exceptions import (
+            IdempotencyKeyInProgressError,
+            IdempotencyKeyMismatchError,
+        )
+
+        for error, expected in [
+            (IdempotencyKeyInProgressError("busy", retry_after=1), status.HTTP_409_CONFLICT),
+            (IdempotencyKeyMismatchError("reused"), status.HTTP_422_UNPROCESSABLE_ENTITY),
+        ]:
+            idempotency_store = MagicMock()
+            idempotency_store.execute = AsyncMock(side_effect=error)
+            with pytest.raises(HTTPException) as exc_info:
+                await fetch_api_data(
+                    FetchApiDataRequest(number=42),
+                    mock_repository,
+                    AsyncMock(),
+                    idempotency_key="key-1",
+                    idempotency_store=idempotency_store,
+                )
+            assert exc_info.value.status_code == expected
+
+    @pytest.mark.asyncio
+    async def test_fetch_api_data_async_returns_job(self, mock_repository):
+        """Тест постановки задания в очередь с ответом 202"""
+        from src.app.domain.entities.fetch_job import FetchJobEntity
+
+        job = FetchJobEntity(number=42)
+        job_queue = AsyncMock()
+        job_queue.submit.return_value = job
+
+        response = await fetch_api_data(
+            FetchApiDataRequest(number=42),
+            mock_repository,
+            AsyncMock(),
+            run_async=True,
+            job_queue=job_queue,
+        )
+
+        job_queue.submit.assert_awaited_once_with(42)
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.headers["Location"] == f"/api/jobs/{job.id}"
+
+    @pytest.mark.asyncio
+    async def test_fetch_api_data_async_queue_full(self, mock_repository):
+        """Тест ответа 503 при заполненной очереди заданий"""
+        from fastapi import HTTPException
+
+        from src.app.application.common.exceptions import JobQueueFullError
+
+        job_queue = AsyncMock()
+        job_queue.submit.side_effect = JobQueueFullError("full", retry_after=1)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await fetch_api_data(
+                FetchApiDataRequest(), mock_repository, AsyncMock(), True, job_queue
+            )
+
+        assert exc_info.value.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert exc_info.value.headers == {"Retry-After": "1"}
+
+    @pytest.mark.asyncio
+    async def test_get_job(self):
+        """Тест получения состояния задания"""
+        from fastapi import HTTPException
+
+        from src.app.domain.entities.fetch_job import FetchJobEntity
+        from src.app.presentation.http.controllers.jobs_controller import get_job
+
+        job = FetchJobEntity(number=1)
+        repository = AsyncMock()
+        repository.get_by_id.return_value = job
+
+        result = await get_job(job.id, repository)
+        assert result.id == job.id
+        assert result.status == "queued"
+
+        repository.get_by_id.return_value = None
+        with pytest.raises(HTTPException) as exc_info:
+            await get_job(uuid4(), repository)
+        assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
+
+
+class TestAdminController:
+    """Тесты для административного контроллера"""
+
+    @pytest.mark.asyncio
+    async def test_require_admin(self, monkeypatch):
+        """Тест отключения без ADMIN_TOKEN и проверки токена"""
+        from fastapi import HTTPException
+
+        from src.app.presentation.http.controllers.admin_controller import require_admin
+
+        settings = get_settings()
+        monkeypatch.setattr(settings, "ADMIN_TOKEN", "")
+        with pytest.raises(HTTPException) as exc_info:
+            await require_admin("secret")
+        assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
+
+        monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+        for token in (None, "wrong"):
+            with pytest.raises(HTTPException) as exc_info:
+                await require_admin(token)
+            assert exc_info.value.status_code == status.HTTP_403_FORBIDDEN
+        assert await require_admin("secret") is None
+
+    @pytest.mark.asyncio
+    async def test_import_questions(self):
+        """Тест выбора формата по Content-Type и итога загрузки"""
+        from src.app.infrastructure.persistence.bulk_import import ImportReport, RejectedRow
+        from src.app.presentation.http.controllers.admin_controller import import_questions
+
+        report = ImportReport(received=3, imported=1, skipped=1, rejected=1)
+        report.errors.append(RejectedRow(2, "title: Field required"))
+        importer = MagicMock()
+        importer.run = AsyncMock(return_value=report)
+        request = MagicMock()
+        request.headers = {"content-type": "text/csv; charset=utf-8"}
+
+        with patch(
+            "src.app.presentation.http.controllers.admin_controller.ApiDataImporter",
+            return_value=importer,
+        ):
+            result = await import_questions(request, source="dump")
+
+        assert importer.run.call_args.args == (request.stream.return_value, "csv")
+        assert (result.received, result.imported, result.skipped, result.rejected) == (3, 1, 1, 1)
+        assert result.errors[0].line == 2
@@ -0,0 +1,190 @@
+"""
+Тесты для ASGI middleware
+"""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from httpx import ASGITransport, AsyncClient
+
+from src.app.application.common.deadline import time_remaining
+from src.app.infrastructure.persistence.read_replicas import is_primary_pinned
+from src.app.presentation.http.middleware.deadline import DeadlineMiddleware
+from src.app.presentation.http.middleware.read_your_writes import (
+    PRIMARY_COOKIE,
+    ReadYourWritesMiddleware,
+)
+
+
+def make_app(**kwargs) -> tuple[FastAPI, dict]:
+    state = {"cancelled": False}
+    app = FastAPI()
+
+    @app.get("/sleep")
+    async def sleep(seconds: float = 0):
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+        return {"remaining": time_remaining()}
+
+    app.add_middleware(DeadlineMiddleware, **kwargs)
+    return app, state
+
+
+def http_scope(method: str, path: str, query_string: bytes = b"") -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string,
+        "headers": [],
+        "scheme": "http",
+        "server": ("test", 80),
+        "client": ("test", 1),
+        "root_path": "",
+    }
+
+
+class TestDeadlineMiddleware:
+    """Тесты для middleware срока обработки запроса"""
+
+    @pytest.mark.asyncio
+    async def test_deadline_visible_to_handler(self):
+        """Тест передачи срока обработчику через контекст"""
+        app, _ = make_app(default_timeout=5)
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/sleep")
+
+        assert response.status_code == 200
+        assert 4 < response.json()["remaining"] <= 5
+
+    @pytest.mark.asyncio
+    async def test_expired_deadline_cancels_handler(self):
+        """Тест отмены обработки и ответа 504 по истечении срока"""
+        app, state = make_app(default_timeout=0.05)
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/sleep", params={"seconds": 5})
+
+        assert response.status_code == 504
+        assert state["cancelled"] is True
+
+    def test_timeout_from_header_and_routes(self):
+        """Тест выбора срока по заголовку, маршруту и верхней границе"""
+        middleware = DeadlineMiddleware(
+            None,
+            default_timeout=10,
+            max_timeout=30,
+            route_timeouts={("POST", "/api/data"): 8, ("POST", "/api/data/fetch"): 3},
+        )
+
+        def scope(method="GET", path="/", headers=()):
+            return {"method": method, "path": path, "headers": list(headers)}
+
+        assert middleware.timeout_for(scope()) == 10
+        assert middleware.timeout_for(scope("POST", "/api/data/fetch")) == 3
+        assert middleware.timeout_for(scope("POST", "/api/data/1")) == 8
+        assert middleware.timeout_for(scope(headers=[(b"x-request-timeout", b"2.5")])) == 2.5
+        assert middleware.timeout_for(scope(headers=[(b"x-request-timeout", b"100")])) == 30
+        assert middleware.timeout_for(scope(headers=[(b"x-request-timeout", b"abc")])) == 10
+
+    @pytest.mark.asyncio
+    async def test_client_disconnect_cancels_handler(self):
+        """Тест отмены обработки при отключении клиента"""
+        app, state = make_app(default_timeout=5)
+        messages = [{"type": "http.request", "body": b""}]
+        disconnect = asyncio.Event()
+        sent = []
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        call = asyncio.create_task(app(http_scope("GET", "/sleep", b"seconds=5"), receive, send))
+        await asyncio.sleep(0.05)
+        disconnect.set()
+        await asyncio.wait_for(call, timeout=1)
+
+        assert state["cancelled"] is True
+        assert sent == []
+
+    @pytest.mark.asyncio
+    async def test_request_body_is_streamed(self):
+        """Тест передачи тела обработчику по частям, не дожидаясь конца загрузки"""
+        app = FastAPI()
+        first_chunk = asyncio.Event()
+
+        @app.post("/upload")
+        async def upload(request: Request):
+            size = 0
+            async for chunk in request.stream():
+                size += len(chunk)
+                first_chunk.set()
+            return {"size": size}
+
+        app.add_middleware(DeadlineMiddleware, default_timeout=5)
+        calls = 0
+        sent = []
+
+        async def receive():
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                return {"type": "http.request", "body": b"a" * 10, "more_body": True}
+            if calls == 2:
+                # Клиент продолжает отправку, только когда обработчик получил начало тела
+                await first_chunk.wait()
+                return {"type": "http.request", "body": b"b" * 5, "more_body": False}
+            await asyncio.Event().wait()
+
+        async def send(message):
+            sent.append(message)
+
+        await asyncio.wait_for(app(http_scope("POST", "/upload"), receive, send), timeout=1)
+
+        assert sent[0]["status"] == 200
+        assert sent[1]["body"] == b'{"size":15}'
+
+
+class TestReadYourWritesMiddleware:
+    """Тесты для закрепления чтения за основной БД после записи"""
+
+    @pytest.mark.asyncio
+    async def test_write_pins_following_reads(self):
+        """Тест закрепления чтения после успешной записи и без нее"""
+        app = FastAPI()
+
+        @app.get("/read")
+        async def read():
+            return {"pinned": is_primary_pinned()}
+
+        @app.post("/write")
+        async def write(fail: bool = False):
+            if fail:
+                raise HTTPException(status_code=400)
+            return {"pinned": is_primary_pinned()}
+
+        app.add_middleware(DeadlineMiddleware, default_timeout=5)
+        app.add_middleware(ReadYourWritesMiddleware, window=5)
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            assert (await client.get("/read")).json() == {"pinned": False}
+            failed = await client.post("/write", params={"fail": True})
+            assert PRIMARY_COOKIE not in failed.cookies
+
+            written = await client.post("/write")
+            assert written.json() == {"pinned": True}
+            assert PRIMARY_COOKIE in written.cookies
+            assert (await client.get("/read")).json() == {"pinned": True}
+
+            client.cookies.set(PRIMARY_COOKIE, "1")
+            assert (await client.get("/read")).json() == {"pinned": False}